@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from app.cache import jsonl_load_view, lyrics_cache_path, chords_cache_path
+from app.load_songs import load_songs
+from app.document_creation import (
+    build_docx_template, create_document_from_cache, new_prepared_memo, prepare_cache_entries,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Per-process state for batch workers: cache views, shared template and cleaned bodies
+_worker = {}
+
+
+def load_manifest(manifest_path):
+    """
+    Load a batch manifest:
+    {"books": [{"songs": CSV, "lyrics_output": PATH, "chords_output": PATH}, ...]}.
+
+    Each book needs a song list and at least one output; the output format follows the file
+    extension.
+    """
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    books = manifest.get('books') if isinstance(manifest, dict) else None
+    if not books:
+        raise ValueError(f"No books listed in manifest {manifest_path}")
+    for number, book in enumerate(books, 1):
+        if 'songs' not in book:
+            raise ValueError(f"Book {number} in {manifest_path} has no 'songs' CSV")
+        if not book.get('lyrics_output') and not book.get('chords_output'):
+            raise ValueError(f"Book {number} in {manifest_path} has no 'lyrics_output' or "
+                             f"'chords_output'")
+    return books
+
+
+def _init_worker(lyrics_file, chords_file, template, memo):
+    _worker['lyrics_cache'] = jsonl_load_view(lyrics_file, 'lyrics')
+    _worker['chords_cache'] = jsonl_load_view(chords_file, 'chords')
+    _worker['template'] = template
+    _worker['memo'] = memo
+
+
+def _build_book(book):
+    start = time.perf_counter()
+    for output in (book.get('lyrics_output'), book.get('chords_output')):
+        if output and os.path.dirname(output):
+            os.makedirs(os.path.dirname(output), exist_ok=True)
+    create_document_from_cache(
+        book['song_list'], _worker['lyrics_cache'], _worker['chords_cache'],
+        book.get('lyrics_output'), book.get('chords_output'),
+        template=_worker['template'], memo=_worker['memo'],
+    )
+    return time.perf_counter() - start
+
+
+def build_songbooks(manifest_path, jobs=None):
+    """
+    Build every songbook in a manifest from one load of the caches.
+
+    Song lists are loaded and their cached bodies cleaned once, up front, and the .docx base
+    template is built once. Books are then rendered in parallel worker processes (forked workers
+    share the cleaned bodies), or in this process when jobs is 1.
+    """
+    books = load_manifest(manifest_path)
+    for book in books:
+        book['song_list'] = load_songs(book['songs'])
+    jobs = jobs or min(len(books), os.cpu_count() or 1)
+
+    lyrics_file, chords_file = lyrics_cache_path(), chords_cache_path()
+    memo = new_prepared_memo()
+    template = build_docx_template()
+    _init_worker(lyrics_file, chords_file, template, memo)
+    try:
+        for book in books:
+            prepare_cache_entries(book['song_list'], _worker['lyrics_cache'],
+                                  _worker['chords_cache'], memo)
+        logger.info(f"Prepared {len(memo['lyrics'])} lyrics and {len(memo['chords'])} chord sheets "
+                    f"for {len(books)} books.")
+        if jobs == 1:
+            timings = [_build_book(book) for book in books]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                     initargs=(lyrics_file, chords_file, template, memo)) as pool:
+                timings = list(pool.map(_build_book, books))
+    finally:
+        _worker['lyrics_cache'].close()
+        _worker['chords_cache'].close()
+        _worker.clear()
+    for book, elapsed in zip(books, timings):
+        outputs = ', '.join(path for path in (book.get('lyrics_output'), book.get('chords_output'))
+                            if path)
+        logger.info(f"Built {outputs} from {book['songs']} in {elapsed:.1f}s")
@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+from collections import Counter
+from contextlib import ExitStack
+from app.cache import (
+    BLOBS_DIR_NAME, CACHE_FILES, REF_SUFFIX, REFCOUNTS_NAME, atomic_write_lines, blob_store_dir,
+    cache_lock, decode_value, encode_value, load_cache_dictionary, recover_cache, save_refcounts,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def _cache_paths(cache_dir):
+    return [(os.path.join(cache_dir, name), value_field) for name, value_field in CACHE_FILES]
+
+
+def _count_refs(cache_dir):
+    refcounts = Counter()
+    for filename, value_field in _cache_paths(cache_dir):
+        if not os.path.exists(filename):
+            continue
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    digest = json.loads(line).get(value_field + REF_SUFFIX)
+                except Exception:
+                    continue
+                if digest:
+                    refcounts[digest] += 1
+    return refcounts
+
+
+def _iter_blobs(store):
+    for prefix in os.listdir(store):
+        prefix_dir = os.path.join(store, prefix)
+        if os.path.isdir(prefix_dir):
+            for digest in os.listdir(prefix_dir):
+                yield digest, os.path.join(prefix_dir, digest)
+
+
+def recount_refs(cache_dir):
+    """Rebuild refcounts.json from the references actually held by the caches."""
+    store = os.path.join(cache_dir, BLOBS_DIR_NAME)
+    with ExitStack() as stack:
+        for filename, _ in _cache_paths(cache_dir):
+            recover_cache(filename)
+            stack.enter_context(cache_lock(filename))
+        refcounts = _count_refs(cache_dir)
+        with cache_lock(os.path.join(store, REFCOUNTS_NAME)):
+            save_refcounts(store, refcounts)
+    return refcounts
+
+
+def collect_garbage(cache_dir):
+    """
+    Recount blob references from the caches and delete blobs no entry points to anymore.
+
+    The recount corrects any drift in refcounts.json (e.g. after a crash). All cache locks are held,
+    so a concurrent save cannot reference a blob between the count and the sweep.
+    Returns (blobs_kept, blobs_removed, bytes_freed).
+    """
+    store = os.path.join(cache_dir, BLOBS_DIR_NAME)
+    if not os.path.isdir(store):
+        return 0, 0, 0
+    with ExitStack() as stack:
+        for filename, _ in _cache_paths(cache_dir):
+            recover_cache(filename)
+            stack.enter_context(cache_lock(filename))
+        refcounts = _count_refs(cache_dir)
+        with cache_lock(os.path.join(store, REFCOUNTS_NAME)):
+            save_refcounts(store, refcounts)
+        kept = removed = freed = 0
+        for digest, path in list(_iter_blobs(store)):
+            if digest in refcounts:
+                kept += 1
+                continue
+            freed += os.path.getsize(path)
+            os.remove(path)
+            removed += 1
+    logger.info(f"Blob GC: {kept} blobs kept, {removed} removed, {freed} bytes freed.")
+    return kept, removed, freed
+
+
+def enable_dedup(cache_dir):
+    """
+    Create the blob store and move every cached body into it.
+
+    Returns {cache file: (records, unique bodies)}.
+    """
+    store = os.path.join(cache_dir, BLOBS_DIR_NAME)
+    os.makedirs(store, exist_ok=True)
+    stats = {}
+    for filename, value_field in _cache_paths(cache_dir):
+        if not os.path.exists(filename):
+            continue
+        recover_cache(filename)
+        with cache_lock(filename):
+            entries = []
+            with open(filename, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except Exception:
+                        continue
+            zdict = load_cache_dictionary(filename)
+            for entry in entries:
+                value = decode_value(filename, entry, value_field)
+                if value is not None:
+                    encode_value(entry, value_field, value, zdict, blob_store_dir(filename))
+            atomic_write_lines(filename,
+                               (json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries))
+        digests = [entry[value_field + REF_SUFFIX] for entry in entries
+                   if value_field + REF_SUFFIX in entry]
+        stats[filename] = (len(entries), len(set(digests)))
+    collect_garbage(cache_dir)
+    return stats
@@ -1,13 +1,417 @@
+import base64
+import functools
+import hashlib
 import json
 import os
 import logging
+import mmap
 import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Directory holding the lyrics and chords caches; switched to a shard-local directory by
+# set_cache_dir
+CACHE_DIR = 'data/cache'
+# Cache files in a cache directory and the field each one stores
+CACHE_FILES = [('lyrics_cache.jsonl', 'lyrics'), ('chords_cache.jsonl', 'chords')]
+# Values cached for songs that no source could provide
+NOT_FOUND_VALUES = ("Lyrics not found.", "Chords not found.")
+
+# Sidecar file holding the "artist - title" -> (byte offset, length) index of a JSONL cache
+INDEX_SUFFIX = '.idx'
+
+# Advisory lock and write-ahead journal kept next to each cache file
+LOCK_SUFFIX = '.lock'
+JOURNAL_SUFFIX = '.journal'
+
+# Optional preset dictionary next to a cache file; when present, new values are stored compressed.
+# Every dictionary records were compressed with is also kept as "<cache>.zdict.<adler32>".
+ZDICT_SUFFIX = '.zdict'
+# Compressed values live in "<value_field>_z" (base64 zlib stream), with the dictionary's adler32
+# in "zdict"
+COMPRESSED_SUFFIX = '_z'
+# Short values (such as the "not found" sentinels) are not worth compressing
+COMPRESS_MIN_LENGTH = 64
+
+# Optional content-addressed blob store next to the caches; when the directory exists, bodies are
+# stored once per unique content under blobs/<sha256[:2]>/<sha256> and records hold
+# "<value_field>_ref"
+BLOBS_DIR_NAME = 'blobs'
+REF_SUFFIX = '_ref'
+REFCOUNTS_NAME = 'refcounts.json'
+
+# Optional search index next to a cache file (see app/search_index.py); when the snapshot exists,
+# every jsonl_save_entry appends the song's new index terms to the delta log
+SEARCH_INDEX_SUFFIX = '.search'
+SEARCH_DELTA_SUFFIX = '.search.delta'
+
+_zdicts = {}
+
+
+def entry_key(entry):
+    return f"{entry.get('artist', '')} - {entry.get('title', '')}"
+
+
+def set_cache_dir(path):
+    global CACHE_DIR
+    os.makedirs(path, exist_ok=True)
+    CACHE_DIR = path
+
+
+def cache_file_path(name):
+    return os.path.join(CACHE_DIR, name)
+
+
+def lyrics_cache_path():
+    return cache_file_path('lyrics_cache.jsonl')
+
+
+def chords_cache_path():
+    return cache_file_path('chords_cache.jsonl')
+
+
+def file_signature(filename):
+    """[size, mtime_ns] of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def entry_is_found(entry, value_field):
+    """True if the entry holds real content rather than a not-found sentinel."""
+    if value_field + COMPRESSED_SUFFIX in entry or value_field + REF_SUFFIX in entry:
+        return True
+    value = entry.get(value_field)
+    return bool(value) and value not in NOT_FOUND_VALUES
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def try_lock_file(f):
+    """Take an exclusive lock on an open file without waiting; returns whether it was taken."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _CacheLockState:
+    def __init__(self):
+        self.thread_lock = threading.RLock()
+        self.depth = 0
+        self.lock_file = None
+
+
+_lock_states = {}
+_lock_states_guard = threading.Lock()
+
+
+@contextmanager
+def cache_lock(filename):
+    """Hold an exclusive lock on a cache file, across both processes and threads. Re-entrant."""
+    path = os.path.abspath(filename)
+    with _lock_states_guard:
+        state = _lock_states.setdefault(path, _CacheLockState())
+    with state.thread_lock:
+        if state.depth == 0:
+            state.lock_file = open(path + LOCK_SUFFIX, 'a+b')
+            _lock_file(state.lock_file)
+        state.depth += 1
+        try:
+            yield
+        finally:
+            state.depth -= 1
+            if state.depth == 0:
+                unlock_file(state.lock_file)
+                state.lock_file.close()
+                state.lock_file = None
+
+
+def atomic_write_lines(filename, lines):
+    """Replace filename with lines via a synced temp file, so readers never see a partial cache."""
+    tmp_path = f"{filename}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, filename)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    if fcntl is not None:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(filename)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _apply_patches(filename, patches):
+    """Rewrite the cache with each journaled patch applied to its entry (or appended if new)."""
+    entries = []
+    if os.path.exists(filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except Exception:
+                    continue
+    ref_deltas = Counter()
+    for patch in patches:
+        value_field = patch['field']
+        fields = {k: v for k, v in patch.items() if k not in ('artist', 'title', 'field')}
+        found = False
+        for entry in entries:
+            if entry.get('artist') == patch['artist'] and entry.get('title') == patch['title']:
+                ref_deltas[entry.get(value_field + REF_SUFFIX)] -= 1
+                ref_deltas[fields.get(value_field + REF_SUFFIX)] += 1
+                stale_fields = (value_field, value_field + COMPRESSED_SUFFIX,
+                                value_field + REF_SUFFIX, 'zdict')
+                for stale in stale_fields:
+                    entry.pop(stale, None)
+                entry.update(fields)
+                found = True
+        if not found:
+            ref_deltas[fields.get(value_field + REF_SUFFIX)] += 1
+            entries.append({'artist': patch['artist'], 'title': patch['title'], **fields})
+    atomic_write_lines(filename,
+                       (json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries))
+    ref_deltas.pop(None, None)
+    store = blob_store_dir(filename)
+    if store and any(ref_deltas.values()):
+        _adjust_refcounts(store, ref_deltas)
+
+
+def _replay_journal(filename):
+    """Apply updates journaled by a writer that crashed before replacing the cache (under lock)."""
+    journal_path = filename + JOURNAL_SUFFIX
+    if not os.path.exists(journal_path):
+        return
+    patches = []
+    with open(journal_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                patches.append(json.loads(line))
+            except Exception:
+                # A torn final line means the crash happened before the update was acknowledged.
+                continue
+    if patches:
+        logger.warning(f"Replaying {len(patches)} journaled update(s) for {filename}")
+        _apply_patches(filename, patches)
+    os.remove(journal_path)
+
+
+def recover_cache(filename):
+    """Finish any interrupted write to a cache file before reading it."""
+    if os.path.exists(filename + JOURNAL_SUFFIX):
+        with cache_lock(filename):
+            _replay_journal(filename)
+
+
+def _read_dictionary(path):
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _zdicts.get(path)
+    if cached is None or cached[0] != mtime_ns:
+        with open(path, 'rb') as f:
+            cached = (mtime_ns, f.read())
+        _zdicts[path] = cached
+    return cached[1]
+
+
+def load_cache_dictionary(filename, dict_id=None):
+    """
+    Return the preset dictionary new values of a cache file are compressed with, or None if it has
+    none. With dict_id, return the dictionary records stamped with that id were compressed with.
+    """
+    if dict_id is None:
+        return _read_dictionary(filename + ZDICT_SUFFIX)
+    zdict = _read_dictionary(f"{filename}{ZDICT_SUFFIX}.{dict_id}")
+    if zdict is None:
+        # Caches compressed before dictionaries were kept by id only have the current one
+        zdict = _read_dictionary(filename + ZDICT_SUFFIX)
+    return zdict
+
+
+def save_cache_dictionary(filename, zdict, current=False):
+    """
+    Keep zdict by id next to the cache, so records compressed with it stay readable, and with
+    current=True make it the dictionary new values are compressed with. Each file is replaced
+    atomically.
+    """
+    paths = [f"{filename}{ZDICT_SUFFIX}.{dictionary_id(zdict)}"]
+    if current:
+        paths.append(filename + ZDICT_SUFFIX)
+    for path in paths:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zdict)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+def dictionary_id(zdict):
+    return zlib.adler32(zdict)
+
+
+def compress_value(value, zdict):
+    compressor = zlib.compressobj(level=9, zdict=zdict)
+    return compressor.compress(value.encode('utf-8')) + compressor.flush()
+
+
+def decompress_value(data, zdict):
+    decompressor = zlib.decompressobj(zdict=zdict)
+    return (decompressor.decompress(data) + decompressor.flush()).decode('utf-8')
+
+
+def blob_store_dir(filename):
+    """Return the blob store used by a cache file, or None if deduplication is not enabled."""
+    store = os.path.join(os.path.dirname(filename), BLOBS_DIR_NAME)
+    return store if os.path.isdir(store) else None
+
+
+def _blob_path(store, digest):
+    return os.path.join(store, digest[:2], digest)
+
+
+def content_digest(value):
+    """The sha256 a body is stored under in the blob store."""
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def put_blob(store, value):
+    """Store a body once under its sha256 and return the digest. Caller holds the cache lock."""
+    data = value.encode('utf-8')
+    digest = content_digest(value)
+    path = _blob_path(store, digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return digest
+
+
+@functools.lru_cache(maxsize=1024)
+def read_blob(store, digest):
+    """Read a blob; bodies are immutable, so repeated reads return the same cached string."""
+    with open(_blob_path(store, digest), 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def load_refcounts(store):
+    try:
+        with open(os.path.join(store, REFCOUNTS_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_refcounts(store, refcounts):
+    path = os.path.join(store, REFCOUNTS_NAME)
+    atomic_write_lines(path, [json.dumps({k: v for k, v in refcounts.items() if v > 0})])
+
+
+def _adjust_refcounts(store, deltas):
+    path = os.path.join(store, REFCOUNTS_NAME)
+    with cache_lock(path):
+        refcounts = load_refcounts(store)
+        for digest, delta in deltas.items():
+            refcounts[digest] = refcounts.get(digest, 0) + delta
+        save_refcounts(store, refcounts)
+
+
+def encode_value(entry, value_field, value, zdict=None, blobs=None):
+    """
+    Store value in entry. Long values go to the blob store when one is given, otherwise they are
+    compressed with zdict when one is given.
+    """
+    entry.pop(value_field, None)
+    entry.pop(value_field + COMPRESSED_SUFFIX, None)
+    entry.pop(value_field + REF_SUFFIX, None)
+    entry.pop('zdict', None)
+    if not isinstance(value, str) or len(value) < COMPRESS_MIN_LENGTH:
+        entry[value_field] = value
+    elif blobs:
+        entry[value_field + REF_SUFFIX] = put_blob(blobs, value)
+    elif zdict:
+        compressed = compress_value(value, zdict)
+        entry[value_field + COMPRESSED_SUFFIX] = base64.b64encode(compressed).decode('ascii')
+        entry['zdict'] = dictionary_id(zdict)
+    else:
+        entry[value_field] = value
+
+
+def decode_value(filename, entry, value_field):
+    """Return the value stored in entry, decompressing or dereferencing it if needed."""
+    if value_field in entry:
+        return entry[value_field]
+    digest = entry.get(value_field + REF_SUFFIX)
+    if digest is not None:
+        store = os.path.join(os.path.dirname(filename), BLOBS_DIR_NAME)
+        try:
+            return read_blob(store, digest)
+        except OSError:
+            logger.error(f"Blob {digest} for '{entry_key(entry)}' in {filename} is missing.")
+            return None
+    packed = entry.get(value_field + COMPRESSED_SUFFIX)
+    if packed is None:
+        return None
+    zdict = load_cache_dictionary(filename, entry.get('zdict'))
+    if zdict is None or dictionary_id(zdict) != entry.get('zdict'):
+        logger.error(f"Compressed entry '{entry_key(entry)}' in {filename} does not match its "
+                     f"dictionary.")
+        return None
+    return decompress_value(base64.b64decode(packed), zdict)
+
 # JSONL cache helpers
 def jsonl_load_entry(filename, artist, title, value_field):
+    recover_cache(filename)
     if not os.path.exists(filename):
         return None
     try:
@@ -16,7 +420,7 @@ def jsonl_load_entry(filename, artist, title, value_field):
                 try:
                     entry = json.loads(line)
                     if entry.get('artist') == artist and entry.get('title') == title:
-                        return entry.get(value_field)
+                        return decode_value(filename, entry, value_field)
                 except Exception:
                     continue
         return None
@@ -28,28 +432,81 @@ def jsonl_load_entry(filename, artist, title, value_field):
 
 # Add or update an entry in JSONL file
 def jsonl_save_entry(filename, artist, title, value, value_field):
-    entries = []
-    found = False
-    if os.path.exists(filename):
+    """
+    Add or update an entry, safely against concurrent writers and crashes.
+
+    The update is appended to a write-ahead journal before the cache is rewritten to a temporary
+    file and renamed over the original, all under an exclusive lock on the cache. A journal left
+    behind by a crash is replayed by the next reader or writer.
+    """
+    with cache_lock(filename):
+        _replay_journal(filename)
+        indexed = os.path.exists(filename + SEARCH_INDEX_SUFFIX)
+        previous = file_signature(filename) if indexed else None
+        patch = {'artist': artist, 'title': title, 'field': value_field,
+                 'updated': int(time.time())}
+        encode_value(patch, value_field, value, load_cache_dictionary(filename),
+                     blob_store_dir(filename))
+        journal_path = filename + JOURNAL_SUFFIX
+        with open(journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(patch, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        _apply_patches(filename, [patch])
+        os.remove(journal_path)
+        if indexed:
+            from app.search_index import index_cache_write
+            index_cache_write(filename, artist, title, value, value_field, previous)
+
+
+def rewrite_cache_values(filename, value_field, transform):
+    """
+    Apply transform to every stored value of a cache, under its lock, for maintenance scripts.
+
+    Values are read through decode_value and changed ones are stored the way they were: compressed
+    values keep their dictionary id, and referenced bodies move to the blob of the new body, with
+    refcounts.json updated. Other records and unreadable lines are kept as they are.
+    Returns the number of records changed.
+    """
+    recover_cache(filename)
+    if not os.path.exists(filename):
+        return 0
+    with cache_lock(filename):
+        _replay_journal(filename)
+        store = blob_store_dir(filename)
+        lines = []
+        ref_deltas = Counter()
+        changed = 0
         with open(filename, 'r', encoding='utf-8') as f:
             for line in f:
                 try:
                     entry = json.loads(line)
-                    if entry.get('artist') == artist and entry.get('title') == title:
-                        entry[value_field] = value
-                        found = True
-                    entries.append(entry)
+                    value = decode_value(filename, entry, value_field)
                 except Exception:
+                    lines.append(line)
                     continue
-    if not found:
-        entries.append({'artist': artist, 'title': title, value_field: value})
-    with open(filename, 'w', encoding='utf-8') as f:
-        for entry in entries:
-            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                new_value = transform(value) if isinstance(value, str) and value else value
+                if new_value == value:
+                    lines.append(line)
+                    continue
+                old_ref = entry.get(value_field + REF_SUFFIX)
+                zdict = (load_cache_dictionary(filename, entry['zdict']) if 'zdict' in entry
+                         else None)
+                encode_value(entry, value_field, new_value, zdict, store if old_ref else None)
+                ref_deltas[old_ref] -= 1
+                ref_deltas[entry.get(value_field + REF_SUFFIX)] += 1
+                lines.append(json.dumps(entry, ensure_ascii=False) + '\n')
+                changed += 1
+        atomic_write_lines(filename, lines)
+        ref_deltas.pop(None, None)
+        if store and any(ref_deltas.values()):
+            _adjust_refcounts(store, ref_deltas)
+    return changed
 
 # For compatibility: load all entries as a dict (for summary/reporting)
 def jsonl_load_all(filename, value_field):
     result = {}
+    recover_cache(filename)
     if not os.path.exists(filename):
         return result
     with open(filename, 'r', encoding='utf-8') as f:
@@ -57,7 +514,135 @@ def jsonl_load_all(filename, value_field):
             try:
                 entry = json.loads(line)
                 key = f"{entry.get('artist', '')} - {entry.get('title', '')}"
-                result[key] = entry.get(value_field)
+                result[key] = decode_value(filename, entry, value_field)
             except Exception:
                 continue
     return result
+
+
+def jsonl_scan(f):
+    """Yield (entry, offset, length) for every decodable line of a binary JSONL stream."""
+    offset = 0
+    for line in iter(f.readline, b''):
+        length = len(line)
+        try:
+            entry = json.loads(line)
+        except Exception:
+            entry = None
+        if isinstance(entry, dict):
+            yield entry, offset, length
+        offset += length
+
+
+def _load_index(index_path, stat):
+    """Load a persisted index, or return None if it is missing or stale."""
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('size') != stat.st_size or data.get('mtime_ns') != stat.st_mtime_ns:
+        return None
+    return {key: tuple(span) for key, span in data.get('entries', {}).items()}
+
+
+def _save_index(index_path, stat, index):
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'entries': index}, f,
+                      ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        # The index is only an accelerator; a read-only cache directory must not break reads.
+        logger.warning(f"Could not persist cache index '{index_path}': {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class JsonlCacheView(Mapping):
+    """
+    Read-only mapping of "artist - title" to a cached value, backed by a memory-mapped JSONL file.
+
+    Only the (offset, length) index is held in memory; a record is decoded when it is accessed.
+    The index is persisted next to the cache file and rebuilt whenever the cache file changes.
+    Like jsonl_load_all, the last record for a key wins.
+    """
+
+    def __init__(self, filename, value_field):
+        self.filename = filename
+        self.value_field = value_field
+        self._file = None
+        self._mmap = None
+        self._index = {}
+        recover_cache(filename)
+        if not os.path.exists(filename):
+            return
+        self._file = open(filename, 'rb')
+        stat = os.fstat(self._file.fileno())
+        if stat.st_size == 0:
+            return
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        index_path = filename + INDEX_SUFFIX
+        index = _load_index(index_path, stat)
+        if index is None:
+            logger.debug(f"Building cache index for {filename}")
+            index = {entry_key(entry): (offset, length)
+                     for entry, offset, length in jsonl_scan(self._mmap)}
+            _save_index(index_path, stat, index)
+        self._index = index
+
+    def _entry(self, key):
+        offset, length = self._index[key]
+        return json.loads(self._mmap[offset:offset + length])
+
+    def __getitem__(self, key):
+        return decode_value(self.filename, self._entry(key), self.value_field)
+
+    def body(self, key):
+        """(value, blob digest) of a key; the digest is None unless the body is a blob."""
+        if key not in self._index:
+            return None, None
+        entry = self._entry(key)
+        value = decode_value(self.filename, entry, self.value_field)
+        return value, entry.get(self.value_field + REF_SUFFIX)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._index = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def cached_body(cache, key):
+    """
+    (value, content digest) of a cached body, or (None, None) if it is not cached. The digest is the
+    record's blob reference when it has one, so shared bodies are recognised without hashing them.
+    """
+    value, digest = cache.body(key) if isinstance(cache, JsonlCacheView) else (cache.get(key), None)
+    if not value:
+        return None, None
+    return value, digest or content_digest(value)
+
+
+# Lazily decoded alternative to jsonl_load_all for large caches
+def jsonl_load_view(filename, value_field):
+    return JsonlCacheView(filename, value_field)
@@ -0,0 +1,209 @@
+import json
+import logging
+import os
+import time
+from app.blob_store import collect_garbage
+from app.cache import (
+    CACHE_FILES, atomic_write_lines, cache_lock, decode_value, entry_is_found, entry_key,
+    jsonl_load_entry, recover_cache,
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR_NAME = 'archive'
+# Why an entry was evicted, as recorded in the archive
+ORPHAN = 'not in song lists'
+DUPLICATE = 'duplicate'
+EXPIRED = 'expired not-found'
+UNREADABLE = 'unreadable'
+# Live songs whose lookup time is measured before and after compaction
+LOOKUP_SAMPLE = 25
+
+
+def _read_lines(filename):
+    with open(filename, 'rb') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except Exception:
+                entry = None
+            yield line, entry if isinstance(entry, dict) else None
+
+
+def _is_expired(entry, value_field, max_age, now):
+    """A not-found sentinel older than max_age seconds; untimestamped ones count as old."""
+    if max_age is None or entry_is_found(entry, value_field):
+        return False
+    return now - entry.get('updated', 0) > max_age
+
+
+def _archive_record(filename, entry, value_field, reason, now):
+    """An evicted entry with its value inlined, so the archive outlives blob GC and dictionaries."""
+    record = {'artist': entry.get('artist'), 'title': entry.get('title'),
+              value_field: decode_value(filename, entry, value_field)}
+    if 'updated' in entry:
+        record['updated'] = entry['updated']
+    record.update({'evicted': reason, 'evicted_at': now})
+    return json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def compact_cache(filename, value_field, live_keys=None, max_negative_age=None, archive_path=None,
+                  now=None):
+    """
+    Rewrite a cache keeping one record per live song.
+
+    Records for songs outside live_keys (None keeps every song), all but the last record of a key
+    (the one lookups through the cache view see), not-found sentinels older than max_negative_age
+    seconds and unreadable lines are evicted and appended to archive_path. The cache is streamed
+    twice under its lock, holding only the last line number of each key in memory.
+    Returns {'records', 'kept', 'bytes_before', 'bytes_after', 'evicted': {reason: count}}.
+    """
+    now = int(time.time()) if now is None else now
+    stats = {'records': 0, 'kept': 0, 'bytes_before': 0, 'bytes_after': 0, 'evicted': {}}
+    recover_cache(filename)
+    if not os.path.exists(filename):
+        return stats
+    with cache_lock(filename):
+        last_line = {}
+        for number, (_, entry) in enumerate(_read_lines(filename)):
+            if entry is not None:
+                last_line[entry_key(entry)] = number
+        stats['bytes_before'] = os.path.getsize(filename)
+        archive = None
+        try:
+            def kept_lines():
+                nonlocal archive
+                for number, (line, entry) in enumerate(_read_lines(filename)):
+                    stats['records'] += 1
+                    if entry is None:
+                        reason = UNREADABLE
+                    elif last_line[entry_key(entry)] != number:
+                        reason = DUPLICATE
+                    elif live_keys is not None and entry_key(entry) not in live_keys:
+                        reason = ORPHAN
+                    elif _is_expired(entry, value_field, max_negative_age, now):
+                        reason = EXPIRED
+                    else:
+                        stats['kept'] += 1
+                        yield line.decode('utf-8')
+                        continue
+                    stats['evicted'][reason] = stats['evicted'].get(reason, 0) + 1
+                    if archive_path is None:
+                        continue
+                    if archive is None:
+                        os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+                        archive = open(archive_path, 'a', encoding='utf-8')
+                    if entry is None:
+                        record = {'raw': line.decode('utf-8', 'replace'), 'evicted': reason,
+                                  'evicted_at': now}
+                        archive.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    else:
+                        archive.write(_archive_record(filename, entry, value_field, reason, now))
+                if archive is not None:
+                    # Make the archive durable before the compacted cache replaces the original
+                    archive.flush()
+                    os.fsync(archive.fileno())
+
+            atomic_write_lines(filename, kept_lines())
+        finally:
+            if archive is not None:
+                archive.close()
+        stats['bytes_after'] = os.path.getsize(filename)
+    return stats
+
+
+def _scan_seconds(filename):
+    """Time a full parse of the cache, the worst case of jsonl_load_entry and jsonl_load_all."""
+    start = time.perf_counter()
+    for _ in _read_lines(filename):
+        pass
+    return time.perf_counter() - start
+
+
+def _lookup_seconds(filename, value_field, keys):
+    """Mean jsonl_load_entry time over keys, given as (artist, title) pairs."""
+    if not keys:
+        return 0.0
+    start = time.perf_counter()
+    for artist, title in keys:
+        jsonl_load_entry(filename, artist, title, value_field)
+    return (time.perf_counter() - start) / len(keys)
+
+
+def _sample_keys(filename, live_keys):
+    """Up to LOOKUP_SAMPLE live (artist, title) pairs spread over the cache file."""
+    keys = []
+    seen = set()
+    for _, entry in _read_lines(filename):
+        if entry is not None and entry_key(entry) not in seen:
+            seen.add(entry_key(entry))
+            if live_keys is None or entry_key(entry) in live_keys:
+                keys.append((entry.get('artist'), entry.get('title')))
+    step = max(1, len(keys) // LOOKUP_SAMPLE)
+    return keys[::step][:LOOKUP_SAMPLE]
+
+
+def collect_cache(cache_dir, songs=None, max_negative_age=None, now=None):
+    """
+    Compact the lyrics and chords caches of cache_dir down to the songs of the given song lists,
+    archive evicted entries under cache_dir/archive/, then delete blobs nothing references anymore.
+
+    songs=None keeps every song and only removes duplicates and expired not-found sentinels.
+    Returns ({cache file: stats}, blob GC result), where stats are compact_cache's plus scan and
+    lookup times before and after, and the blob GC result is (kept, removed, bytes freed).
+    """
+    now = int(time.time()) if now is None else now
+    live_keys = None
+    if songs is not None:
+        live_keys = {f"{song['Artist']} - {song['Title']}" for song in songs}
+        if not live_keys:
+            raise ValueError("The song lists are empty; refusing to evict every cached song.")
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now))
+    results = {}
+    for name, value_field in CACHE_FILES:
+        filename = os.path.join(cache_dir, name)
+        if not os.path.exists(filename):
+            continue
+        recover_cache(filename)
+        sample = _sample_keys(filename, live_keys)
+        scan_before = _scan_seconds(filename)
+        lookup_before = _lookup_seconds(filename, value_field, sample)
+        archive_path = os.path.join(cache_dir, ARCHIVE_DIR_NAME,
+                                    f"{os.path.splitext(name)[0]}.{stamp}.jsonl")
+        stats = compact_cache(filename, value_field, live_keys, max_negative_age, archive_path, now)
+        stats.update({
+            'archive': archive_path if os.path.exists(archive_path) else None,
+            'scan_before': scan_before, 'scan_after': _scan_seconds(filename),
+            'lookup_before': lookup_before,
+            'lookup_after': _lookup_seconds(filename, value_field, sample),
+        })
+        results[filename] = stats
+        logger.info(f"Compacted {filename}: {stats['records']} -> {stats['kept']} records.")
+    return results, collect_garbage(cache_dir)
+
+
+def _percent_saved(before, after):
+    return f"{(1 - after / before):.0%}" if before else "0%"
+
+
+def format_gc_report(results, blobs):
+    lines = []
+    for filename, stats in results.items():
+        evicted = ', '.join(f"{count} {reason}"
+                            for reason, count in sorted(stats['evicted'].items()))
+        lines.append(f"{filename}: {stats['records']} -> {stats['kept']} records"
+                     + (f" (evicted {evicted})" if evicted else ""))
+        lines.append(f"  Size: {stats['bytes_before']} -> {stats['bytes_after']} bytes "
+                     f"({_percent_saved(stats['bytes_before'], stats['bytes_after'])} saved)")
+        lines.append(f"  Full scan: {stats['scan_before'] * 1000:.1f} -> "
+                     f"{stats['scan_after'] * 1000:.1f} ms, "
+                     f"lookup: {stats['lookup_before'] * 1000:.2f} -> "
+                     f"{stats['lookup_after'] * 1000:.2f} ms "
+                     f"({_percent_saved(stats['lookup_before'], stats['lookup_after'])} faster)")
+        if stats['archive']:
+            lines.append(f"  Evicted entries archived to {stats['archive']}")
+    kept, removed, freed = blobs
+    if kept or removed:
+        lines.append(f"Blobs: {kept} kept, {removed} removed, {freed} bytes freed")
+    return '\n'.join(lines)
@@ -0,0 +1,251 @@
+import re
+import threading
+from array import array
+from app.text_cleaning import BRACKETED_CHORD_RE, chord_line_chords
+
+# Note spellings by target key: sharps for sharp keys, flats for flat keys, the common mix for
+# C / Am
+NOTE_NAMES = ['C', 'C#', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'Ab', 'A', 'Bb', 'B']
+SHARP_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+FLAT_NAMES = ['C', 'Db', 'D', 'Eb', 'E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B']
+# Major key roots (as note values) with sharps and with flats in their key signature; a minor key
+# is spelled like its relative major
+SHARP_KEYS = {7, 2, 9, 4, 11, 6, 1}
+FLAT_KEYS = {5, 10, 3, 8}
+NOTE_VALUES = {
+    'C': 0, 'B#': 0, 'C#': 1, 'Db': 1, 'D': 2, 'D#': 3, 'Eb': 3, 'E': 4, 'Fb': 4, 'E#': 5, 'F': 5,
+    'F#': 6, 'Gb': 6, 'G': 7, 'G#': 8, 'Ab': 8, 'A': 9, 'A#': 10, 'Bb': 10, 'B': 11, 'Cb': 11,
+}
+SYMBOL_RE = re.compile(r'([A-G][#b]?)(.*?)(?:/([A-G][#b]?))?')
+
+# Line kinds: lyrics (with any inline [G] chords taken out) or a line of chords (see
+# chord_line_chords)
+TEXT_LINE = 0
+CHORD_LINE = 1
+
+
+class ChordTable:
+    """
+    Chord symbols interned to small integer ids, shared by every parsed sheet.
+
+    A transform (transpose, simplify) is computed once per distinct symbol into an id -> id mapping,
+    which sheets then apply to their chord id arrays.
+    """
+
+    def __init__(self):
+        self.symbols = []
+        self.ids = {}
+        self._mappings = {}
+        self._lock = threading.RLock()
+
+    def id_of(self, symbol):
+        chord_id = self.ids.get(symbol)
+        if chord_id is None:
+            with self._lock:
+                chord_id = self.ids.get(symbol)
+                if chord_id is None:
+                    chord_id = self.ids[symbol] = len(self.symbols)
+                    self.symbols.append(symbol)
+        return chord_id
+
+    def mapping(self, transform):
+        """The id -> transformed id array for transform, extended to symbols interned since."""
+        with self._lock:
+            mapping = self._mappings.setdefault(transform.key, array('H'))
+            # Transformed symbols are interned too, so keep going until every id has an entry
+            while len(mapping) < len(self.symbols):
+                mapping.append(self.id_of(transform(self.symbols[len(mapping)])))
+            return mapping
+
+
+CHORD_TABLE = ChordTable()
+
+
+class ChordTransform:
+    """
+    Transpose by semitones (a capo on fret N is a transposition by -N), then optionally simplify
+    to triads.
+    """
+
+    def __init__(self, semitones=0, simplify=False, note_names=NOTE_NAMES):
+        self.semitones = semitones % 12
+        self.simplify = simplify
+        self.note_names = note_names
+        self.key = (self.semitones, simplify, tuple(note_names))
+
+    def is_identity(self):
+        return not self.semitones and not self.simplify
+
+    def for_key(self, root, minor=False):
+        """
+        This transform spelled for a sheet in the key of root (a note value), with sharps or flats
+        as the target key has.
+        """
+        if not self.semitones:
+            return self
+        major = (root + self.semitones + (3 if minor else 0)) % 12
+        names = (SHARP_NAMES if major in SHARP_KEYS else FLAT_NAMES if major in FLAT_KEYS
+                 else NOTE_NAMES)
+        return ChordTransform(self.semitones, self.simplify, names)
+
+    def _note(self, note):
+        if not self.semitones:
+            return note
+        return self.note_names[(NOTE_VALUES[note] + self.semitones) % 12]
+
+    def __call__(self, symbol):
+        match = SYMBOL_RE.fullmatch(symbol)
+        if not match:
+            return symbol
+        root, quality, bass = match.groups()
+        if self.simplify:
+            minor = quality.startswith(('m', 'dim', '-')) and not quality.startswith('maj')
+            return self._note(root) + ('m' if minor else '')
+        return self._note(root) + quality + (f"/{self._note(bass)}" if bass else '')
+
+
+class ChordSheet:
+    """
+    A cleaned chord sheet as arrays: one text per line, a kind per line, and one
+    (line, column, chord id) triple per chord, so a transform is an array remap plus a re-render.
+    Lyric lines keep their text with inline chords taken out; chord lines keep their full text
+    (labels, marks, brackets) and chords are re-rendered over their original columns.
+    """
+
+    __slots__ = ('texts', 'kinds', 'chord_lines', 'chord_columns', 'chord_ids')
+
+    def __init__(self):
+        self.texts = []
+        self.kinds = array('B')
+        self.chord_lines = array('I')
+        self.chord_columns = array('H')
+        self.chord_ids = array('H')
+
+    def _add_chord(self, line_number, column, symbol, table):
+        self.chord_lines.append(line_number)
+        self.chord_columns.append(min(column, 0xFFFF))
+        self.chord_ids.append(table.id_of(symbol))
+
+    @classmethod
+    def parse(cls, text, table=CHORD_TABLE):
+        sheet = cls()
+        for line_number, line in enumerate(text.split('\n')):
+            chords = chord_line_chords(line)
+            if chords:
+                sheet.kinds.append(CHORD_LINE)
+                sheet.texts.append(line)
+                for column, symbol in chords:
+                    sheet._add_chord(line_number, column, symbol, table)
+                continue
+            sheet.kinds.append(TEXT_LINE)
+            plain = []
+            column = last = 0
+            for match in BRACKETED_CHORD_RE.finditer(line):
+                plain.append(line[last:match.start()])
+                column += match.start() - last
+                last = match.end()
+                sheet._add_chord(line_number, column, match.group(1), table)
+            plain.append(line[last:])
+            sheet.texts.append(''.join(plain))
+        return sheet
+
+    def render(self, mapping=None, table=CHORD_TABLE):
+        """The sheet's lines, each chord id passed through mapping (see ChordTable.mapping)."""
+        lines = list(self.texts)
+        ids = (self.chord_ids if mapping is None
+               else array('H', map(mapping.__getitem__, self.chord_ids)))
+        chords_by_line = {}
+        for line_number, column, chord_id, original_id in zip(
+                self.chord_lines, self.chord_columns, ids, self.chord_ids):
+            chords_by_line.setdefault(line_number, []).append(
+                (column, table.symbols[chord_id], len(table.symbols[original_id])))
+        for line_number, chords in chords_by_line.items():
+            if self.kinds[line_number] == CHORD_LINE:
+                text = lines[line_number]
+                line = ''
+                end = 0
+                for column, symbol, length in chords:
+                    gap = text[end:column]
+                    if gap and not gap.strip():
+                        # Keep chords over their original columns, but never let a longer name
+                        # run into the next
+                        gap = ' ' * max(column - len(line), 1)
+                    line += gap + symbol
+                    end = column + length
+                line += text[end:]
+            else:
+                line = lines[line_number]
+                for column, symbol, _ in reversed(chords):
+                    line = f"{line[:column]}[{symbol}]{line[column:]}"
+            lines[line_number] = line
+        return lines
+
+
+def inline_chord_lines(text, table=CHORD_TABLE):
+    """
+    A chord sheet's lines with chords inline, as ChordPro has them: a chord line over a lyric
+    line is merged into it as [G] chords at their columns. Chord lines with nothing to merge into
+    (intros, labelled or instrumental lines) keep their text, with their chords bracketed in place.
+    """
+    sheet = ChordSheet.parse(text, table)
+    chords_by_line = {}
+    for line_number, column, chord_id in zip(sheet.chord_lines, sheet.chord_columns,
+                                             sheet.chord_ids):
+        chords_by_line.setdefault(line_number, []).append((column, table.symbols[chord_id]))
+    lines = []
+    line_number = 0
+    while line_number < len(sheet.texts):
+        line, kind = sheet.texts[line_number], sheet.kinds[line_number]
+        chords = chords_by_line.get(line_number, [])
+        line_number = below = line_number + 1
+        if kind == CHORD_LINE:
+            if (below < len(sheet.texts) and sheet.kinds[below] == TEXT_LINE
+                    and sheet.texts[below].strip() and below not in chords_by_line
+                    and not line[:chords[0][0]].strip()):
+                line = sheet.texts[below].ljust(chords[-1][0])
+                line_number += 1
+            else:
+                for column, symbol in reversed(chords):
+                    # Chords written as [G] on a chord line are bracketed already
+                    if line[column - 1:column] != '[':
+                        line = f"{line[:column]}[{symbol}]{line[column + len(symbol):]}"
+                lines.append(line)
+                continue
+        for column, symbol in reversed(chords):
+            line = f"{line[:column]}[{symbol}]{line[column:]}"
+        lines.append(line)
+    return lines
+
+
+def parse_chord_sheet(memo, text, table=CHORD_TABLE):
+    """Parse a cleaned chord sheet once per unique body."""
+    sheet = memo.get(text)
+    if sheet is None:
+        sheet = memo[text] = ChordSheet.parse(text, table)
+    return sheet
+
+
+def sheet_key(sheet, table=CHORD_TABLE):
+    """(root note value, minor) of a sheet's key, from its first chord; None without chords."""
+    if not sheet.chord_ids:
+        return None
+    match = SYMBOL_RE.fullmatch(table.symbols[sheet.chord_ids[0]])
+    if not match or match.group(1) not in NOTE_VALUES:
+        return None
+    quality = match.group(2)
+    return NOTE_VALUES[match.group(1)], quality.startswith('m') and not quality.startswith('maj')
+
+
+def transform_sheet(sheet, transform, table=CHORD_TABLE):
+    """Render a sheet through transform, spelled with sharps or flats for its transposed key."""
+    key = sheet_key(sheet, table)
+    spelled = transform.for_key(*key) if key else transform
+    return sheet.render(table.mapping(spelled), table)
+
+
+def transform_sheets(sheets, transform, table=CHORD_TABLE):
+    """
+    Render many sheets through one transform; symbol mappings are computed once per spelling for
+    the whole book.
+    """
+    return [transform_sheet(sheet, transform, table) for sheet in sheets]
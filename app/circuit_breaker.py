@@ -0,0 +1,148 @@
+import logging
+import threading
+import time
+from collections import deque
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Open after this many failures in a row...
+FAILURE_THRESHOLD = 5
+# ...or when at least this share of the last WINDOW calls failed (once MIN_CALLS have been made)
+ERROR_RATE = 0.5
+WINDOW = 20
+MIN_CALLS = 10
+# How long an open breaker skips its source before letting a single probe request through
+COOLDOWN_SECONDS = 300
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of making a request to a source whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Per-source breaker: closed (requests flow), open (requests are skipped until the cool-down
+    ends) and half-open (one probe request decides whether to close again or re-open).
+    """
+
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, error_rate=ERROR_RATE,
+                 window=WINDOW, min_calls=MIN_CALLS, cooldown=COOLDOWN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.calls = 0
+        self.failures = 0
+        self.skipped = 0
+        self.times_opened = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _cooling_down(self):
+        return time.monotonic() - self._opened_at < self.cooldown
+
+    def is_open(self):
+        """True while requests to the source would be refused."""
+        with self._lock:
+            if self.state == OPEN:
+                return self._cooling_down()
+            return self.state == HALF_OPEN and self._probing
+
+    def record_skip(self):
+        """Count a request the caller skipped because is_open() said so."""
+        with self._lock:
+            self.skipped += 1
+
+    def allow(self):
+        """Whether a request may be made now; an open breaker past its cool-down goes half-open."""
+        with self._lock:
+            if self.state == OPEN:
+                if self._cooling_down():
+                    self.skipped += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+                logger.info(f"{self.name}: cool-down over, probing with one request.")
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    self.skipped += 1
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.calls += 1
+            self.consecutive_failures = 0
+            self._outcomes.append(False)
+            if self.state == HALF_OPEN:
+                logger.info(f"{self.name}: probe succeeded, closing circuit.")
+                self.state = CLOSED
+                self._probing = False
+                self._outcomes.clear()
+
+    def record_failure(self):
+        with self._lock:
+            self.calls += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self._outcomes.append(True)
+            failure_rate = sum(self._outcomes) / len(self._outcomes)
+            if (self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold
+                    or (len(self._outcomes) >= self.min_calls and failure_rate >= self.error_rate)):
+                self._open()
+
+    def record_inconclusive(self):
+        """A request ended without a verdict on the source, e.g. a timeout cut by our budget."""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probing:
+                # Free the probe slot: back to open with a fresh cool-down, so a later probe decides
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._probing = False
+        self.times_opened += 1
+        logger.warning(f"{self.name}: circuit opened after {self.consecutive_failures} consecutive "
+                       f"failure(s); skipping it for {self.cooldown}s.")
+
+    def describe(self):
+        with self._lock:
+            state = self.state
+            if state == OPEN and not self._cooling_down():
+                state = f"{OPEN}, probing next"
+            return (f"{self.name}: {state} ({self.failures}/{self.calls} requests failed, "
+                    f"opened {self.times_opened}x, {self.skipped} request(s) skipped)")
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(source_name):
+    """The process-wide breaker of a source, created on first use."""
+    with _breakers_lock:
+        breaker = _breakers.get(source_name)
+        if breaker is None:
+            breaker = _breakers[source_name] = CircuitBreaker(source_name)
+        return breaker
+
+
+def breaker_summary():
+    """One line per source that failed at least once, for the run summary."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.describe() for breaker in breakers if breaker.failures or breaker.skipped]
@@ -0,0 +1,51 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Deadlines (time.monotonic() values) of the enclosing budget scopes, innermost last
+_deadlines = ContextVar('deadlines', default=())
+
+
+class BudgetExceeded(Exception):
+    """Raised instead of starting a request once the enclosing time budget is spent."""
+
+
+@contextmanager
+def time_budget(seconds):
+    """
+    Run the body under a time budget of seconds (None for no limit).
+
+    Budgets nest: a per-song budget inside a per-run budget ends at whichever runs out first.
+    The budget is per context, so threads of the build service each keep their own.
+    """
+    if seconds is None:
+        yield
+        return
+    token = _deadlines.set(_deadlines.get() + (time.monotonic() + seconds,))
+    try:
+        yield
+    finally:
+        _deadlines.reset(token)
+
+
+def remaining_time():
+    """Seconds left in the innermost-ending enclosing budget, or None when there is no budget."""
+    deadlines = _deadlines.get()
+    if not deadlines:
+        return None
+    return min(deadlines) - time.monotonic()
+
+
+def budget_spent():
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+def capped_timeout(timeout):
+    """A request timeout cut down to the remaining budget; raises BudgetExceeded if none is left."""
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise BudgetExceeded("Time budget spent")
+    return remaining if timeout is None else min(timeout, remaining)
@@ -1,70 +1,207 @@
 from docx import Document
+import io
 import logging
+import os
+from collections import OrderedDict
 from app.document_formatting import set_document_margins, set_paragraph_font, create_two_column_section, add_header_footer, sort_songs
 from app.text_cleaning import clean_lyrics, clean_chords
+from app.songbook_writers import STREAMING_WRITERS
+from app.chord_sheet import parse_chord_sheet, transform_sheet
+from app.cache import cached_body, content_digest
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def create_document_from_cache(song_list, lyrics_cache, chords_cache, lyrics_output=None, chords_output=None):
+# Unique bodies kept while writing a book without a memo; the least recently used are dropped
+BUILD_MEMO_SIZE = 256
+
+
+class BoundedMemo(OrderedDict):
+    """A memo that keeps only its max_size most recently used entries."""
+
+    def __init__(self, max_size):
+        super().__init__()
+        self.max_size = max_size
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if len(self) > self.max_size:
+            self.popitem(last=False)
+
+
+def prepare_body(memo, text, clean, digest=None):
+    """
+    Clean text and split it into lines, once per unique body (covers, duplicate rows). memo is keyed
+    by content digest: the blob store's when the body has one, else the text's sha256.
+    """
+    digest = digest or content_digest(text)
+    prepared = memo.get(digest)
+    if prepared is None:
+        cleaned = clean(text)
+        prepared = memo[digest] = (cleaned, cleaned.split('\n'))
+    return prepared
+
+
+def _new_songbook_document():
+    document = Document()
+    set_document_margins(document, 0.5)
+    create_two_column_section(document)
+    add_header_footer(document)
+    return document
+
+
+def build_docx_template():
+    """Build the base songbook document once and return it as .docx bytes, to reuse across books."""
+    buffer = io.BytesIO()
+    _new_songbook_document().save(buffer)
+    return buffer.getvalue()
+
+
+class DocxSongbookWriter:
+    """The two-column .docx songbook; python-docx builds it in memory and it is saved on close."""
+
+    def __init__(self, path, template=None):
+        self.path = path
+        self.document = Document(io.BytesIO(template)) if template else _new_songbook_document()
+
+    def add_song(self, title, artist, lines):
+        heading = self.document.add_heading(f"{title} by {artist}", level=1)
+        set_paragraph_font(heading, 14)
+        paragraph = self.document.add_paragraph()
+        for i, line in enumerate(lines):
+            if i > 0:
+                paragraph.add_run().add_break()
+            paragraph.add_run(line)
+        set_paragraph_font(paragraph, 12)
+
+    def close(self):
+        self.document.save(self.path)
+
+    def abort(self):
+        """Nothing is on disk before close."""
+        self.document = None
+
+
+def open_songbook_writer(path, kind, template=None):
+    """Pick the output engine from the file extension: .docx, .html or .chopro."""
+    writer_class = STREAMING_WRITERS.get(os.path.splitext(path)[1].lower())
+    if writer_class:
+        return writer_class(path, kind)
+    return DocxSongbookWriter(path, template)
+
+
+def new_prepared_memo(max_size=None):
+    """
+    Cleaned bodies keyed by content digest, and parsed chord sheets keyed by cleaned text; with
+    max_size, each keeps only that many of the most recently used.
+    """
+    return {kind: BoundedMemo(max_size) if max_size else {}
+            for kind in ('lyrics', 'chords', 'sheets')}
+
+
+def prepare_cache_entries(song_list, lyrics_cache, chords_cache, memo):
+    """Clean every cached body the song list uses into memo, once per unique body."""
+    for song in song_list:
+        cache_key = f"{song['Artist']} - {song['Title']}"
+        raw_lyrics, digest = cached_body(lyrics_cache, cache_key)
+        if raw_lyrics:
+            prepare_body(memo['lyrics'], raw_lyrics, clean_lyrics, digest)
+        raw_chords, digest = cached_body(chords_cache, cache_key)
+        if raw_chords:
+            prepare_body(memo['chords'], raw_chords, clean_chords, digest)
+
+
+def _add_song(writer, fragments, title, artist, text, lines):
+    """Add a song, reusing its rendered fragment when the engine renders them (HTML, ChordPro)."""
+    if fragments is None or not hasattr(writer, 'render'):
+        writer.add_song(title, artist, lines)
+        return
+    key = (type(writer), title, artist, text)
+    fragment = fragments.get(key)
+    if fragment is None:
+        fragment = fragments[key] = writer.render(title, artist, lines)
+    writer.add_fragment(fragment)
+
+
+def create_document_from_cache(song_list, lyrics_cache, chords_cache, lyrics_output=None,
+                               chords_output=None, template=None, memo=None, fragments=None,
+                               chord_transform=None):
+    """
+    Write the lyrics and/or chords songbook for song_list from the caches.
+
+    memo (from new_prepared_memo) keeps cleaned bodies and parsed sheets for reuse by later books;
+    without one, a memo of BUILD_MEMO_SIZE bodies lasts for this build only. If writing fails,
+    partly written books are discarded.
+    """
     logger.debug("Running create_document_from_cache function")
 
+    lyrics_document = chords_document = None
+    writers = []
+    try:
+        if lyrics_output:
+            logger.debug("Initializing lyrics document")
+            lyrics_document = open_songbook_writer(lyrics_output, 'lyrics', template)
+            writers.append(lyrics_document)
+
+        if chords_output:
+            logger.debug("Initializing chords document")
+            chords_document = open_songbook_writer(chords_output, 'chords', template)
+            writers.append(chords_document)
+
+        _write_songs(song_list, lyrics_cache, chords_cache, lyrics_document, chords_document, memo,
+                     fragments, chord_transform)
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+        raise
+
     if lyrics_output:
-        logger.debug("Initializing lyrics document")
-        lyrics_document = Document()
-        set_document_margins(lyrics_document, 0.5)
-        create_two_column_section(lyrics_document)
-        add_header_footer(lyrics_document)
+        lyrics_document.close()
+        logger.info(f"Lyrics document saved as {lyrics_output}.")
 
     if chords_output:
-        logger.debug("Initializing chords document")
-        chords_document = Document()
-        set_document_margins(chords_document, 0.5)
-        create_two_column_section(chords_document)
-        add_header_footer(chords_document)
+        chords_document.close()
+        logger.info(f"Chords document saved as {chords_output}.")
 
+
+def _write_songs(song_list, lyrics_cache, chords_cache, lyrics_document, chords_document, memo,
+                 fragments, chord_transform):
     sorted_songs = sort_songs(song_list)
+    if memo is None:
+        memo = new_prepared_memo(BUILD_MEMO_SIZE)
+    if chord_transform is not None and chord_transform.is_identity():
+        chord_transform = None
 
     for song in sorted_songs:
         artist = song['Artist']
         title = song['Title']
         cache_key = f"{artist} - {title}"
 
-        if lyrics_output and cache_key in lyrics_cache and bool(lyrics_cache[cache_key]):
-            lyrics = clean_lyrics(lyrics_cache[cache_key])
+        raw_lyrics, digest = (cached_body(lyrics_cache, cache_key) if lyrics_document
+                              else (None, None))
+        if raw_lyrics:
+            lyrics, lines = prepare_body(memo['lyrics'], raw_lyrics, clean_lyrics, digest)
             num_characters = len(lyrics)
             logger.debug(f"Adding lyrics for {title} by {artist}")
 
             if num_characters <= 5000:
-                heading = lyrics_document.add_heading(f"{title} by {artist}", level=1)
-                set_paragraph_font(heading, 14)
-                paragraph = lyrics_document.add_paragraph()
-                lines = lyrics.split('\n')
-                for i, line in enumerate(lines):
-                    if i > 0:
-                        paragraph.add_run().add_break()
-                    paragraph.add_run(line)
-                set_paragraph_font(paragraph, 12)
+                _add_song(lyrics_document, fragments, title, artist, lyrics, lines)
             else:
                 logger.debug(f"Lyrics for {title} are too long and have been excluded.")
 
-        if chords_output and cache_key in chords_cache and bool(chords_cache[cache_key]):
-            chords = clean_chords(chords_cache[cache_key])
+        raw_chords, digest = (cached_body(chords_cache, cache_key) if chords_document
+                              else (None, None))
+        if raw_chords:
+            chords, lines = prepare_body(memo['chords'], raw_chords, clean_chords, digest)
+            if chord_transform is not None:
+                sheet = parse_chord_sheet(memo.setdefault('sheets', {}), chords)
+                lines = transform_sheet(sheet, chord_transform)
+                chords = '\n'.join(lines)
             logger.debug(f"Adding chords for {title} by {artist}")
-            heading = chords_document.add_heading(f"{title} by {artist}", level=1)
-            set_paragraph_font(heading, 14)
-            paragraph = chords_document.add_paragraph()
-            lines = chords.split('\n')
-            for i, line in enumerate(lines):
-                if i > 0:
-                    paragraph.add_run().add_break()
-                paragraph.add_run(line)
-            set_paragraph_font(paragraph, 12)
-
-    if lyrics_output:
-        lyrics_document.save(lyrics_output)
-        logger.info(f"Lyrics document saved as {lyrics_output}.")
-
-    if chords_output:
-        chords_document.save(chords_output)
-        logger.info(f"Chords document saved as {chords_output}.")
+            _add_song(chords_document, fragments, title, artist, chords, lines)
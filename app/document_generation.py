@@ -1,84 +1,173 @@
+import contextvars
 import logging
-from app.fetch_data import get_lyrics_from_sources, get_chords_from_sources
-from app.cache import jsonl_save_entry, jsonl_load_entry, jsonl_load_all
+import threading
+from app.fetch_data import (
+    get_lyrics_from_sources, get_chords_from_sources, query_variants, skipped_sources,
+)
+from app.circuit_breaker import breaker_summary
+from app.deadline import budget_spent, time_budget
+from app.cache import (
+    jsonl_save_entry, jsonl_load_entry, jsonl_load_view, lyrics_cache_path, chords_cache_path,
+)
+from app.genius_lookup import genius_lookup
 from app.text_cleaning import clean_lyrics
 from app.document_formatting import sort_songs
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def cache_lyrics(song_list, genius_client):
-    logger.info("Caching lyrics...")
-    missing_lyrics = []
-    missing_lyrics_log = []
-
-    for song in sort_songs(song_list):
-        artist = song['Artist']
-        title = song['Title']
-        found = False
-        cached = jsonl_load_entry('data/cache/lyrics_cache.jsonl', artist, title, 'lyrics')
-        if cached and cached != "Lyrics not found.":
-            found = True
+
+def print_breaker_summary():
+    lines = breaker_summary()
+    if lines:
+        print("\nSource health (circuit breakers):")
+        for line in lines:
+            print(f"- {line}")
+
+
+def print_budget_summary(kind, not_fetched):
+    if not_fetched:
+        print(f"\nRun time budget spent: {not_fetched} song(s) still need {kind}. "
+              "Run again with --resume to continue.")
+
+
+NOT_FOUND = {'lyrics': "Lyrics not found.", 'chords': "Chords not found."}
+CACHE_PATHS = {'lyrics': lyrics_cache_path, 'chords': chords_cache_path}
+
+
+class FetchReport:
+    """What one pipeline could not find (or did not get to), printed once the run is over."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.missing = []
+        self.missing_log = []
+        self.not_fetched = 0
+
+    def add_missing(self, artist, title, tried_log):
+        self.missing.append(f"{artist} – {title}")
+        self.missing_log.append((artist, title, tried_log))
+
+    def print(self):
+        if self.missing:
+            print(f"\nSummary: Missing {self.kind.capitalize()}")
+            for song in self.missing:
+                print(f"- {song}")
+            print(f"\nDetails of sources/queries tried for missing {self.kind}:")
+            for artist, title, tried_log in self.missing_log:
+                print(f"{artist} – {title}:")
+                for attempt in tried_log:
+                    print(f"  Tried: {attempt}")
         else:
-            lyrics, source, tried_log = get_lyrics_from_sources(title, artist, genius_client)
-            cleaned_lyrics = clean_lyrics(lyrics)
-            num_characters = len(cleaned_lyrics)
-            if bool(lyrics) and lyrics != "Lyrics not found." and num_characters <= 5000:
-                jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist, title, lyrics, 'lyrics')
-                logger.debug(f"Lyrics fetched and cached from {source}.")
-                found = True
-            else:
-                jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist, title, "Lyrics not found.", 'lyrics')
-                logger.debug("Lyrics not found or too long.")
-        if not found:
-            missing_lyrics.append(f"{artist} – {title}")
-            missing_lyrics_log.append((artist, title, tried_log if not found else []))
-
-    if missing_lyrics:
-        print("\nSummary: Missing Lyrics")
-        for song in missing_lyrics:
-            print(f"- {song}")
-        print("\nDetails of sources/queries tried for missing lyrics:")
-        for artist, title, tried_log in missing_lyrics_log:
-            print(f"{artist} – {title}:")
-            for attempt in tried_log:
-                print(f"  Tried: {attempt}")
+            print(f"\nAll {self.kind} found!")
+        print_budget_summary(self.kind, self.not_fetched)
+
+
+def _cache_song(kind, artist, title, queries, fetch, journal, song_budget, report):
+    """Fetch and cache one song for one pipeline, unless cached or finished earlier in this run."""
+    cache_path = CACHE_PATHS[kind]()
+    not_found = NOT_FOUND[kind]
+    found = False
+    tried_log = []
+    status = journal.song_status(kind, artist, title) if journal else None
+    if status is not None:
+        # Finished earlier in this run; see RunJournal
+        if not status:
+            report.add_missing(artist, title, journal.attempts(kind, artist, title))
+        return
+    cached = jsonl_load_entry(cache_path, artist, title, kind)
+    if cached and cached != not_found:
+        found = True
+    elif budget_spent():
+        report.not_fetched += 1
+        return
     else:
-        print("\nAll lyrics found!")
-
-def cache_chords(song_list):
-    logger.info("Caching chords...")
-    missing_chords = []
-    missing_chords_log = []
-
-    for song in sort_songs(song_list):
-        artist = song['Artist']
-        title = song['Title']
-        found = False
-        cached = jsonl_load_entry('data/cache/chords_cache.jsonl', artist, title, 'chords')
-        if cached and cached != "Chords not found.":
+        with time_budget(song_budget):
+            value, source, tried_log = fetch(title, artist, queries)
+        # Overlong lyrics would be left out of the songbook anyway
+        too_long = kind == 'lyrics' and len(clean_lyrics(value)) > 5000
+        if bool(value) and value != not_found and not too_long:
+            jsonl_save_entry(cache_path, artist, title, value, kind)
+            logger.debug(f"{kind.capitalize()} for {title} by {artist} fetched and cached from "
+                         f"{source}.")
             found = True
+        elif skipped_sources(tried_log):
+            # Some sources were skipped (open circuit, spent budget); leave the song for a later run
+            logger.debug(f"{kind.capitalize()} not found for {title} by {artist}, but some sources "
+                         f"were skipped.")
         else:
-            chords, source, tried_log = get_chords_from_sources(title, artist)
-            if bool(chords) and chords != "Chords not found.":
-                jsonl_save_entry('data/cache/chords_cache.jsonl', artist, title, chords, 'chords')
-                logger.debug(f"Chords fetched and cached from {source}.")
-                found = True
-            else:
-                jsonl_save_entry('data/cache/chords_cache.jsonl', artist, title, "Chords not found.", 'chords')
-                logger.debug(f"Chords not found for {title} by {artist}.")
-        if not found:
-            missing_chords.append(f"{artist} – {title}")
-            missing_chords_log.append((artist, title, tried_log if not found else []))
-
-    if missing_chords:
-        print("\nSummary: Missing Chords")
-        for song in missing_chords:
-            print(f"- {song}")
-        print("\nDetails of sources/queries tried for missing chords:")
-        for artist, title, tried_log in missing_chords_log:
-            print(f"{artist} – {title}:")
-            for attempt in tried_log:
-                print(f"  Tried: {attempt}")
+            jsonl_save_entry(cache_path, artist, title, not_found, kind)
+            logger.debug(f"{kind.capitalize()} not found for {title} by {artist}.")
+    if journal and (found or not skipped_sources(tried_log)):
+        journal.record_song(kind, artist, title, found)
+    if not found:
+        report.add_missing(artist, title, tried_log)
+
+
+def _cache_pipeline(kind, songs, fetch, journal, song_budget, report):
+    for artist, title, variants in songs:
+        _cache_song(kind, artist, title, variants[kind], fetch, journal, song_budget, report)
+
+
+def cache_songs(song_list, genius_client=None, journal=None, song_budget=None,
+                kinds=('lyrics', 'chords')):
+    """
+    Fetch and cache lyrics and chords for every song not cached yet, in one pass over the song list.
+
+    The list is sorted and each song's query variants are worked out once for both pipelines. The
+    lyrics sites (Genius, Lyrics.ovh, AZLyrics) and the chord sites (Chordie, Ultimate Guitar, ...)
+    are separate hosts, so each pipeline walks the list in its own thread and neither waits on the
+    other's requests. Each song's fetch gets song_budget seconds, if set; once an enclosing run
+    budget (app.deadline.time_budget) is spent, the remaining songs are left for a later run.
+    """
+    logger.info(f"Caching {' and '.join(kinds)}...")
+    if 'lyrics' in kinds and genius_client is not None:
+        # Let Genius look up artists with many songs left to fetch through their catalog
+        with jsonl_load_view(lyrics_cache_path(), 'lyrics') as lyrics_cache:
+            to_fetch = [song for song in song_list
+                        if lyrics_cache.get(f"{song['Artist']} - {song['Title']}")
+                        in (None, NOT_FOUND['lyrics'])]
+        genius_lookup(genius_client).expect(to_fetch)
+    songs = [(song['Artist'], song['Title'], query_variants(song['Artist'], song['Title']))
+             for song in sort_songs(song_list)]
+    fetchers = {
+        'lyrics': lambda title, artist, queries: get_lyrics_from_sources(
+            title, artist, genius_client, journal, queries),
+        'chords': lambda title, artist, queries: get_chords_from_sources(
+            title, artist, journal, queries),
+    }
+    reports = {kind: FetchReport(kind) for kind in kinds}
+    if len(kinds) == 1:
+        kind = kinds[0]
+        _cache_pipeline(kind, songs, fetchers[kind], journal, song_budget, reports[kind])
     else:
-        print("\nAll chords found!")
+        errors = []
+
+        def run(kind):
+            try:
+                _cache_pipeline(kind, songs, fetchers[kind], journal, song_budget, reports[kind])
+            except Exception as e:
+                errors.append(e)
+
+        # Each thread runs in a copy of this context so it sees the enclosing run budget
+        threads = [threading.Thread(target=contextvars.copy_context().run, args=(run, kind),
+                                    name=f"cache-{kind}", daemon=True) for kind in kinds]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+    for kind in kinds:
+        reports[kind].print()
+    print_breaker_summary()
+
+
+def cache_lyrics(song_list, genius_client, journal=None, song_budget=None):
+    """Fetch and cache lyrics for every song not cached yet; see cache_songs."""
+    cache_songs(song_list, genius_client, journal, song_budget, kinds=('lyrics',))
+
+
+def cache_chords(song_list, journal=None, song_budget=None):
+    """Fetch and cache chords for every song not cached yet; see cache_songs."""
+    cache_songs(song_list, journal=journal, song_budget=song_budget, kinds=('chords',))
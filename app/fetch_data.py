@@ -1,7 +1,12 @@
 import requests
 from bs4 import BeautifulSoup
 import logging
-from app.cache import jsonl_save_entry, jsonl_load_entry, jsonl_load_all
+from app.cache import (
+    jsonl_save_entry, jsonl_load_entry, jsonl_load_all, lyrics_cache_path, chords_cache_path,
+)
+from app.circuit_breaker import CircuitOpenError, breaker_for
+from app.deadline import BudgetExceeded, budget_spent, capped_timeout
+from app.genius_lookup import genius_lookup
 import json
 import re
 import html
@@ -11,6 +16,49 @@ import os
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Requests without an explicit timeout could stall a whole run on one hanging site
+DEFAULT_TIMEOUT = 10
+# Statuses meaning a source is blocking or failing, rather than just lacking the song
+FAILURE_STATUSES = (403, 429)
+# Marks attempts skipped because the source's circuit breaker was open, or the song's time budget
+# ran out
+SKIPPED_OPEN_CIRCUIT = "[skipped: circuit open]"
+SKIPPED_BUDGET = "[skipped: time budget spent]"
+# Raised by _http_get instead of making a request; scrapers treat them as "not found" without
+# caching that
+SKIPPED_ERRORS = (CircuitOpenError, BudgetExceeded)
+
+
+# Helper: GET through the source's circuit breaker
+def _http_get(source_name, url, timeout=DEFAULT_TIMEOUT, **kwargs):
+    capped = capped_timeout(timeout)
+    breaker = breaker_for(source_name)
+    if not breaker.allow():
+        raise CircuitOpenError(f"{source_name} is being skipped (circuit open)")
+    try:
+        response = requests.get(url, timeout=capped, **kwargs)
+    except requests.Timeout:
+        # A timeout cut short by our own budget says nothing about the source
+        if capped == timeout:
+            breaker.record_failure()
+        else:
+            breaker.record_inconclusive()
+        raise
+    except requests.RequestException:
+        breaker.record_failure()
+        raise
+    if response.status_code in FAILURE_STATUSES or response.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+# Helper: Whether a source was skipped for an attempt in tried_log (open circuit or spent budget),
+# so a miss is not final
+def skipped_sources(tried_log):
+    return any(attempt.endswith((SKIPPED_OPEN_CIRCUIT, SKIPPED_BUDGET)) for attempt in tried_log)
+
 # Helper: Remove 'The' from artist
 def strip_the(artist):
     return re.sub(r'^the\s+', '', artist, flags=re.IGNORECASE).strip()
@@ -38,7 +86,7 @@ AZLYRICS_BASE = "https://www.azlyrics.com/lyrics"
 def get_lyrics_from_azlyrics(song_title, artist_name):
     logger.debug(f"Trying AZLyrics for {song_title} by {artist_name}...")
     # Check cache first
-    cached = jsonl_load_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, 'lyrics')
+    cached = jsonl_load_entry(lyrics_cache_path(), artist_name, song_title, 'lyrics')
     if cached and cached != "Lyrics not found.":
         logger.debug(f"Lyrics loaded from cache for {song_title} by {artist_name}.")
         return cached
@@ -47,11 +95,12 @@ def get_lyrics_from_azlyrics(song_title, artist_name):
     title_url = re.sub(r'[^a-z0-9]', '', song_title.lower().replace(' ', ''))
     url = f"https://www.azlyrics.com/lyrics/{artist_url}/{title_url}.html"
     try:
-        response = requests.get(url, timeout=10)
+        response = _http_get("AZLyrics", url)
         response.encoding = response.apparent_encoding
         if response.status_code != 200:
             logger.debug(f"AZLyrics returned status {response.status_code} for {url}")
-            jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, "Lyrics not found.", 'lyrics')
+            jsonl_save_entry(lyrics_cache_path(), artist_name, song_title, "Lyrics not found.",
+                             'lyrics')
             return "Lyrics not found."
         soup = BeautifulSoup(response.text, 'html.parser')
         # Lyrics are in the first div after all <div class="ringtone">
@@ -64,16 +113,22 @@ def get_lyrics_from_azlyrics(song_title, artist_name):
                         lyrics = next_div.get_text("\n", strip=True)
                         if lyrics:
                             logger.debug(f"Lyrics found on AZLyrics for {song_title} by {artist_name}.")
-                            jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, lyrics, 'lyrics')
+                            jsonl_save_entry(lyrics_cache_path(), artist_name, song_title, lyrics,
+                                             'lyrics')
                             return lyrics
                         break
                 break
         logger.debug(f"Lyrics not found on AZLyrics for {song_title} by {artist_name}.")
-        jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, "Lyrics not found.", 'lyrics')
+        jsonl_save_entry(lyrics_cache_path(), artist_name, song_title, "Lyrics not found.",
+                         'lyrics')
+        return "Lyrics not found."
+    except SKIPPED_ERRORS as e:
+        logger.debug(str(e))
         return "Lyrics not found."
     except Exception as e:
         logger.error(f"Error scraping AZLyrics for {song_title} by {artist_name}: {e}")
-        jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, "Lyrics not found.", 'lyrics')
+        jsonl_save_entry(lyrics_cache_path(), artist_name, song_title, "Lyrics not found.",
+                         'lyrics')
         return "Lyrics not found."
 
 def get_genius_client(genius_access_token):
@@ -83,81 +138,138 @@ def get_genius_client(genius_access_token):
 def get_lyrics_from_genius(song_title, artist_name, genius_client):
     logger.debug(f"Searching for lyrics for {song_title} by {artist_name}...")
     # Check cache first
-    cached = jsonl_load_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, 'lyrics')
+    cached = jsonl_load_entry(lyrics_cache_path(), artist_name, song_title, 'lyrics')
     if cached and cached != "Lyrics not found.":
         logger.debug(f"Lyrics loaded from cache for {song_title} by {artist_name}.")
         return cached
     try:
-        song = genius_client.search_song(song_title, artist_name)
-        if song:
-            lyrics = song.lyrics
+        lyrics = genius_lookup(genius_client).lyrics(song_title, artist_name)
+        if lyrics:
             logger.debug(f"Lyrics found for {song_title} by {artist_name}.")
-            jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, lyrics, 'lyrics')
+            jsonl_save_entry(lyrics_cache_path(), artist_name, song_title, lyrics, 'lyrics')
             return lyrics
         else:
             logger.debug(f"Lyrics not found for {song_title} by {artist_name}.")
-            jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, "Lyrics not found.", 'lyrics')
+            jsonl_save_entry(lyrics_cache_path(), artist_name, song_title, "Lyrics not found.",
+                             'lyrics')
             return get_lyrics_from_lyrics_ovh(song_title, artist_name)
+    except SKIPPED_ERRORS as e:
+        logger.debug(str(e))
+        return get_lyrics_from_lyrics_ovh(song_title, artist_name)
     except Exception as e:
         logger.error(f"Error fetching lyrics for {song_title} by {artist_name} from Genius: {e}")
-        jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, "Lyrics not found.", 'lyrics')
+        jsonl_save_entry(lyrics_cache_path(), artist_name, song_title, "Lyrics not found.",
+                         'lyrics')
         return get_lyrics_from_lyrics_ovh(song_title, artist_name)
 
 def get_lyrics_from_lyrics_ovh(song_title, artist_name):
     logger.debug(f"Trying Lyrics.ovh for {song_title} by {artist_name}...")
     # Check cache first
-    cached = jsonl_load_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, 'lyrics')
+    cached = jsonl_load_entry(lyrics_cache_path(), artist_name, song_title, 'lyrics')
     if cached and cached != "Lyrics not found.":
         logger.debug(f"Lyrics loaded from cache for {song_title} by {artist_name}.")
         return cached
     url = f"https://api.lyrics.ovh/v1/{artist_name}/{song_title}"
     try:
-        response = requests.get(url)
+        response = _http_get("Lyrics.ovh", url)
         response.encoding = response.apparent_encoding
         response.raise_for_status()
         data = response.json()
         lyrics = data.get("lyrics", "Lyrics not found.")
         if lyrics and lyrics != "Lyrics not found.":
             logger.debug(f"Lyrics found on Lyrics.ovh for {song_title} by {artist_name}.")
-            jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, lyrics, 'lyrics')
+            jsonl_save_entry(lyrics_cache_path(), artist_name, song_title, lyrics, 'lyrics')
             return lyrics
         else:
             logger.debug(f"Lyrics not found on Lyrics.ovh for {song_title} by {artist_name}.")
-            jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, "Lyrics not found.", 'lyrics')
+            jsonl_save_entry(lyrics_cache_path(), artist_name, song_title, "Lyrics not found.",
+                             'lyrics')
             return "Lyrics not found."
+    except SKIPPED_ERRORS as e:
+        logger.debug(str(e))
+        return "Lyrics not found."
     except Exception as e:
         logger.error(f"Error fetching lyrics from Lyrics.ovh for {song_title} by {artist_name}: {e}")
-        jsonl_save_entry('data/cache/lyrics_cache.jsonl', artist_name, song_title, "Lyrics not found.", 'lyrics')
+        jsonl_save_entry(lyrics_cache_path(), artist_name, song_title, "Lyrics not found.",
+                         'lyrics')
         return "Lyrics not found."
 
-def get_lyrics_from_sources(song_title, artist_name, genius_client=None):
-    """
-    Try all sources and flexible queries for lyrics. Log which sources/queries were tried.
-    Returns: (lyrics, source_name, tried_log)
-    """
-    tried_log = []
-    queries = [
+
+# Helper: Artist/title query variants for both pipelines, normalizing the song once
+def query_variants(artist_name, song_title):
+    plain_artist = strip_the(artist_name)
+    plain_title = strip_punct(song_title)
+    lyrics = [
         (artist_name, song_title),
-        (strip_the(artist_name), song_title),
-        (artist_name, strip_punct(song_title)),
-        (strip_the(artist_name), strip_punct(song_title)),
+        (plain_artist, song_title),
+        (artist_name, plain_title),
+        (plain_artist, plain_title),
     ]
-    sources = [
+    return {
+        'lyrics': lyrics,
+        'chords': lyrics + [(artist_name.split(',')[0], song_title)],  # Try just the main artist
+    }
+
+
+# Query variants and sources of the lyrics pipeline, in the order they are tried
+def lyrics_queries(artist_name, song_title):
+    return query_variants(artist_name, song_title)['lyrics']
+
+
+def lyrics_sources(genius_client=None):
+    return [
         ("Genius", lambda t, a: get_lyrics_from_genius(t, a, genius_client)),
         ("Lyrics.ovh", get_lyrics_from_lyrics_ovh),
         ("AZLyrics", get_lyrics_from_azlyrics),
         ("Manual", get_manual_lyrics),
     ]
+
+
+def get_lyrics_from_sources(song_title, artist_name, genius_client=None, journal=None,
+                            queries=None):
+    """
+    Try all sources and flexible queries for lyrics. Log which sources/queries were tried.
+    Attempts already completed earlier in a resumed run (per journal) are skipped, and the
+    remaining ones are abandoned once the enclosing time budget (see app/deadline.py) is spent.
+    Returns: (lyrics, source_name, tried_log)
+    """
+    tried_log = []
+    queries = queries or lyrics_queries(artist_name, song_title)
+    sources = lyrics_sources(genius_client)
     for artist, title in queries:
         for source_name, fetch_func in sources:
+            if budget_spent():
+                # Lower-priority sources and query variants are left for a later run
+                tried_log.append(f"Remaining sources/queries {SKIPPED_BUDGET}")
+                logger.info(f"Time budget spent for {artist_name} – {song_title}; stopping.")
+                return "Lyrics not found.", None, tried_log
+            attempt = f"{source_name} ({artist} – {title})"
+            if journal and journal.attempt_done('lyrics', artist_name, song_title, attempt):
+                tried_log.append(f"{attempt} [earlier in this run]")
+                continue
+            breaker = breaker_for(source_name)
+            if breaker.is_open():
+                # Not journaled: a resumed run should try the source again
+                breaker.record_skip()
+                tried_log.append(f"{attempt} {SKIPPED_OPEN_CIRCUIT}")
+                continue
             try:
                 lyrics = fetch_func(title, artist)
-                tried_log.append(f"{source_name} ({artist} – {title})")
+                tried_log.append(attempt)
                 if lyrics and lyrics.lower() not in ["lyrics not found.", "", None]:
                     logger.info(f"Lyrics found for {artist} – {title} from {source_name}")
                     return lyrics, source_name, tried_log
             except Exception as e:
                 logger.error(f"Error with {source_name} for {artist} – {title}: {e}")
+            if journal and not budget_spent():
+                # An attempt cut short by the budget is retried by a resumed run
+                journal.record_attempt('lyrics', artist_name, song_title, attempt)
+    if budget_spent():
+        # The last attempt ran into the budget, so it may have been cut short
+        tried_log.append(f"Last attempt {SKIPPED_BUDGET}")
+        logger.info(f"Time budget spent for {artist_name} – {song_title} "
+                    f"during the last attempt.")
+        return "Lyrics not found.", None, tried_log
     logger.info(f"Lyrics not found for {artist_name} – {song_title} after trying all sources/queries.")
     return "Lyrics not found.", None, tried_log
 
@@ -170,7 +282,7 @@ def get_chords_from_echords(song_title, artist_name):
     title_url = re.sub(r'[^a-z0-9]', '-', song_title.lower())
     url = f"{E_CHORDS_BASE}/{artist_url}/{title_url}"
     try:
-        response = requests.get(url, timeout=10)
+        response = _http_get("E-Chords", url)
         response.encoding = response.apparent_encoding
         if response.status_code != 200:
             logger.debug(f"E-Chords returned status {response.status_code} for {url}")
@@ -184,6 +296,9 @@ def get_chords_from_echords(song_title, artist_name):
                 return chords
         logger.debug(f"Chords not found on E-Chords for {song_title} by {artist_name}.")
         return "Chords not found."
+    except SKIPPED_ERRORS as e:
+        logger.debug(str(e))
+        return "Chords not found."
     except Exception as e:
         logger.error(f"Error scraping E-Chords for {song_title} by {artist_name}: {e}")
         return "Chords not found."
@@ -195,7 +310,7 @@ def get_chords_from_songsterr(song_title, artist_name):
     query = f"{song_title} {artist_name}"
     url = f"{SONGSTERR_SEARCH}{requests.utils.quote(query)}"
     try:
-        response = requests.get(url, timeout=10)
+        response = _http_get("Songsterr", url)
         response.encoding = response.apparent_encoding
         if response.status_code != 200:
             logger.debug(f"Songsterr returned status {response.status_code} for {url}")
@@ -205,7 +320,7 @@ def get_chords_from_songsterr(song_title, artist_name):
         link = soup.find('a', href=True, class_='song')
         if link and 'href' in link.attrs:
             song_url = f"https://www.songsterr.com{link['href']}"
-            song_response = requests.get(song_url, timeout=10)
+            song_response = _http_get("Songsterr", song_url)
             song_response.encoding = song_response.apparent_encoding
             if song_response.status_code != 200:
                 logger.debug(f"Songsterr song page returned status {song_response.status_code} for {song_url}")
@@ -220,20 +335,23 @@ def get_chords_from_songsterr(song_title, artist_name):
                     return chords
         logger.debug(f"Chords not found on Songsterr for {song_title} by {artist_name}.")
         return "Chords not found."
+    except SKIPPED_ERRORS as e:
+        logger.debug(str(e))
+        return "Chords not found."
     except Exception as e:
         logger.error(f"Error scraping Songsterr for {song_title} by {artist_name}: {e}")
         return "Chords not found."
 
 def get_chords_from_chordie(song_title, artist_name):
     logger.debug(f"Searching for chords for {song_title} by {artist_name} on Chordie...")
-    chords_cache = jsonl_load_all('data/cache/chords_cache.jsonl', 'chords')
+    chords_cache = jsonl_load_all(chords_cache_path(), 'chords')
     cache_key = f"{artist_name} - {song_title}"
     if cache_key in chords_cache and bool(chords_cache[cache_key]) and chords_cache[cache_key] != "Chords not found.":
         logger.debug(f"Chords loaded from cache for {song_title} by {artist_name}. Cache content: {chords_cache[cache_key][:100]}...")
         return chords_cache[cache_key]
     search_url = f"https://www.chordie.com/result.php?q={song_title.replace(' ', '+')}+by+{artist_name.replace(' ', '+')}"
     try:
-        response = requests.get(search_url)
+        response = _http_get("Chordie", search_url)
         response.encoding = response.apparent_encoding
         response.raise_for_status()
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -252,7 +370,7 @@ def get_chords_from_chordie(song_title, artist_name):
             if not chords_page_url.startswith('https://'):
                 chords_page_url = "https://www.chordie.com" + chords_page_url
             logger.debug(f"Fetching chords from URL: {chords_page_url}")
-            chords_response = requests.get(chords_page_url)
+            chords_response = _http_get("Chordie", chords_page_url)
             chords_response.encoding = chords_response.apparent_encoding
             chords_response.raise_for_status()
             chords_soup = BeautifulSoup(chords_response.text, 'html.parser')
@@ -260,7 +378,7 @@ def get_chords_from_chordie(song_title, artist_name):
             if chords_div:
                 chords = chords_div.get_text()
                 logger.debug(f"Chords found for {song_title} by {artist_name}.")
-                jsonl_save_entry('data/cache/chords_cache.jsonl', artist_name, song_title, chords, 'chords')
+                jsonl_save_entry(chords_cache_path(), artist_name, song_title, chords, 'chords')
                 return chords
             else:
                 logger.debug(f"Chords content not found in the page for {song_title} by {artist_name}.")
@@ -268,20 +386,23 @@ def get_chords_from_chordie(song_title, artist_name):
         else:
             logger.debug(f"Chords link not found in the search results for {song_title} by {artist_name}.")
             return get_chords_from_ultimate_guitar(song_title, artist_name)
+    except SKIPPED_ERRORS as e:
+        logger.debug(str(e))
+        return "Chords not found."
     except Exception as e:
         logger.error(f"Error fetching chords for {song_title} by {artist_name}: {e}")
         return get_chords_from_ultimate_guitar(song_title, artist_name)
 
 def get_chords_from_ultimate_guitar(song_title, artist_name):
     logger.debug(f"Searching for chords for {song_title} by {artist_name} on Ultimate Guitar...")
-    chords_cache = jsonl_load_all('data/cache/chords_cache.jsonl', 'chords')
+    chords_cache = jsonl_load_all(chords_cache_path(), 'chords')
     cache_key = f"{artist_name} - {song_title}"
     if cache_key in chords_cache and bool(chords_cache[cache_key]) and chords_cache[cache_key] != "Chords not found.":
         logger.debug(f"Chords loaded from cache for {song_title} by {artist_name}. Cache content: {chords_cache[cache_key][:100]}...")
         return chords_cache[cache_key]
     search_url = f"https://www.ultimate-guitar.com/search.php?search_type=title&value={song_title.replace(' ', '%20')}+{artist_name.replace(' ', '%20')}"
     try:
-        response = requests.get(search_url)
+        response = _http_get("Ultimate Guitar", search_url)
         response.encoding = response.apparent_encoding
         time.sleep(1)
         response.raise_for_status()
@@ -308,12 +429,13 @@ def get_chords_from_ultimate_guitar(song_title, artist_name):
         else:
             logger.debug(f"No matching URL found in the search results for {song_title} by {artist_name}.")
             chords_cache[cache_key] = "Chords not found."
-            jsonl_save_entry('data/cache/chords_cache.jsonl', artist_name, song_title, "Chords not found.", 'chords')
+            jsonl_save_entry(chords_cache_path(), artist_name, song_title, "Chords not found.",
+                             'chords')
             return "Chords not found."
         if chords_page_url:
             logger.debug(f"Fetching chords from URL: {chords_page_url}")
             try:
-                chords_response = requests.get(chords_page_url)
+                chords_response = _http_get("Ultimate Guitar", chords_page_url)
                 chords_response.encoding = chords_response.apparent_encoding
                 time.sleep(1)
                 chords_response.raise_for_status()
@@ -335,29 +457,39 @@ def get_chords_from_ultimate_guitar(song_title, artist_name):
                         if content_value:
                             chords = content_value
                             logger.debug(f"Chords found for {song_title} by {artist_name}.")
-                            jsonl_save_entry('data/cache/chords_cache.jsonl', artist_name, song_title, chords, 'chords')
+                            jsonl_save_entry(chords_cache_path(), artist_name, song_title, chords,
+                                             'chords')
                             return chords
                         else:
                             logger.debug(f"Chords content not found in the page for {song_title} by {artist_name}.")
                     except Exception as e:
                         logger.error(f"Error parsing chords content for {song_title} by {artist_name}: {e}")
                 chords_cache[cache_key] = "Chords not found."
-                jsonl_save_entry('data/cache/chords_cache.jsonl', artist_name, song_title, "Chords not found.", 'chords')
+                jsonl_save_entry(chords_cache_path(), artist_name, song_title, "Chords not found.",
+                                 'chords')
                 return "Chords not found."
+            except SKIPPED_ERRORS:
+                raise
             except Exception as e:
                 logger.error(f"Error fetching chords for {song_title} by {artist_name}: {e}")
                 chords_cache[cache_key] = "Chords not found."
-                jsonl_save_entry('data/cache/chords_cache.jsonl', artist_name, song_title, "Chords not found.", 'chords')
+                jsonl_save_entry(chords_cache_path(), artist_name, song_title, "Chords not found.",
+                                 'chords')
                 return "Chords not found."
         else:
             logger.debug(f"Chords link not found in the search results for {song_title} by {artist_name}.")
             chords_cache[cache_key] = "Chords not found."
-            jsonl_save_entry('data/cache/chords_cache.jsonl', artist_name, song_title, "Chords not found.", 'chords')
+            jsonl_save_entry(chords_cache_path(), artist_name, song_title, "Chords not found.",
+                             'chords')
             return "Chords not found."
+    except SKIPPED_ERRORS as e:
+        logger.debug(str(e))
+        return "Chords not found."
     except Exception as e:
         logger.error(f"Error fetching chords for {song_title} by {artist_name}: {e}")
         chords_cache[cache_key] = "Chords not found."
-        jsonl_save_entry('data/cache/chords_cache.jsonl', artist_name, song_title, "Chords not found.", 'chords')
+        jsonl_save_entry(chords_cache_path(), artist_name, song_title, "Chords not found.",
+                         'chords')
         return "Chords not found."
 
 # Yousician scraper
@@ -370,7 +502,7 @@ def get_chords_from_yousician(song_title, artist_name):
     title_url = format_for_url(song_title)
     url = f"https://yousician.com/chords/{artist_url}/{title_url}"
     try:
-        response = requests.get(url, timeout=10)
+        response = _http_get("Yousician", url)
         response.encoding = response.apparent_encoding
         if response.status_code != 200:
             logger.debug(f"Yousician returned status {response.status_code} for {url}")
@@ -391,40 +523,73 @@ def get_chords_from_yousician(song_title, artist_name):
                 return chords
         logger.debug(f"Chords not found on Yousician for {song_title} by {artist_name}.")
         return "Chords not found."
+    except SKIPPED_ERRORS as e:
+        logger.debug(str(e))
+        return "Chords not found."
     except Exception as e:
         logger.error(f"Error scraping Yousician for {song_title} by {artist_name}: {e}")
         return "Chords not found."
 
-# Robust, flexible chord fetching pipeline
-def get_chords_from_sources(song_title, artist_name):
-    """
-    Try all sources and flexible queries for chords. Log which sources/queries were tried.
-    Returns: (chords, source_name, tried_log)
-    """
-    tried_log = []
-    queries = [
-        (artist_name, song_title),
-        (strip_the(artist_name), song_title),
-        (artist_name, strip_punct(song_title)),
-        (strip_the(artist_name), strip_punct(song_title)),
-        (artist_name.split(',')[0], song_title),  # Try just the main artist
-    ]
-    sources = [
+
+# Query variants and sources of the chords pipeline, in the order they are tried
+def chords_queries(artist_name, song_title):
+    return query_variants(artist_name, song_title)['chords']
+
+
+def chords_sources():
+    return [
         ("Chordie", get_chords_from_chordie),
         ("Ultimate Guitar", get_chords_from_ultimate_guitar),
         ("E-Chords", get_chords_from_echords),
         ("Songsterr", get_chords_from_songsterr),
         ("Yousician", get_chords_from_yousician),
     ]
+
+
+# Robust, flexible chord fetching pipeline
+def get_chords_from_sources(song_title, artist_name, journal=None, queries=None):
+    """
+    Try all sources and flexible queries for chords. Log which sources/queries were tried.
+    Attempts already completed earlier in a resumed run (per journal) are skipped, and the
+    remaining ones are abandoned once the enclosing time budget (see app/deadline.py) is spent.
+    Returns: (chords, source_name, tried_log)
+    """
+    tried_log = []
+    queries = queries or chords_queries(artist_name, song_title)
+    sources = chords_sources()
     for artist, title in queries:
         for source_name, fetch_func in sources:
+            if budget_spent():
+                # Lower-priority sources and query variants are left for a later run
+                tried_log.append(f"Remaining sources/queries {SKIPPED_BUDGET}")
+                logger.info(f"Time budget spent for {artist_name} – {song_title}; stopping.")
+                return "Chords not found.", None, tried_log
+            attempt = f"{source_name} ({artist} – {title})"
+            if journal and journal.attempt_done('chords', artist_name, song_title, attempt):
+                tried_log.append(f"{attempt} [earlier in this run]")
+                continue
+            breaker = breaker_for(source_name)
+            if breaker.is_open():
+                # Not journaled: a resumed run should try the source again
+                breaker.record_skip()
+                tried_log.append(f"{attempt} {SKIPPED_OPEN_CIRCUIT}")
+                continue
             try:
                 chords = fetch_func(title, artist)
-                tried_log.append(f"{source_name} ({artist} – {title})")
+                tried_log.append(attempt)
                 if chords and chords.lower() not in ["chords not found.", "", None]:
                     logger.info(f"Chords found for {artist} – {title} from {source_name}")
                     return chords, source_name, tried_log
             except Exception as e:
                 logger.error(f"Error with {source_name} for {artist} – {title}: {e}")
+            if journal and not budget_spent():
+                # An attempt cut short by the budget is retried by a resumed run
+                journal.record_attempt('chords', artist_name, song_title, attempt)
+    if budget_spent():
+        # The last attempt ran into the budget, so it may have been cut short
+        tried_log.append(f"Last attempt {SKIPPED_BUDGET}")
+        logger.info(f"Time budget spent for {artist_name} – {song_title} "
+                    f"during the last attempt.")
+        return "Chords not found.", None, tried_log
     logger.info(f"Chords not found for {artist_name} – {song_title} after trying all sources/queries.")
     return "Chords not found.", None, tried_log
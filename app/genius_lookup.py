@@ -0,0 +1,242 @@
+import logging
+import re
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+import requests
+from app.cache import cache_file_path, jsonl_load_all, jsonl_save_entry
+from app.circuit_breaker import CircuitOpenError, breaker_for
+from app.deadline import capped_timeout
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+GENIUS_CACHE_NAME = 'genius_cache.jsonl'
+# Fetch an artist's song list once, instead of searching each title, when a run has this many of
+# their songs
+ARTIST_BATCH_MIN_SONGS = 3
+# Pages of 50 songs, most popular first, read from an artist's catalog at most
+ARTIST_CATALOG_PAGES = 4
+# Fetched lyrics kept for reuse by other variants and songs resolving to the same Genius id
+LYRICS_MEMO_SIZE = 64
+
+
+def genius_cache_path():
+    return cache_file_path(GENIUS_CACHE_NAME)
+
+
+def normalize_name(name):
+    """Artist or title reduced for matching: no case, punctuation, leading "The" or extra spaces."""
+    name = unicodedata.normalize('NFKC', str(name)).lower()
+    name = re.sub(r'[^\w\s]', '', name)
+    name = re.sub(r'^the\s+', '', name.strip())
+    return ' '.join(name.split())
+
+
+def _hit_of(result):
+    return {'id': result['id'], 'url': result['url'], 'title': result.get('title'),
+            'artist': (result.get('primary_artist') or {}).get('name'),
+            'artist_id': (result.get('primary_artist') or {}).get('id')}
+
+
+def _has_lyrics(result):
+    return result.get('lyrics_state', 'complete') == 'complete' and not result.get('instrumental')
+
+
+def load_genius_hits(cache_path=None):
+    """Persisted hits keyed by normalized (artist, title)."""
+    hits = {}
+    for hit in jsonl_load_all(cache_path or genius_cache_path(), 'genius').values():
+        if isinstance(hit, dict):
+            hits[(normalize_name(hit['query_artist']), normalize_name(hit['query_title']))] = hit
+    return hits
+
+
+def _cap_request_timeouts(client):
+    """
+    Cut the timeout of every request the Genius client sends down to the remaining time budget, as
+    _http_get does for the scrapers. Budgets are per context, so threads sharing a client
+    each get theirs.
+    """
+    session = getattr(client, '_session', None)
+    if session is None or getattr(session.request, 'budget_capped', False):
+        return
+    request = session.request
+
+    def capped_request(method, url, **kwargs):
+        kwargs['timeout'] = capped_timeout(kwargs.get('timeout'))
+        return request(method, url, **kwargs)
+
+    capped_request.budget_capped = True
+    session.request = capped_request
+
+
+class GeniusLookup:
+    """
+    Genius search hits and lyrics for one client, reused across query variants, songs and runs.
+
+    Query variants of a song normalize to the same key, so a song is searched at most once per run.
+    Hits (song id and page URL) are kept in genius_cache.jsonl, so later runs fetch the lyrics page
+    directly without searching. Variants and songs resolving to the same id share one page fetch.
+    Artists with many songs in a run are looked up through their catalog instead of per-title
+    searches. The lock guards the hits and memos only; it is released while Genius is asked, so one
+    slow request does not hold up the songs other threads resolve from the caches.
+    """
+
+    def __init__(self, genius_client, cache_path=None):
+        self.client = genius_client
+        self.cache_path = cache_path or genius_cache_path()
+        self.hits = load_genius_hits(self.cache_path)
+        self.misses = set()
+        self.lyrics_by_id = OrderedDict()
+        self.batch_artists = set()
+        self.catalogs = {}
+        self.catalogs_loading = set()
+        self._lock = threading.RLock()
+        _cap_request_timeouts(genius_client)
+
+    def _call(self, method, *args, **kwargs):
+        """One Genius request, through the Genius circuit breaker and the enclosing time budget."""
+        timeout = getattr(self.client, 'timeout', None)
+        capped = capped_timeout(timeout)
+        breaker = breaker_for("Genius")
+        if not breaker.allow():
+            raise CircuitOpenError("Genius is being skipped (circuit open)")
+        try:
+            result = method(*args, **kwargs)
+        except requests.Timeout:
+            # A timeout cut short by our own budget says nothing about Genius
+            if capped == timeout:
+                breaker.record_failure()
+            else:
+                breaker.record_inconclusive()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+
+    def expect(self, songs):
+        """
+        Note the songs of a run, so artists with many unresolved songs are batched through their
+        catalog. Runs sharing the lookup (service jobs) add to the batched artists rather than
+        replacing them.
+        """
+        per_artist = Counter(
+            normalize_name(song['Artist']) for song in songs
+            if (normalize_name(song['Artist']), normalize_name(song['Title'])) not in self.hits
+        )
+        with self._lock:
+            self.batch_artists |= {artist for artist, count in per_artist.items()
+                                   if count >= ARTIST_BATCH_MIN_SONGS}
+
+    def _save_hit(self, key, artist_name, song_title, hit):
+        hit = {**hit, 'query_artist': artist_name, 'query_title': song_title}
+        self.hits[key] = hit
+        jsonl_save_entry(self.cache_path, key[0], key[1], hit, 'genius')
+        return hit
+
+    def _load_catalog(self, artist, artist_id):
+        """Normalized title -> hit for an artist's most popular songs (one request per 50 songs)."""
+        catalog = {}
+        page = 1
+        while page and page <= ARTIST_CATALOG_PAGES:
+            response = self._call(self.client.artist_songs, artist_id, per_page=50, page=page,
+                                  sort='popularity')
+            for result in response.get('songs', []):
+                if _has_lyrics(result):
+                    catalog.setdefault(normalize_name(result['title']), _hit_of(result))
+            page = response.get('next_page')
+        logger.info(f"Loaded {len(catalog)} Genius songs for {artist} in one catalog lookup.")
+        with self._lock:
+            self.catalogs[artist] = catalog
+        return catalog
+
+    def _search(self, artist, title, song_title, artist_name):
+        response = self._call(self.client.search_songs, f"{song_title} {artist_name}".strip())
+        results = [hit['result'] for hit in response.get('hits', [])
+                   if hit.get('type', 'song') == 'song' and _has_lyrics(hit['result'])]
+
+        def result_artist(result):
+            return normalize_name((result.get('primary_artist') or {}).get('name', ''))
+
+        def result_title(result):
+            return normalize_name(result.get('title', ''))
+
+        # Like lyricsgenius' search_song: the exact song, else the artist's best hit with lyrics...
+        by_artist = [result for result in results if result_artist(result) == artist]
+        exact = [result for result in by_artist if result_title(result) == title]
+        # ...and, for duets and "feat." credits the artists are listed differently, the exact title
+        # by an artist named within the queried artist (or the other way round)
+        credited = [result for result in results
+                    if result_title(result) == title and result_artist(result)
+                    and (result_artist(result) in artist or artist in result_artist(result))]
+        return (exact or by_artist or credited or [None])[0]
+
+    def resolve(self, song_title, artist_name):
+        """The Genius hit ({'id', 'url', ...}) of a song, or None; searched only if not cached."""
+        artist, title = key = (normalize_name(artist_name), normalize_name(song_title))
+        with self._lock:
+            if key in self.hits:
+                return self.hits[key]
+            if key in self.misses:
+                return None
+            catalog = self.catalogs.get(artist)
+            if catalog is not None and title in catalog:
+                return self._save_hit(key, artist_name, song_title, catalog[title])
+        result = self._search(artist, title, song_title, artist_name)
+        with self._lock:
+            # Another thread may have resolved the same song while this one searched
+            if key in self.hits:
+                return self.hits[key]
+            if result is None:
+                self.misses.add(key)
+                return None
+            hit = self._save_hit(key, artist_name, song_title, _hit_of(result))
+            load_catalog = (artist in self.batch_artists and artist not in self.catalogs
+                            and artist not in self.catalogs_loading and hit['artist_id'])
+            if load_catalog:
+                self.catalogs_loading.add(artist)
+        if load_catalog:
+            try:
+                self._load_catalog(artist, hit['artist_id'])
+            except Exception as e:
+                # The song itself was found; search the artist's other songs one by one instead
+                logger.warning(f"Genius catalog lookup for {artist_name} failed: {e}")
+                with self._lock:
+                    self.batch_artists.discard(artist)
+            finally:
+                with self._lock:
+                    self.catalogs_loading.discard(artist)
+        return hit
+
+    def lyrics(self, song_title, artist_name):
+        """Lyrics of a song from Genius, or None; one page fetch per Genius song id."""
+        hit = self.resolve(song_title, artist_name)
+        if hit is None:
+            return None
+        with self._lock:
+            if hit['id'] in self.lyrics_by_id:
+                self.lyrics_by_id.move_to_end(hit['id'])
+                return self.lyrics_by_id[hit['id']]
+        lyrics = self._call(self.client.lyrics, song_url=hit['url'])
+        with self._lock:
+            self.lyrics_by_id[hit['id']] = lyrics
+            self.lyrics_by_id.move_to_end(hit['id'])
+            if len(self.lyrics_by_id) > LYRICS_MEMO_SIZE:
+                self.lyrics_by_id.popitem(last=False)
+        return lyrics
+
+
+_lookups = {}
+_lookups_lock = threading.Lock()
+
+
+def genius_lookup(genius_client):
+    """The process-wide lookup of a Genius client, created on first use."""
+    with _lookups_lock:
+        lookup = _lookups.get(id(genius_client))
+        if lookup is None or lookup.client is not genius_client:
+            lookup = _lookups[id(genius_client)] = GeniusLookup(genius_client)
+        return lookup
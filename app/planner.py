@@ -0,0 +1,176 @@
+import logging
+from app.cache import NOT_FOUND_VALUES, jsonl_load_view, lyrics_cache_path, chords_cache_path
+from app.fetch_data import lyrics_queries, lyrics_sources, chords_queries, chords_sources
+from app.genius_lookup import load_genius_hits, normalize_name
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# HTTP requests one attempt (query variant) of a source makes when it misses, per host. Genius falls
+# back to Lyrics.ovh; Chordie falls back to Ultimate Guitar.
+SOURCE_REQUESTS = {
+    'Genius': {'Lyrics.ovh': 1},
+    'Lyrics.ovh': {'Lyrics.ovh': 1},
+    'AZLyrics': {'AZLyrics': 1},
+    'Manual': {},
+    'Chordie': {'Chordie': 2, 'Ultimate Guitar': 2},
+    'Ultimate Guitar': {'Ultimate Guitar': 2},
+    'E-Chords': {'E-Chords': 1},
+    'Songsterr': {'Songsterr': 2},
+    'Yousician': {'Yousician': 1},
+}
+# Requests a source makes once per song rather than per variant: Genius searches a song's
+# normalized artist and title once and fetches its lyrics page once (see app.genius_lookup)...
+SONG_REQUESTS = {
+    'Genius': {'Genius': 2},
+}
+# ...or only fetches the page when the song's Genius id is already cached
+KNOWN_SONG_REQUESTS = {
+    'Genius': {'Genius': 1},
+}
+# Requests a source makes when it finds the song on the first try
+HIT_REQUESTS = {
+    'Chordie': {'Chordie': 2},
+}
+# Default seconds per request and host, overridable with "rates" in config.json.
+# Ultimate Guitar includes the one-second pause the scraper makes after each request.
+SECONDS_PER_REQUEST = {
+    'Genius': 1.0,
+    'Lyrics.ovh': 1.0,
+    'AZLyrics': 0.8,
+    'Chordie': 0.8,
+    'Ultimate Guitar': 2.0,
+    'E-Chords': 0.8,
+    'Songsterr': 1.0,
+    'Yousician': 0.8,
+}
+
+PIPELINES = {
+    'lyrics': (lyrics_cache_path, lyrics_queries, lyrics_sources),
+    'chords': (chords_cache_path, chords_queries, chords_sources),
+}
+
+
+def _add(total, requests, times=1):
+    for host, count in requests.items():
+        total[host] = total.get(host, 0) + count * times
+
+
+def _seconds(requests, rates):
+    return sum(count * rates.get(host, 1.0) for host, count in requests.items())
+
+
+def plan_kind(songs, kind, rates, song_budget=None):
+    """
+    Estimate the fetch work for one pipeline.
+
+    Songs found in the cache are skipped; missing songs and songs cached as not found are fetched.
+    The worst case tries every query variant at every source. The expected case assumes a song is
+    found on its first attempt with the cache's historical hit rate, and otherwise costs the worst
+    case; songs already cached as not found are assumed to miss again.
+    """
+    cache_path, queries_for, sources_for = PIPELINES[kind]
+    source_names = [name for name, _ in sources_for()]
+    counts = {'cached': 0, 'negative': 0, 'missing': 0}
+    to_fetch = []
+    with jsonl_load_view(cache_path(), kind) as cache:
+        for song in songs:
+            value = cache.get(f"{song['Artist']} - {song['Title']}")
+            status = ('missing' if not value else 'negative' if value in NOT_FOUND_VALUES
+                      else 'cached')
+            counts[status] += 1
+            if status != 'cached':
+                to_fetch.append((song, status))
+        attempted = counts['cached'] + counts['negative']
+    hit_rate = counts['cached'] / attempted if attempted else 0.5
+    known_ids = load_genius_hits() if 'Genius' in source_names else {}
+
+    worst, expected = {}, {}
+    variants = distinct_variants = 0
+    worst_seconds = expected_seconds = 0.0
+    for song, status in to_fetch:
+        queries = queries_for(song['Artist'], song['Title'])
+        variants += len(queries)
+        distinct_variants += len(set(queries))
+        known = (normalize_name(song['Artist']), normalize_name(song['Title'])) in known_ids
+        per_song = KNOWN_SONG_REQUESTS if known else SONG_REQUESTS
+        song_worst = {}
+        for name in source_names:
+            _add(song_worst, SOURCE_REQUESTS[name], len(queries))
+            _add(song_worst, per_song.get(name, {}))
+        first = source_names[0]
+        song_hit = per_song.get(first) or HIT_REQUESTS.get(first, SOURCE_REQUESTS[first])
+        miss_seconds = _seconds(song_worst, rates)
+        hit_seconds = _seconds(song_hit, rates)
+        if song_budget is not None:
+            miss_seconds = min(miss_seconds, song_budget)
+            hit_seconds = min(hit_seconds, song_budget)
+        p = hit_rate if status == 'missing' else 0.0
+        _add(worst, song_worst)
+        for host in set(song_worst) | set(song_hit):
+            expected[host] = (expected.get(host, 0) + p * song_hit.get(host, 0)
+                              + (1 - p) * song_worst.get(host, 0))
+        worst_seconds += miss_seconds
+        expected_seconds += p * hit_seconds + (1 - p) * miss_seconds
+    return {
+        'kind': kind,
+        'counts': counts,
+        'to_fetch': len(to_fetch),
+        'hit_rate': hit_rate,
+        'variants': variants,
+        'distinct_variants': distinct_variants,
+        'worst_requests': worst,
+        'expected_requests': expected,
+        'worst_seconds': worst_seconds,
+        'expected_seconds': expected_seconds,
+    }
+
+
+def plan_run(songs, kinds=('lyrics', 'chords'), rates=None, song_budget=None, run_budget=None):
+    """Plan a fetch run over songs without making any request; see plan_kind for the cost model."""
+    rates = {**SECONDS_PER_REQUEST, **(rates or {})}
+    plans = [plan_kind(songs, kind, rates, song_budget) for kind in kinds]
+    # cache_songs runs the pipelines side by side, so the run takes as long as the slowest one
+    worst = max((plan['worst_seconds'] for plan in plans), default=0.0)
+    expected = max((plan['expected_seconds'] for plan in plans), default=0.0)
+    if run_budget is not None:
+        worst, expected = min(worst, run_budget), min(expected, run_budget)
+    return {'songs': len(songs), 'plans': plans, 'rates': rates, 'song_budget': song_budget,
+            'run_budget': run_budget, 'worst_seconds': worst, 'expected_seconds': expected}
+
+
+def _duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m" if hours else f"{minutes}m {seconds:02d}s"
+
+
+def format_plan(plan):
+    lines = [f"Plan for {plan['songs']} songs (no requests made)"]
+    for kind_plan in plan['plans']:
+        counts = kind_plan['counts']
+        lines.append("")
+        lines.append(f"{kind_plan['kind'].capitalize()}: {counts['cached']} cached, "
+                     f"{counts['negative']} cached as not found, {counts['missing']} missing "
+                     f"-> {kind_plan['to_fetch']} to fetch "
+                     f"(historical hit rate {kind_plan['hit_rate']:.0%})")
+        if not kind_plan['to_fetch']:
+            continue
+        lines.append(f"  Query variants: {kind_plan['variants']} "
+                     f"({kind_plan['distinct_variants']} distinct)")
+        lines.append(f"  {'Requests per host':<20}{'expected':>10}{'worst case':>12}")
+        for host, count in sorted(kind_plan['worst_requests'].items(), key=lambda item: -item[1]):
+            expected = kind_plan['expected_requests'].get(host, 0)
+            lines.append(f"  {host:<20}{expected:>10.0f}{count:>12}")
+        lines.append(f"  Time: expected {_duration(kind_plan['expected_seconds'])}, "
+                     f"worst case {_duration(kind_plan['worst_seconds'])}")
+    lines.append("")
+    budgets = []
+    if plan['song_budget'] is not None:
+        budgets.append(f"song budget {plan['song_budget']:g}s")
+    if plan['run_budget'] is not None:
+        budgets.append(f"run budget {plan['run_budget']:g}s")
+    lines.append(f"Estimated run time: expected {_duration(plan['expected_seconds'])}, "
+                 f"worst case {_duration(plan['worst_seconds'])}"
+                 + (f" (capped by {' and '.join(budgets)})" if budgets else ""))
+    return '\n'.join(lines)
@@ -0,0 +1,189 @@
+import glob
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from app.cache import LOCK_SUFFIX, cache_file_path, try_lock_file, unlock_file
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+RUN_JOURNAL_NAME = 'run_journal.jsonl'
+# Progress older than this is not trusted by --resume; those songs and attempts are fetched again
+RESUME_WINDOW_SECONDS = 24 * 60 * 60
+
+
+def run_journal_path():
+    return cache_file_path(RUN_JOURNAL_NAME)
+
+
+def _journal_files(path):
+    """
+    Per-run journals of path (run_journal.<pid>.jsonl, or run_journal.<pid>.<n>.jsonl when a reused
+    pid already has one), plus path itself if a run left one there.
+    """
+    root, ext = os.path.splitext(path)
+    files = [name for name in glob.glob(f"{glob.escape(root)}.*{ext}")
+             if re.fullmatch(r'\d+(\.\d+)?', name[len(root) + 1:len(name) - len(ext)])]
+    return files + ([path] if os.path.exists(path) else [])
+
+
+def _finished(path):
+    """Whether the journal's run completed, i.e. was not interrupted."""
+    last = None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                last = json.loads(line)
+            except Exception:
+                last = None
+    return isinstance(last, dict) and last.get('event') == 'finish'
+
+
+def _claim(path):
+    """Lock a journal for this run; returns the open lock file, or None if another run holds it."""
+    lock = open(path + LOCK_SUFFIX, 'a+b')
+    if try_lock_file(lock):
+        return lock
+    lock.close()
+    return None
+
+
+def _release(lock):
+    unlock_file(lock)
+    lock.close()
+
+
+def _claim_latest_journal(path):
+    """
+    Lock the journal to resume: the most recent interrupted run's, else the most recent one.
+    Journals of runs still going are skipped. Returns (journal path, lock file) or (None, None).
+    """
+    claimed = []
+    for name in sorted(_journal_files(path), key=os.path.getmtime, reverse=True):
+        lock = _claim(name)
+        if lock is None:
+            continue
+        if not _finished(name):
+            for other in claimed:
+                _release(other[1])
+            return name, lock
+        claimed.append((name, lock))
+    for other in claimed[1:]:
+        _release(other[1])
+    return claimed[0] if claimed else (None, None)
+
+
+def _create_journal(path):
+    """Create and lock a new journal for this run, never reusing one a previous run left behind."""
+    root, ext = os.path.splitext(path)
+    for n in itertools.count():
+        name = f"{root}.{os.getpid()}{f'.{n}' if n else ''}{ext}"
+        try:
+            journal = open(name, 'x', encoding='utf-8')
+        except FileExistsError:
+            continue
+        lock = _claim(name)
+        if lock is not None:
+            return name, journal, lock
+        journal.close()
+
+
+class RunJournal:
+    """
+    Append-only log of a fetch run: every source attempt and every finished song.
+
+    Each run writes its own journal next to path (run_journal.<pid>.jsonl) and holds a lock on it
+    while it runs, so concurrent runs neither overwrite nor resume each other's progress. With
+    resume=True, the latest interrupted journal no live run holds is replayed and continued, so
+    finished songs and completed attempts (within the resume window) are skipped.
+    A run marks its journal finished with finish() only once it completed.
+    """
+
+    def __init__(self, path, resume=False, window=RESUME_WINDOW_SECONDS):
+        self._lock = threading.Lock()
+        self._songs = {}
+        self._attempts = {}
+        since = time.time() - window
+        self.path, self._run_lock = _claim_latest_journal(path) if resume else (None, None)
+        if self.path:
+            self._replay(since)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        else:
+            if resume:
+                logger.info("No run journal found, starting a new run.")
+            self.path, self._file, self._run_lock = _create_journal(path)
+            self._remove_expired(path, since)
+        self._write({'event': 'start', 'resume': resume})
+
+    def _remove_expired(self, path, since):
+        """Delete journals last written before the resume window; --resume would ignore them."""
+        for name in _journal_files(path):
+            try:
+                if name == self.path or os.path.getmtime(name) >= since:
+                    continue
+                lock = _claim(name)
+                if lock is None:
+                    continue
+                try:
+                    os.remove(name)
+                finally:
+                    _release(lock)
+                os.remove(name + LOCK_SUFFIX)
+            except OSError:
+                pass
+
+    def _replay(self, since):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except Exception:
+                    # The last line may be torn if the previous run was killed mid-write.
+                    continue
+                if record.get('time', 0) < since:
+                    continue
+                song = (record.get('kind'), record.get('artist'), record.get('title'))
+                if record.get('event') == 'attempt':
+                    self._attempts.setdefault(song, []).append(record['attempt'])
+                elif record.get('event') == 'song':
+                    self._songs[song] = record['found']
+        logger.info(f"Resuming run: {len(self._songs)} songs and "
+                    f"{sum(len(a) for a in self._attempts.values())} attempts already completed.")
+
+    def _write(self, record):
+        record['time'] = time.time()
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def song_status(self, kind, artist, title):
+        """True/False if the song was finished (found or not) earlier in this run, else None."""
+        return self._songs.get((kind, artist, title))
+
+    def attempts(self, kind, artist, title):
+        return list(self._attempts.get((kind, artist, title), []))
+
+    def attempt_done(self, kind, artist, title, attempt):
+        return attempt in self._attempts.get((kind, artist, title), ())
+
+    def record_attempt(self, kind, artist, title, attempt):
+        self._attempts.setdefault((kind, artist, title), []).append(attempt)
+        self._write({'event': 'attempt', 'kind': kind, 'artist': artist, 'title': title,
+                     'attempt': attempt})
+
+    def record_song(self, kind, artist, title, found):
+        self._songs[(kind, artist, title)] = found
+        self._write({'event': 'song', 'kind': kind, 'artist': artist, 'title': title,
+                     'found': found})
+
+    def finish(self):
+        """Mark the run completed, so --resume does not pick its journal over an interrupted one."""
+        self._write({'event': 'finish'})
+
+    def close(self):
+        self._file.close()
+        _release(self._run_lock)
@@ -0,0 +1,222 @@
+import json
+import logging
+import os
+import re
+from app.cache import (
+    NOT_FOUND_VALUES, SEARCH_DELTA_SUFFIX, SEARCH_INDEX_SUFFIX, atomic_write_lines, cache_lock,
+    decode_value, entry_key, file_signature, jsonl_scan, recover_cache,
+)
+from app.text_cleaning import clean_chords, clean_lyrics, extract_chord_symbols
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_VERSION = 2
+# Fold the delta log into the snapshot once it grows past this size
+DELTA_COMPACT_BYTES = 1024 * 1024
+
+WORD_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+
+def tokenize_lyrics(text):
+    return [word.lower() for word in WORD_RE.findall(text.replace('’', "'"))]
+
+
+def parse_chord_list(text):
+    """Split a chord query such as "G, C, D, Em" into symbols."""
+    return [symbol for symbol in re.split(r'[\s,]+', text) if symbol]
+
+
+def index_terms(value_field, value):
+    """The terms indexed for a cached value: cleaned lyric words, or a sheet's chord symbols."""
+    if not value or value in NOT_FOUND_VALUES:
+        return []
+    if value_field == 'chords':
+        return extract_chord_symbols(clean_chords(value))
+    return tokenize_lyrics(clean_lyrics(value))
+
+
+class SearchIndex:
+    """
+    Positional inverted index over one cache: term -> {song key: [positions]}.
+
+    Supports phrase lookups (consecutive terms) and subset lookups (songs whose distinct terms all
+    belong to a given set, e.g. songs playable with G, C, D and Em).
+    """
+
+    def __init__(self, value_field):
+        self.value_field = value_field
+        self.postings = {}
+        self.terms = {}
+        self.songs = {}
+        self.source = None
+
+    def update(self, artist, title, sequence):
+        key = f"{artist} - {title}"
+        self.remove(key)
+        if not sequence:
+            return
+        self.songs[key] = (artist, title)
+        for position, term in enumerate(sequence):
+            self.postings.setdefault(term, {}).setdefault(key, []).append(position)
+        self.terms[key] = set(sequence)
+
+    def remove(self, key):
+        for term in self.terms.pop(key, ()):
+            docs = self.postings[term]
+            del docs[key]
+            if not docs:
+                del self.postings[term]
+        self.songs.pop(key, None)
+
+    def phrase(self, sequence):
+        """Keys of songs containing the terms consecutively, in order."""
+        if not sequence:
+            return set()
+        docs = [self.postings.get(term, {}) for term in sequence]
+        candidates = set(min(docs, key=len))
+        for postings in docs:
+            candidates &= postings.keys()
+        if len(sequence) == 1:
+            return candidates
+        matches = set()
+        for key in candidates:
+            positions = [set(postings[key]) for postings in docs[1:]]
+            if any(all(start + offset in later for offset, later in enumerate(positions, 1))
+                   for start in docs[0][key]):
+                matches.add(key)
+        return matches
+
+    def subset(self, allowed):
+        """Keys of songs whose distinct terms are all in allowed."""
+        counts = {}
+        for term in set(allowed):
+            for key in self.postings.get(term, ()):
+                counts[key] = counts.get(key, 0) + 1
+        return {key for key, count in counts.items() if count == len(self.terms[key])}
+
+    def to_json(self):
+        return json.dumps({
+            'version': SEARCH_INDEX_VERSION,
+            'field': self.value_field,
+            'source': self.source,
+            'songs': self.songs,
+            'postings': self.postings,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text):
+        data = json.loads(text)
+        if data.get('version') != SEARCH_INDEX_VERSION:
+            raise ValueError(f"Unsupported search index version {data.get('version')}")
+        index = cls(data['field'])
+        index.source = data['source']
+        index.songs = {key: tuple(song) for key, song in data['songs'].items()}
+        index.postings = data['postings']
+        for term, docs in index.postings.items():
+            for key in docs:
+                index.terms.setdefault(key, set()).add(term)
+        return index
+
+
+def _save_snapshot(filename, index):
+    """Write the index snapshot and drop the delta log it now covers (under the cache lock)."""
+    atomic_write_lines(filename + SEARCH_INDEX_SUFFIX, [index.to_json() + '\n'])
+    if os.path.exists(filename + SEARCH_DELTA_SUFFIX):
+        os.remove(filename + SEARCH_DELTA_SUFFIX)
+
+
+def build_search_index(filename, value_field):
+    """Index every entry of a cache from scratch and save the snapshot, for incremental updates."""
+    recover_cache(filename)
+    with cache_lock(filename):
+        index = SearchIndex(value_field)
+        if os.path.exists(filename):
+            with open(filename, 'rb') as f:
+                latest = {}
+                for entry, _, _ in jsonl_scan(f):
+                    latest[entry_key(entry)] = entry
+            for entry in latest.values():
+                index.update(entry.get('artist', ''), entry.get('title', ''),
+                             index_terms(value_field, decode_value(filename, entry, value_field)))
+        index.source = file_signature(filename)
+        _save_snapshot(filename, index)
+    logger.info(f"Indexed {len(index.songs)} songs ({len(index.postings)} terms) from {filename}")
+    return index
+
+
+def _replay_delta(filename, index):
+    path = filename + SEARCH_DELTA_SUFFIX
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                delta = json.loads(line)
+            except Exception:
+                # A torn final line: that write is missing, so the signature check triggers a
+                # rebuild.
+                continue
+            if delta['previous'] != index.source:
+                # The cache was rewritten behind the index's back (merge, maintenance script).
+                return
+            index.update(delta['artist'], delta['title'], delta['terms'])
+            index.source = delta['source']
+
+
+def load_search_index(filename, value_field):
+    """
+    Load the snapshot and delta log of a cache's search index.
+
+    The index is rebuilt when it is missing, or when the cache was changed by anything other than
+    jsonl_save_entry (merges, maintenance scripts) since the index last saw it.
+    """
+    recover_cache(filename)
+    with cache_lock(filename):
+        try:
+            with open(filename + SEARCH_INDEX_SUFFIX, 'r', encoding='utf-8') as f:
+                index = SearchIndex.from_json(f.read())
+            _replay_delta(filename, index)
+            if index.source == file_signature(filename):
+                return index
+            logger.info(f"Search index for {filename} is out of date; rebuilding.")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Rebuilding unreadable search index for {filename}: {e}")
+        return build_search_index(filename, value_field)
+
+
+def index_cache_write(filename, artist, title, value, value_field, previous):
+    """
+    Record a cache write in the search index's delta log. Caller holds the cache lock.
+
+    previous is the cache file's signature before the write, so a replay can tell whether the
+    delta follows on from the index state or the cache changed in between.
+    """
+    path = filename + SEARCH_DELTA_SUFFIX
+    delta = {'artist': artist, 'title': title, 'terms': index_terms(value_field, value),
+             'previous': previous, 'source': file_signature(filename)}
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(delta, ensure_ascii=False) + '\n')
+    if os.path.getsize(path) > DELTA_COMPACT_BYTES:
+        index = load_search_index(filename, value_field)
+        _save_snapshot(filename, index)
+
+
+def search_songs(lyrics_index=None, chords_index=None, phrase=None, chords=None):
+    """
+    Songs whose cleaned lyrics contain phrase and whose chord sheets use only the given chords.
+
+    Each query needs its index loaded; returns a sorted list of (artist, title).
+    """
+    matches = None
+    if phrase:
+        matches = {key: lyrics_index.songs[key]
+                   for key in lyrics_index.phrase(tokenize_lyrics(phrase))}
+    if chords:
+        found = {key: chords_index.songs[key] for key in chords_index.subset(chords)}
+        if matches is not None:
+            found = {key: matches[key] for key in matches.keys() & found.keys()}
+        matches = found
+    return sorted((matches or {}).values(), key=lambda song: (song[0].lower(), song[1].lower()))
@@ -0,0 +1,349 @@
+import io
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from app.cache import jsonl_load_view, lyrics_cache_path, chords_cache_path
+from app.load_songs import load_songs
+from app.document_generation import cache_lyrics, cache_chords
+from app.document_creation import build_docx_template, create_document_from_cache, new_prepared_memo
+from app.songbook_writers import OUTPUT_FORMATS
+from app.chord_sheet import ChordTransform
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+JOBS_OUTPUT_DIR = 'data/output/jobs'
+MAX_QUEUED_JOBS = 32
+# Latency statistics cover this many of the most recent jobs
+LATENCY_WINDOW = 200
+# Finished jobs and their outputs are deleted after this long, or sooner when more than
+# MAX_FINISHED_JOBS are kept
+JOB_TTL_SECONDS = 3600
+MAX_FINISHED_JOBS = 100
+# Cleaned bodies kept warm between jobs; the memo starts over once it grows past this many
+MAX_MEMO_ENTRIES = 5000
+
+CONTENT_TYPES = {
+    '.docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    '.html': 'text/html; charset=utf-8',
+    '.chopro': 'text/plain; charset=utf-8',
+}
+
+
+class Job:
+    def __init__(self, job_id, songs, lyrics, chords, output_format, fetch, chord_transform=None):
+        self.id = job_id
+        self.songs = songs
+        self.lyrics = lyrics
+        self.chords = chords
+        self.format = output_format
+        self.fetch = fetch
+        self.chord_transform = chord_transform
+        self.status = 'queued'
+        self.error = None
+        self.outputs = {}
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'songs': len(self.songs),
+            'format': self.format,
+            'error': self.error,
+            'outputs': {kind: f"/jobs/{self.id}/{kind}" for kind in self.outputs},
+            'queued_seconds': round((self.started or time.time()) - self.created, 3),
+            'run_seconds': (round(self.finished - self.started, 3)
+                            if self.finished and self.started else None),
+        }
+
+
+class SongbookService:
+    """
+    Songbook builds behind a bounded job queue and a fixed pool of worker threads.
+
+    The Genius client, the .docx template, the cleaned song bodies and the cache views stay warm
+    between jobs; cache views are reopened only when a cache file changes, and a replaced view is
+    closed once no running job reads it. While a job fetches into the caches no views are open,
+    since a cache file cannot be replaced while it is open or mapped on Windows. Finished jobs
+    expire after JOB_TTL_SECONDS.
+    """
+
+    def __init__(self, genius_client, workers=2, max_queued=MAX_QUEUED_JOBS):
+        self.genius_client = genius_client
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.jobs = {}
+        self.template = build_docx_template()
+        self.memo = new_prepared_memo()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._views_idle = threading.Condition(self._lock)
+        self._views = {}
+        self._view_users = {}
+        self._fetching = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, songs, lyrics=True, chords=True, output_format='docx', fetch=True,
+               chord_transform=None):
+        """Queue a build; raises queue.Full when the service is saturated."""
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown format '{output_format}'")
+        if not lyrics and not chords:
+            raise ValueError("Nothing to build: both lyrics and chords are disabled")
+        with self._lock:
+            job = Job(str(next(self._ids)), songs, lyrics, chords, output_format, fetch,
+                      chord_transform)
+            self.queue.put_nowait(job)
+            self.jobs[job.id] = job
+        return job
+
+    def _acquire_views(self, sources):
+        """
+        Return warm cache views of (path, value_field) sources for a job, reopening one only if its
+        cache file changed since it was opened. All are taken at once, waiting while jobs fetch into
+        the caches.
+        Acquired views must be handed back with _release_views.
+        """
+        with self._views_idle:
+            while self._fetching:
+                self._views_idle.wait()
+            views = []
+            for path, value_field in sources:
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    mtime = None
+                cached = self._views.get(path)
+                if cached is None or cached[0] != mtime:
+                    if cached is not None and not self._view_users.get(id(cached[1])):
+                        cached[1].close()
+                    cached = self._views[path] = (mtime, jsonl_load_view(path, value_field))
+                view = cached[1]
+                self._view_users[id(view)] = self._view_users.get(id(view), 0) + 1
+                views.append((path, view))
+            return views
+
+    def _release_views(self, views):
+        """Drop a job's use of its views, closing each that was replaced and no other job reads."""
+        with self._views_idle:
+            for path, view in views:
+                users = self._view_users[id(view)] - 1
+                if users:
+                    self._view_users[id(view)] = users
+                    continue
+                del self._view_users[id(view)]
+                if self._views.get(path, (None, None))[1] is not view:
+                    view.close()
+            self._views_idle.notify_all()
+
+    @contextmanager
+    def _fetching_into_caches(self):
+        """Close every view for the duration of a fetch, once the jobs reading them are done."""
+        with self._views_idle:
+            # Counted before waiting, so new readers hold off and the fetch is not starved
+            self._fetching += 1
+            while self._view_users:
+                self._views_idle.wait()
+            for _, view in self._views.values():
+                view.close()
+            self._views = {}
+        try:
+            yield
+        finally:
+            with self._views_idle:
+                self._fetching -= 1
+                self._views_idle.notify_all()
+
+    def _expire_jobs(self, now=None):
+        """Forget jobs, with outputs, older than JOB_TTL_SECONDS or beyond MAX_FINISHED_JOBS."""
+        now = time.time() if now is None else now
+        with self._lock:
+            finished = sorted((job for job in self.jobs.values() if job.finished),
+                              key=lambda job: job.finished)
+            expired = [job for job in finished if now - job.finished > JOB_TTL_SECONDS]
+            excess = finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]
+            expired += [job for job in excess if job not in expired]
+            for job in expired:
+                del self.jobs[job.id]
+        for job in expired:
+            shutil.rmtree(os.path.join(JOBS_OUTPUT_DIR, job.id), ignore_errors=True)
+
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            with self._lock:
+                self._running += 1
+            job.status = 'running'
+            job.started = time.time()
+            try:
+                self._build(job)
+                job.status = 'done'
+            except Exception as e:
+                logger.error(f"Job {job.id} failed: {e}")
+                job.status = 'failed'
+                job.error = str(e)
+            job.finished = time.time()
+            with self._lock:
+                self._running -= 1
+                self._latencies.append(job.finished - job.created)
+                if job.status == 'done':
+                    self._completed += 1
+                else:
+                    self._failed += 1
+            self._expire_jobs()
+            self.queue.task_done()
+
+    def _build(self, job):
+        if job.fetch:
+            with self._fetching_into_caches():
+                if job.lyrics:
+                    cache_lyrics(job.songs, self.genius_client)
+                if job.chords:
+                    cache_chords(job.songs)
+        output_dir = os.path.join(JOBS_OUTPUT_DIR, job.id)
+        os.makedirs(output_dir, exist_ok=True)
+        extension = OUTPUT_FORMATS[job.format]
+        lyrics_output = (os.path.join(output_dir, f"Lyrics_Document{extension}") if job.lyrics
+                         else None)
+        chords_output = (os.path.join(output_dir, f"Chords_Document{extension}") if job.chords
+                         else None)
+        if sum(len(entries) for entries in self.memo.values()) > MAX_MEMO_ENTRIES:
+            self.memo = new_prepared_memo()
+        views = self._acquire_views([(lyrics_cache_path(), 'lyrics'),
+                                     (chords_cache_path(), 'chords')])
+        try:
+            create_document_from_cache(
+                job.songs, views[0][1], views[1][1], lyrics_output, chords_output,
+                template=self.template, memo=self.memo, chord_transform=job.chord_transform,
+            )
+        finally:
+            self._release_views(views)
+        job.outputs = {kind: path for kind, path in (('lyrics', lyrics_output),
+                                                     ('chords', chords_output)) if path}
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            running, completed, failed = self._running, self._completed, self._failed
+        stats = {
+            'queue_depth': self.queue.qsize(),
+            'running': running,
+            'completed': completed,
+            'failed': failed,
+            'latency_seconds': None,
+        }
+        if latencies:
+            stats['latency_seconds'] = {
+                'mean': round(sum(latencies) / len(latencies), 3),
+                'p50': round(latencies[len(latencies) // 2], 3),
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                'max': round(latencies[-1], 3),
+            }
+        return stats
+
+
+def _parse_songs(content_type, body):
+    """Song list from a CSV body (via load_songs) or a JSON body with a 'songs' list."""
+    if content_type.startswith('text/csv'):
+        return load_songs(io.StringIO(body.decode('utf-8'))), {}
+    request = json.loads(body or b'{}')
+    songs = request.get('songs')
+    if isinstance(songs, str):
+        songs = load_songs(io.StringIO(songs))
+    if not isinstance(songs, list) or not all(isinstance(s, dict) and 'Artist' in s and 'Title' in s
+                                              for s in songs):
+        raise ValueError("Expected 'songs' as a list of {\"Artist\", \"Title\"} objects or CSV "
+                         "text")
+    return songs, request
+
+
+def make_handler(service):
+    class SongbookRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/jobs':
+                return self._send_json(404, {'error': 'Not found'})
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            content_type = self.headers.get('Content-Type', 'application/json')
+            try:
+                songs, options = _parse_songs(content_type, body)
+                job = service.submit(
+                    songs,
+                    lyrics=options.get('lyrics', True),
+                    chords=options.get('chords', True),
+                    output_format=options.get('format', 'docx'),
+                    fetch=options.get('fetch', True),
+                    chord_transform=ChordTransform(
+                        int(options.get('transpose', 0)) - int(options.get('capo', 0)),
+                        bool(options.get('simplify_chords', False))),
+                )
+            except queue.Full:
+                return self._send_json(503, {'error': 'Job queue is full', **service.stats()})
+            except Exception as e:
+                return self._send_json(400, {'error': str(e)})
+            self._send_json(202, {**job.to_dict(), 'queue_depth': service.queue.qsize()})
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stats':
+                return self._send_json(200, service.stats())
+            match = re.fullmatch(r'/jobs/(\w+)(?:/(lyrics|chords))?/?', self.path)
+            job = service.jobs.get(match.group(1)) if match else None
+            if job is None:
+                return self._send_json(404, {'error': 'Not found'})
+            if not match.group(2):
+                return self._send_json(200, job.to_dict())
+            path = job.outputs.get(match.group(2))
+            if job.status != 'done' or not path:
+                return self._send_json(409, {'error': f"No {match.group(2)} output",
+                                             'status': job.status})
+            with open(path, 'rb') as f:
+                data = f.read()
+            self.send_response(200)
+            content_type = CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Disposition',
+                             f'attachment; filename="{os.path.basename(path)}"')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            logger.info(f"{self.address_string()} {format % args}")
+
+    return SongbookRequestHandler
+
+
+def serve(genius_client, host='127.0.0.1', port=8765, workers=2):
+    service = SongbookService(genius_client, workers=workers)
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    logger.info(f"Songbook service listening on http://{host}:{port} with {workers} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down songbook service.")
+    finally:
+        server.server_close()
@@ -0,0 +1,186 @@
+import glob
+import json
+import logging
+import os
+import shutil
+import zlib
+from app.blob_store import recount_refs
+from app.cache import (
+    CACHE_FILES, COMPRESSED_SUFFIX, REF_SUFFIX, ZDICT_SUFFIX, atomic_write_lines, blob_store_dir,
+    cache_lock, decode_value, encode_value, entry_is_found, entry_key, jsonl_scan,
+    load_cache_dictionary, recover_cache,
+)
+from app.fetch_data import lyrics_queries
+from app.genius_lookup import GENIUS_CACHE_NAME, normalize_name
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SHARDS_DIR = 'data/cache/shards'
+# Caches a shard fetches into: the song caches, and the Genius hits found by its searches
+SHARD_CACHE_FILES = CACHE_FILES + [(GENIUS_CACHE_NAME, 'genius')]
+
+
+def parse_shard(spec):
+    """Parse an "i/N" shard spec (0 <= i < N) into (i, N)."""
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected i/N")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}', expected 0 <= i < N")
+    return index, count
+
+
+def shard_songs(songs, shard_index, shard_count):
+    """
+    Select the songs belonging to one shard.
+
+    Songs are assigned by a stable hash of artist and title, so every machine computes the same
+    partition whatever the order of the CSV.
+    """
+    def shard_of(song):
+        key = f"{song['Artist']} - {song['Title']}".lower().encode('utf-8')
+        return zlib.crc32(key) % shard_count
+    return [song for song in songs if shard_of(song) == shard_index]
+
+
+def shard_cache_dir(shard_index, shard_count):
+    return os.path.join(SHARDS_DIR, f"shard-{shard_index}-of-{shard_count}")
+
+
+def _shard_keys(songs, value_field):
+    """Cache keys of the shard's songs; Genius hits are keyed by every normalized query variant."""
+    if value_field != 'genius':
+        return {f"{song['Artist']} - {song['Title']}" for song in songs}
+    return {f"{normalize_name(artist)} - {normalize_name(title)}"
+            for song in songs for artist, title in lyrics_queries(song['Artist'], song['Title'])}
+
+
+def seed_shard_cache(source_dir, shard_dir, songs):
+    """
+    Start a new shard cache with the main cache's entries for the shard's songs.
+
+    Songs already found are then not fetched again, and the shard shares the main cache's
+    compression dictionaries. Blob-backed entries are inlined, as the shard has no blob store.
+    """
+    for name, value_field in SHARD_CACHE_FILES:
+        keys = _shard_keys(songs, value_field)
+        source = os.path.join(source_dir, name)
+        target = os.path.join(shard_dir, name)
+        for dictionary in glob.glob(glob.escape(source + ZDICT_SUFFIX) + '*'):
+            copy = target + dictionary[len(source):]
+            if not dictionary.endswith('.tmp') and not os.path.exists(copy):
+                shutil.copyfile(dictionary, copy)
+        if os.path.exists(target) or not os.path.exists(source):
+            continue
+        recover_cache(source)
+        transfers = _packed_suffixes(source, target)
+        with open(source, 'rb') as f:
+            spans = {}
+            for entry, offset, length in jsonl_scan(f):
+                if entry_key(entry) in keys:
+                    spans[entry_key(entry)] = (_packed_suffix(entry, value_field), offset, length)
+            with cache_lock(target):
+                atomic_write_lines(target, (
+                    _transfer_line(_read_line(f, offset, length), value_field, source, target)
+                    if suffix in transfers else _read_line(f, offset, length)
+                    for suffix, offset, length in spans.values()
+                ))
+        logger.info(f"Seeded {target} with {len(spans)} entries from {source}")
+
+
+def _read_line(f, offset, length):
+    f.seek(offset)
+    line = f.read(length)
+    if not line.endswith(b'\n'):
+        line += b'\n'
+    return line.decode('utf-8')
+
+
+def _packed_suffixes(source, target):
+    """Storage suffixes whose records cannot be copied verbatim from source to target."""
+    suffixes = set()
+    if load_cache_dictionary(source) != load_cache_dictionary(target):
+        suffixes.add(COMPRESSED_SUFFIX)
+    if os.path.abspath(os.path.dirname(source)) != os.path.abspath(os.path.dirname(target)):
+        suffixes.add(REF_SUFFIX)
+    return suffixes
+
+
+def _packed_suffix(entry, value_field):
+    for suffix in (COMPRESSED_SUFFIX, REF_SUFFIX):
+        if value_field + suffix in entry:
+            return suffix
+    return None
+
+
+def _transfer_line(line, value_field, source, target):
+    """Re-encode a compressed or blob-backed record for the target's dictionary and blob store."""
+    entry = json.loads(line)
+    value = decode_value(source, entry, value_field)
+    encode_value(entry, value_field, value, load_cache_dictionary(target), blob_store_dir(target))
+    return json.dumps(entry, ensure_ascii=False) + '\n'
+
+
+def merge_cache_files(target, sources, value_field):
+    """
+    Merge shard caches into target, streaming record bodies from disk.
+
+    Only a (found, updated, file, offset, length) tuple per key is held in memory. For each key a
+    found entry beats a not-found one, then the newer 'updated' wins; on a tie the entry already in
+    target (or the earlier shard) is kept. Within one file the last entry for a key wins.
+    Returns the number of keys whose winning entry came from a shard.
+    """
+    inputs = [path for path in [target] + list(sources) if os.path.exists(path)]
+    for path in inputs:
+        recover_cache(path)
+    with cache_lock(target):
+        winners = {}
+        files = [open(path, 'rb') for path in inputs]
+        try:
+            for file_index, f in enumerate(files):
+                for entry, offset, length in jsonl_scan(f):
+                    rank = (entry_is_found(entry, value_field), entry.get('updated', 0))
+                    key = entry_key(entry)
+                    best = winners.get(key)
+                    if (best is None or rank > best[0]
+                            or (rank == best[0] and file_index == best[1])):
+                        suffix = _packed_suffix(entry, value_field)
+                        winners[key] = (rank, file_index, suffix, offset, length)
+            transfers = [_packed_suffixes(path, target) for path in inputs]
+
+            def lines():
+                for _, file_index, suffix, offset, length in winners.values():
+                    line = _read_line(files[file_index], offset, length)
+                    if suffix in transfers[file_index]:
+                        line = _transfer_line(line, value_field, inputs[file_index], target)
+                    yield line
+
+            atomic_write_lines(target, lines())
+        finally:
+            for f in files:
+                f.close()
+    if blob_store_dir(target):
+        recount_refs(os.path.dirname(target))
+    target_index = inputs.index(target) if target in inputs else -1
+    return sum(1 for _, file_index, _, _, _ in winners.values() if file_index != target_index)
+
+
+def find_shard_dirs():
+    if not os.path.isdir(SHARDS_DIR):
+        return []
+    return sorted(
+        os.path.join(SHARDS_DIR, name) for name in os.listdir(SHARDS_DIR)
+        if os.path.isdir(os.path.join(SHARDS_DIR, name))
+    )
+
+
+def merge_caches(cache_dir, shard_dirs):
+    """Merge the lyrics, chords and Genius caches of every shard directory into cache_dir."""
+    for name, value_field in SHARD_CACHE_FILES:
+        target = os.path.join(cache_dir, name)
+        sources = [os.path.join(shard_dir, name) for shard_dir in shard_dirs]
+        merged = merge_cache_files(target, sources, value_field)
+        logger.info(f"Merged {len(shard_dirs)} shard(s) into {target}: {merged} entries taken "
+                    f"from shards.")
@@ -1,38 +1,43 @@
 import logging
 from app.fetch_data import get_lyrics_from_genius
-from app.cache import jsonl_load_entry, jsonl_load_all
+from app.cache import cached_body, jsonl_load_view, lyrics_cache_path
 from app.text_cleaning import clean_lyrics
 from app.document_formatting import sort_songs
+from app.document_creation import BUILD_MEMO_SIZE, new_prepared_memo, prepare_body
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
 def get_song_lyrics_info(song_list, genius_client):
     """Get song titles and the character length of the lyrics for those songs."""
-    lyrics_cache = jsonl_load_all('data/cache/lyrics_cache.jsonl', 'lyrics')
     song_info = []
+    # Covers and duplicate rows share a body; clean each one once
+    prepared = new_prepared_memo(BUILD_MEMO_SIZE)['lyrics']
 
     sorted_songs = sort_songs(song_list)
 
-    for song in sorted_songs:
-        artist = song['Artist']
-        title = song['Title']
-        cache_key = f"{artist} - {title}"
-        if cache_key in lyrics_cache and bool(lyrics_cache[cache_key]) and lyrics_cache[cache_key] != "Lyrics not found.":
-            lyrics = lyrics_cache[cache_key]
-            logger.debug("Lyrics loaded from cache.")
-        else:
-            lyrics = get_lyrics_from_genius(title, artist, genius_client)
-            cleaned_lyrics = clean_lyrics(lyrics)
-            num_characters = len(cleaned_lyrics)
-            if bool(lyrics) and lyrics != "Lyrics not found." and num_characters <= 5000:
-                logger.debug("Lyrics fetched and cached.")
+    with jsonl_load_view(lyrics_cache_path(), 'lyrics') as lyrics_cache:
+        for song in sorted_songs:
+            artist = song['Artist']
+            title = song['Title']
+            cache_key = f"{artist} - {title}"
+            cached_lyrics, digest = cached_body(lyrics_cache, cache_key)
+            if bool(cached_lyrics) and cached_lyrics != "Lyrics not found.":
+                lyrics = cached_lyrics
+                logger.debug("Lyrics loaded from cache.")
             else:
-                lyrics = "Lyrics not found."
-                logger.debug("Lyrics not found or too long.")
+                digest = None
+                lyrics = get_lyrics_from_genius(title, artist, genius_client)
+                cleaned_lyrics = clean_lyrics(lyrics)
+                num_characters = len(cleaned_lyrics)
+                if bool(lyrics) and lyrics != "Lyrics not found." and num_characters <= 5000:
+                    logger.debug("Lyrics fetched and cached.")
+                else:
+                    lyrics = "Lyrics not found."
+                    logger.debug("Lyrics not found or too long.")
 
-        cleaned_lyrics = clean_lyrics(lyrics)
-        num_characters = len(cleaned_lyrics)
-        song_info.append((title, num_characters))
+            cleaned_lyrics, _ = prepare_body(prepared, lyrics, clean_lyrics, digest)
+            num_characters = len(cleaned_lyrics)
+            song_info.append((title, num_characters))
 
     return song_info
@@ -0,0 +1,115 @@
+import html
+import os
+from app.chord_sheet import inline_chord_lines
+
+# Output formats selectable on the command line and the file extension each one writes
+OUTPUT_FORMATS = {'docx': '.docx', 'html': '.html', 'chordpro': '.chopro'}
+
+HTML_HEADER = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<style>
+body {{ font-family: Georgia, serif; margin: 0.5in; }}
+header {{ font-size: 14pt; }}
+main {{ column-count: 2; column-gap: 0.5in; }}
+@media (max-width: 800px) {{ main {{ column-count: 1; }} }}
+section {{ break-inside: avoid-column; }}
+h1 {{ font-size: 14pt; }}
+.song-text {{ font-size: 12pt; white-space: pre-wrap; }}
+.chords .song-text {{ font-family: "Courier New", monospace; }}
+</style>
+</head>
+<body class="{kind}">
+<header>{title}</header>
+<main>
+"""
+HTML_FOOTER = """</main>
+</body>
+</html>
+"""
+
+
+class _StreamingSongbookFile:
+    """
+    A songbook streamed to a temporary file next to path and renamed over it on close, so a build
+    that fails half way (abort) leaves the previous book in place instead of a truncated one.
+    """
+
+    def _open(self, path):
+        self.path = path
+        self._tmp_path = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._tmp_path, 'w', encoding='utf-8')
+
+    def _finish(self):
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        """Discard the partly written book."""
+        self._file.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class HtmlSongbookWriter(_StreamingSongbookFile):
+    """Single-file HTML songbook, written to disk one song at a time."""
+
+    def __init__(self, path, kind='lyrics', title='Campfire Songs'):
+        self._open(path)
+        self._file.write(HTML_HEADER.format(title=html.escape(title), kind=kind))
+
+    @staticmethod
+    def render(title, artist, lines):
+        """Render one song as a self-contained HTML fragment."""
+        return (
+            f'<section>\n<h1>{html.escape(f"{title} by {artist}")}</h1>\n'
+            f'<div class="song-text">{html.escape(chr(10).join(lines))}</div>\n</section>\n'
+        )
+
+    def add_song(self, title, artist, lines):
+        self._file.write(self.render(title, artist, lines))
+
+    def add_fragment(self, fragment):
+        self._file.write(fragment)
+
+    def close(self):
+        self._file.write(HTML_FOOTER)
+        self._finish()
+
+
+class ChordProSongbookWriter(_StreamingSongbookFile):
+    """
+    ChordPro bundle: every song in one file, separated by {new_song} directives. Chord sheets
+    written chords-over-lyrics are converted to ChordPro's inline [G] chords; lyrics are kept as is.
+    """
+
+    def __init__(self, path, kind='chords', title='Campfire Songs'):
+        self._open(path)
+        self.kind = kind
+        self._first = True
+
+    def render(self, title, artist, lines):
+        body = '\n'.join(line for line in lines
+                         if not line.startswith(('{t:', '{title:', '{st:', '{subtitle:')))
+        if self.kind == 'chords':
+            body = '\n'.join(inline_chord_lines(body))
+        return f"{{title: {title}}}\n{{artist: {artist}}}\n{body}\n"
+
+    def add_song(self, title, artist, lines):
+        self.add_fragment(self.render(title, artist, lines))
+
+    def add_fragment(self, fragment):
+        if not self._first:
+            self._file.write('\n{new_song}\n')
+        self._first = False
+        self._file.write(fragment)
+
+    def close(self):
+        self._finish()
+
+
+STREAMING_WRITERS = {'.html': HtmlSongbookWriter, '.htm': HtmlSongbookWriter,
+                     '.chopro': ChordProSongbookWriter, '.cho': ChordProSongbookWriter}
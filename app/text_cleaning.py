@@ -55,3 +55,56 @@ def clean_chords(chords):
     chords = re.sub(r'\s+\n', '\n', chords)
 
     return chords
+
+
+# A chord symbol such as G, F#m7, Bbmaj7, Dsus4, Cadd9 or D/F#, optionally followed by a fingering
+# note like "(type2)"
+CHORD_SYMBOL = (r'[A-G][#b]?(?:maj|Maj|min|dim|aug|sus|add|m|M)?\d*(?:(?:maj|sus|add|[#b])\d+)*'
+                r'(?:/[A-G][#b]?)?')
+CHORD_TOKEN_RE = re.compile(r'(' + CHORD_SYMBOL + r')(?:\([^()\s]*\))?\**')
+BRACKETED_CHORD_RE = re.compile(r'\[(' + CHORD_SYMBOL + r')\]')
+# A section label leading a chord line ("Intro:", "Verse 2:", "Pre-Chorus:")
+CHORD_LINE_LABEL_RE = re.compile(r"\s*[A-Za-z][\w'-]*(?:\s+\w+)?:(?=\s|$)")
+# Chord sheet marks that may share a line with chords: repeats, "no chord", bar lines and dashes
+CHORD_LINE_MARK_RE = re.compile(r'\(?[xX]\d+\)?|\(?\d+[xX]\)?|\(?N\.?C\.?\)?|[|:./\\~-]+')
+
+
+def chord_line_chords(line):
+    """
+    (column, symbol) of every chord on a chord line, or None if line is lyrics.
+
+    A line is a chord line when, after an optional leading label, every token is a chord (bare,
+    [bracketed], with a (variation) or * suffix) or a chord sheet mark such as N.C. or (x2),
+    and at least one is a chord.
+    """
+    label = CHORD_LINE_LABEL_RE.match(line)
+    start = label.end() if label else 0
+    chords = []
+    for token in re.finditer(r'\S+', line[start:]):
+        text = token.group()
+        column = start + token.start()
+        match = CHORD_TOKEN_RE.fullmatch(text)
+        if match:
+            chords.append((column, match.group(1)))
+            continue
+        match = BRACKETED_CHORD_RE.fullmatch(text)
+        if match:
+            chords.append((column + 1, match.group(1)))
+        elif not CHORD_LINE_MARK_RE.fullmatch(text):
+            return None
+    return chords or None
+
+
+def extract_chord_symbols(chords):
+    """
+    Return the chord symbols of a chord sheet in order: inline [G] chords and chord lines (see
+    chord_line_chords).
+    """
+    symbols = []
+    for line in chords.splitlines():
+        line_chords = chord_line_chords(line)
+        if line_chords:
+            symbols.extend(symbol for _, symbol in line_chords)
+        else:
+            symbols.extend(BRACKETED_CHORD_RE.findall(line))
+    return symbols
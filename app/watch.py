@@ -0,0 +1,232 @@
+import logging
+import os
+import time
+from app.cache import jsonl_load_view, jsonl_save_entry, lyrics_cache_path, chords_cache_path
+from app.load_songs import load_songs
+from app.document_generation import cache_lyrics, cache_chords
+from app.document_creation import create_document_from_cache
+from app.fetch_data import MANUAL_LYRICS_PATH, get_manual_lyrics, lyrics_queries
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.5
+# Wait for the inputs to be quiet this long before rebuilding, so an editor's save burst is one
+# rebuild
+DEBOUNCE_SECONDS = 1.5
+
+
+def _song_key(song):
+    return f"{song['Artist']} - {song['Title']}"
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class _UsedEntries(dict):
+    """A memo that tracks which entries the last build used, so stale ones can be dropped."""
+
+    def __init__(self):
+        super().__init__()
+        self.used = set()
+
+    def get(self, key, default=None):
+        if key in self:
+            self.used.add(key)
+        return super().get(key, default)
+
+    def __setitem__(self, key, value):
+        self.used.add(key)
+        super().__setitem__(key, value)
+
+    def prune(self):
+        for key in set(self) - self.used:
+            del self[key]
+        self.used = set()
+
+
+class SongbookWatcher:
+    """
+    Keep the song list, cache views and rendered song fragments in memory and rebuild on change.
+
+    Watches the song CSV, both caches and the manual lyrics file. Only newly added songs are
+    fetched, and only the outputs whose inputs changed are rebuilt.
+    """
+
+    def __init__(self, csv_path, genius_client, lyrics_output=None, chords_output=None,
+                 chord_transform=None):
+        self.csv_path = csv_path
+        self.genius_client = genius_client
+        self.lyrics_output = lyrics_output
+        self.chords_output = chords_output
+        self.chord_transform = chord_transform
+        self.songs = []
+        self.lyrics_cache = None
+        self.chords_cache = None
+        # Per output: cleaned bodies (and parsed sheets) and rendered fragments, pruned to the songs
+        # of each build
+        self.memo = {kind: {name: _UsedEntries() for name in ('lyrics', 'chords', 'sheets')}
+                     for kind in ('lyrics', 'chords')}
+        self.fragments = {kind: _UsedEntries() for kind in ('lyrics', 'chords')}
+        self._mtimes = {}
+
+    def _watched(self):
+        return {
+            'songs': self.csv_path,
+            'lyrics': lyrics_cache_path(),
+            'chords': chords_cache_path(),
+            'manual': MANUAL_LYRICS_PATH,
+        }
+
+    def _snapshot(self):
+        return {name: _mtime(path) for name, path in self._watched().items()}
+
+    def _reload_views(self, lyrics=True, chords=True):
+        if lyrics:
+            if self.lyrics_cache is not None:
+                self.lyrics_cache.close()
+            self.lyrics_cache = jsonl_load_view(lyrics_cache_path(), 'lyrics')
+        if chords:
+            if self.chords_cache is not None:
+                self.chords_cache.close()
+            self.chords_cache = jsonl_load_view(chords_cache_path(), 'chords')
+
+    def _close_views(self):
+        """
+        Release the views' file handles and mmaps before a fetch replaces the cache files (Windows
+        refuses otherwise).
+        """
+        for cache in (self.lyrics_cache, self.chords_cache):
+            if cache is not None:
+                cache.close()
+        self.lyrics_cache = self.chords_cache = None
+
+    def _missing_lyrics(self, songs):
+        return [song for song in songs if not self._found(self.lyrics_cache, song)]
+
+    @staticmethod
+    def _found(cache, song):
+        value = cache.get(_song_key(song))
+        return bool(value) and value not in ("Lyrics not found.", "Chords not found.")
+
+    def _fetch(self, songs):
+        """Fetch lyrics and chords for songs; returns which caches may have changed."""
+        if not songs:
+            return set()
+        logger.info(f"Fetching {len(songs)} new song(s)...")
+        changed = set()
+        if self.lyrics_output:
+            cache_lyrics(songs, self.genius_client)
+            changed.add('lyrics')
+        if self.chords_output:
+            cache_chords(songs)
+            changed.add('chords')
+        return changed
+
+    def _fetch_manual_lyrics(self, songs):
+        """Cache manual lyrics for songs that have some now; returns whether any were added."""
+        added = False
+        for song in songs:
+            for artist, title in lyrics_queries(song['Artist'], song['Title']):
+                lyrics = get_manual_lyrics(title, artist)
+                if lyrics:
+                    jsonl_save_entry(lyrics_cache_path(), song['Artist'], song['Title'], lyrics,
+                                     'lyrics')
+                    added = True
+                    break
+        return added
+
+    def _rebuild(self, lyrics, chords):
+        outputs = {'lyrics': self.lyrics_output if lyrics else None,
+                   'chords': self.chords_output if chords else None}
+        if not any(outputs.values()):
+            return
+        start = time.perf_counter()
+        for kind, output in outputs.items():
+            if not output:
+                continue
+            create_document_from_cache(
+                self.songs, self.lyrics_cache, self.chords_cache,
+                lyrics_output=output if kind == 'lyrics' else None,
+                chords_output=output if kind == 'chords' else None,
+                memo=self.memo[kind], fragments=self.fragments[kind],
+                chord_transform=self.chord_transform,
+            )
+            for entries in (*self.memo[kind].values(), self.fragments[kind]):
+                entries.prune()
+        logger.info(f"Rebuilt {', '.join(p for p in outputs.values() if p)} "
+                    f"in {time.perf_counter() - start:.2f}s")
+
+    def build(self, changed):
+        """
+        Bring the outputs up to date after the named inputs changed; returns the caches this build
+        wrote to.
+        """
+        caches_changed = set(changed) & {'lyrics', 'chords'}
+        songs_changed = 'songs' in changed
+        if songs_changed:
+            previous = {_song_key(song) for song in self.songs}
+            try:
+                self.songs = load_songs(self.csv_path)
+            except Exception as e:
+                logger.error(f"Keeping the previous song list: {e}")
+                return set()
+            added = [song for song in self.songs if _song_key(song) not in previous]
+            if added:
+                self._close_views()
+            written = self._fetch(added)
+            caches_changed |= written
+        else:
+            written = set()
+        if 'manual' in changed and self.lyrics_output:
+            self._reload_views(chords=False)
+            missing = self._missing_lyrics(self.songs)
+            self._close_views()
+            if missing and self._fetch_manual_lyrics(missing):
+                logger.info("Manual lyrics changed; added them for songs without lyrics.")
+                written.add('lyrics')
+                caches_changed.add('lyrics')
+        self._reload_views('lyrics' in caches_changed or self.lyrics_cache is None,
+                           'chords' in caches_changed or self.chords_cache is None)
+        self._rebuild(songs_changed or 'lyrics' in caches_changed,
+                      songs_changed or 'chords' in caches_changed)
+        return written
+
+    def _absorb_own_writes(self, written):
+        """
+        Treat the caches this process just wrote as seen. Every other input keeps the mtime it had
+        before the build, so edits made while fetching or building trigger the next build.
+        """
+        current = self._snapshot()
+        for name in written:
+            self._mtimes[name] = current[name]
+
+    def run(self):
+        logger.info(f"Watching {', '.join(self._watched().values())} (Ctrl-C to stop)")
+        self._mtimes = self._snapshot()
+        self._absorb_own_writes(self.build({'songs'}))
+        pending = set()
+        last_change = 0.0
+        try:
+            while True:
+                time.sleep(POLL_INTERVAL)
+                current = self._snapshot()
+                changed = {name for name, mtime in current.items()
+                           if mtime != self._mtimes.get(name)}
+                if changed:
+                    pending |= changed
+                    last_change = time.monotonic()
+                    self._mtimes = current
+                if pending and time.monotonic() - last_change >= DEBOUNCE_SECONDS:
+                    logger.info(f"Change detected in: {', '.join(sorted(pending))}")
+                    written = self.build(pending)
+                    pending = set()
+                    self._absorb_own_writes(written)
+        except KeyboardInterrupt:
+            logger.info("Stopped watching.")
+        finally:
+            self._close_views()
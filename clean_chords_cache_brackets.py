@@ -1,6 +1,6 @@
-import json
 import os
 import re
+from app.cache import rewrite_cache_values
 
 MARKUP_TAGS = [
     'ch', '/ch', 'tab', '/tab', 'verse', '/verse', 'intro', '/intro',
@@ -19,19 +19,7 @@ def clean_jsonl_file(filename, value_field):
     if not os.path.exists(filename):
         print(f"File not found: {filename}")
         return
-    lines = []
-    with open(filename, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                entry = json.loads(line)
-                if value_field in entry and entry[value_field]:
-                    entry[value_field] = remove_markup_tags(entry[value_field])
-                lines.append(entry)
-            except Exception:
-                lines.append(line)
-    with open(filename, 'w', encoding='utf-8') as f:
-        for entry in lines:
-            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    rewrite_cache_values(filename, value_field, remove_markup_tags)
 
 clean_jsonl_file('data/cache/chords_cache.jsonl', 'chords')
 print("Markup tags removed from chords cache.") 
\ No newline at end of file
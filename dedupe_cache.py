@@ -0,0 +1,32 @@
+import argparse
+import os
+from app.blob_store import collect_garbage, enable_dedup
+from app.cache import BLOBS_DIR_NAME, CACHE_FILES
+
+CACHE_DIR = 'data/cache'
+
+
+def disk_usage(cache_dir):
+    total = sum(
+        os.path.getsize(os.path.join(cache_dir, name))
+        for name, _ in CACHE_FILES if os.path.exists(os.path.join(cache_dir, name))
+    )
+    for root, _, files in os.walk(os.path.join(cache_dir, BLOBS_DIR_NAME)):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Deduplicate cached lyrics and chords into a content-addressed blob store.")
+    parser.add_argument('--gc', action='store_true',
+                        help='Only recount references and delete unreferenced blobs')
+    args = parser.parse_args()
+    before = disk_usage(CACHE_DIR)
+    if args.gc:
+        kept, removed, freed = collect_garbage(CACHE_DIR)
+        print(f"{kept} blobs kept, {removed} removed, {freed} bytes freed.")
+    else:
+        for filename, (records, unique) in enable_dedup(CACHE_DIR).items():
+            print(f"{filename}: {records} records, {unique} unique bodies")
+    print(f"Cache size: {before} -> {disk_usage(CACHE_DIR)} bytes")
@@ -1,5 +1,5 @@
-import json
 import os
+from app.cache import rewrite_cache_values
 
 def fix_mojibake(text):
     if not isinstance(text, str):
@@ -21,19 +21,7 @@ def clean_jsonl_file(filename, value_field):
     if not os.path.exists(filename):
         print(f"File not found: {filename}")
         return
-    lines = []
-    with open(filename, 'r', encoding='utf-8') as f:
-        for line in f:
-            try:
-                entry = json.loads(line)
-                if value_field in entry and entry[value_field]:
-                    entry[value_field] = fix_mojibake(entry[value_field])
-                lines.append(entry)
-            except Exception:
-                lines.append(line)
-    with open(filename, 'w', encoding='utf-8') as f:
-        for entry in lines:
-            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    rewrite_cache_values(filename, value_field, fix_mojibake)
 
 clean_jsonl_file('data/cache/lyrics_cache.jsonl', 'lyrics')
 clean_jsonl_file('data/cache/chords_cache.jsonl', 'chords')
@@ -1,19 +1,27 @@
 import logging
 import argparse
+import os
 import sys
 from app.load_config import load_config
 from app.load_songs import load_songs
-from app.document_generation import cache_lyrics, cache_chords
+from app.document_generation import cache_lyrics, cache_chords, cache_songs
 from app.fetch_data import get_genius_client
 from app.song_info import get_song_lyrics_info
+from app.cache import (
+    CACHE_DIR as MAIN_CACHE_DIR, set_cache_dir, lyrics_cache_path, chords_cache_path,
+)
+from app.songbook_writers import OUTPUT_FORMATS
+from app.run_journal import RunJournal, run_journal_path
+from app.deadline import time_budget
+from app.sharding import (
+    parse_shard, shard_songs, shard_cache_dir, seed_shard_cache, find_shard_dirs, merge_caches,
+)
 # from app.cache import load_cache  # Remove this import, not needed with JSONL
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 CONFIG_PATH = 'data/config/config.json'
 SONGS_CSV_PATH = 'data/src/CampfireSongs.csv'
-LYRICS_CACHE_PATH = 'data/cache/lyrics_cache.jsonl'
-CHORDS_CACHE_PATH = 'data/cache/chords_cache.jsonl'
 LYRICS_DOC_PATH = 'data/output/Lyrics_Document.docx'
 CHORDS_DOC_PATH = 'data/output/Chords_Document.docx'
 
@@ -31,22 +39,130 @@ def test_genius_api(genius_client):
         print("Genius API key test failed:", e)
         return False
 
+
+def output_paths(output_format):
+    """Lyrics and chords document paths for the selected output format."""
+    extension = OUTPUT_FORMATS[output_format]
+    return (os.path.splitext(LYRICS_DOC_PATH)[0] + extension,
+            os.path.splitext(CHORDS_DOC_PATH)[0] + extension)
+
+
+def chord_transform_from_args(args):
+    """The chord transform requested by --transpose, --capo and --simplify-chords, or None."""
+    from app.chord_sheet import ChordTransform
+    transform = ChordTransform(args.transpose - args.capo, args.simplify_chords)
+    return None if transform.is_identity() else transform
+
+
+def generate_documents(songs, lyrics_output=None, chords_output=None, chord_transform=None):
+    """Render the requested documents, decoding only the cache entries the song list uses."""
+    from app.cache import jsonl_load_view
+    from app.document_creation import create_document_from_cache
+    with jsonl_load_view(lyrics_cache_path(), 'lyrics') as lyrics_cache, \
+            jsonl_load_view(chords_cache_path(), 'chords') as chords_cache:
+        create_document_from_cache(songs, lyrics_cache, chords_cache, lyrics_output, chords_output,
+                                   chord_transform=chord_transform)
+
 def main():
     parser = argparse.ArgumentParser(description="Generate chord and lyrics documents from a list of songs.")
     parser.add_argument('--get-song-info', action='store_true', help='Get song titles and the character length of the lyrics')
     parser.add_argument('--lyrics-only', action='store_true', help='Generate document for lyrics only')
     parser.add_argument('--chords-only', action='store_true', help='Generate document for chords only')
     parser.add_argument('--generate-from-cache', action='store_true', help='Generate documents from cache only')
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='docx',
+                        help='Output format for the generated documents (default: docx)')
+    parser.add_argument('--transpose', type=int, default=0, metavar='SEMITONES',
+                        help='Transpose every chord sheet by SEMITONES (e.g. 2 or -3)')
+    parser.add_argument('--capo', type=int, default=0, metavar='FRET',
+                        help='Rewrite chord sheets as shapes to play with a capo on FRET')
+    parser.add_argument('--simplify-chords', action='store_true',
+                        help='Reduce every chord to its major or minor triad '
+                             '(Cmaj7 -> C, Am7 -> Am, D/F# -> D)')
     parser.add_argument('--test-api', action='store_true', help='Test the Genius API key')
     parser.add_argument('--cache-only', action='store_true', help='Fetch and cache all lyrics and chords, but do not generate documents')
+    parser.add_argument('--shard', metavar='I/N',
+                        help='With --cache-only, fetch only shard I of N (0-based) into a '
+                             'shard-local cache')
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running, and fetch new songs and rebuild documents when the '
+                             'song list, caches or manual lyrics change')
+    parser.add_argument('--song-budget', type=float, metavar='SECONDS',
+                        help='Give up on a song after SECONDS of fetching (default: config '
+                             'budgets.song_seconds, else no limit)')
+    parser.add_argument('--run-budget', type=float, metavar='SECONDS',
+                        help='Stop fetching after SECONDS and build documents from what is cached '
+                             '(default: config budgets.run_seconds, else no limit)')
+    parser.add_argument('--plan', action='store_true',
+                        help='Report what a fetch run would do (cache state, requests per source, '
+                             'estimated time) without making any request')
+    parser.add_argument('--resume', action='store_true',
+                        help='Continue the previous interrupted fetch run, skipping songs and '
+                             'attempts it completed')
+    parser.add_argument('--batch', metavar='MANIFEST',
+                        help='Generate every songbook listed in a JSON manifest from the cache')
+    parser.add_argument('--jobs', type=int,
+                        help='Worker processes for --batch (default: one per book, up to the CPU '
+                             'count), or worker threads for --serve (default: 2)')
+    parser.add_argument('--serve', action='store_true',
+                        help='Run a local HTTP service that builds songbooks from posted '
+                             'song lists')
+    parser.add_argument('--port', type=int, default=8765, help='Port for --serve (default: 8765)')
+    parser.add_argument('--search', metavar='PHRASE',
+                        help='List cached songs whose lyrics contain PHRASE')
+    parser.add_argument('--search-chords', metavar='CHORDS',
+                        help='List cached songs playable with only these chords, e.g. "G,C,D,Em"')
+    parser.add_argument('--gc', nargs='*', metavar='SONGS_CSV',
+                        help='Compact the caches to the songs of these song lists (default: the '
+                             'main song list), archiving evicted entries')
+    parser.add_argument('--gc-negative-days', type=float, metavar='DAYS',
+                        help='With --gc, also evict "not found" entries older than DAYS to '
+                             'reclaim space')
+    parser.add_argument('--merge-caches', nargs='*', metavar='SHARD_DIR',
+                        help='Merge shard caches into the main cache (default: all shards)')
     args = parser.parse_args()
 
+    if args.merge_caches is not None:
+        merge_caches(MAIN_CACHE_DIR, args.merge_caches or find_shard_dirs())
+        return
+
+    if args.gc is not None:
+        collect_cache_garbage(args)
+        return
+
+    if args.search or args.search_chords:
+        search(args)
+        return
+
+    if args.batch:
+        from app.batch import build_songbooks
+        try:
+            build_songbooks(args.batch, args.jobs)
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to build songbooks: {e}")
+            sys.exit(1)
+        return
+
+    shard = None
+    if args.shard:
+        if not args.cache_only:
+            parser.error("--shard can only be used with --cache-only")
+        try:
+            shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+
     # Load config
     try:
         config = load_config(CONFIG_PATH)
         if not config or 'genius' not in config or 'client_access_token' not in config['genius']:
             raise ValueError("Missing 'genius' or 'client_access_token' in config file.")
         genius_access_token = config['genius']['client_access_token']
+        rates = config.get('rates') or {}
+        budgets = config.get('budgets') or {}
+        if args.song_budget is None:
+            args.song_budget = budgets.get('song_seconds')
+        if args.run_budget is None:
+            args.run_budget = budgets.get('run_seconds')
     except Exception as e:
         logging.error(f"Failed to load config: {e}")
         sys.exit(1)
@@ -57,6 +173,11 @@ def main():
         test_genius_api(genius_client)
         return
 
+    if args.serve:
+        from app.service import serve
+        serve(genius_client, port=args.port, workers=args.jobs or 2)
+        return
+
     # Load songs
     try:
         songs = load_songs(SONGS_CSV_PATH)
@@ -64,59 +185,127 @@ def main():
         logging.error(f"Failed to load songs: {e}")
         sys.exit(1)
 
-    if args.cache_only:
-        logging.info("Caching all lyrics and chords for the song list (no document generation)...")
-        cache_lyrics(songs, genius_client)
-        cache_chords(songs)
-        logging.info("Caching complete.")
+    if shard:
+        songs = shard_songs(songs, *shard)
+
+    if args.plan:
+        # A dry run: plan against the main cache, before any shard cache is created or seeded
+        from app.planner import plan_run, format_plan
+        kinds = [kind for kind, skip in (('lyrics', args.chords_only), ('chords', args.lyrics_only))
+                 if not skip]
+        print(format_plan(plan_run(songs, kinds, rates, args.song_budget, args.run_budget)))
         return
 
-    if args.get_song_info:
-        song_info = get_song_lyrics_info(songs, genius_client)
-        for title, num_characters in song_info:
-            print(f"{title}: {num_characters} characters")
+    if shard:
+        shard_dir = shard_cache_dir(*shard)
+        set_cache_dir(shard_dir)
+        seed_shard_cache(MAIN_CACHE_DIR, shard_dir, songs)
+        logging.info(f"Shard {shard[0]}/{shard[1]}: {len(songs)} songs, caching to {shard_dir}")
+
+    if args.watch:
+        from app.watch import SongbookWatcher
+        lyrics_doc_path, chords_doc_path = output_paths(args.format)
+        SongbookWatcher(
+            SONGS_CSV_PATH, genius_client,
+            lyrics_output=lyrics_doc_path if not args.chords_only else None,
+            chords_output=chords_doc_path if not args.lyrics_only else None,
+            chord_transform=chord_transform_from_args(args),
+        ).run()
         return
 
-    # The following cache loading is not needed with the new JSONL logic
-    # lyrics_cache = load_cache(LYRICS_CACHE_PATH)
-    # chords_cache = load_cache(CHORDS_CACHE_PATH)
-
-    if args.generate_from_cache:
-        logging.info("Generating documents from cache only.")
-        lyrics_output = LYRICS_DOC_PATH if not args.chords_only else None
-        chords_output = CHORDS_DOC_PATH if not args.lyrics_only else None
-        # The document generation functions will now load from JSONL as needed
-        from app.cache import jsonl_load_all
-        lyrics_cache = jsonl_load_all(LYRICS_CACHE_PATH, 'lyrics')
-        chords_cache = jsonl_load_all(CHORDS_CACHE_PATH, 'chords')
-        from app.document_creation import create_document_from_cache
-        create_document_from_cache(songs, lyrics_cache, chords_cache, lyrics_output, chords_output)
+    if not args.cache_only:
+        if args.get_song_info:
+            song_info = get_song_lyrics_info(songs, genius_client)
+            for title, num_characters in song_info:
+                print(f"{title}: {num_characters} characters")
+            return
+
+        if args.generate_from_cache:
+            logging.info("Generating documents from cache only.")
+            lyrics_doc_path, chords_doc_path = output_paths(args.format)
+            lyrics_output = lyrics_doc_path if not args.chords_only else None
+            chords_output = chords_doc_path if not args.lyrics_only else None
+            generate_documents(songs, lyrics_output, chords_output, chord_transform_from_args(args))
+            return
+
+    # Every remaining mode fetches; journal its progress so an interrupted run can be resumed
+    journal = RunJournal(run_journal_path(), resume=args.resume)
+    try:
+        with time_budget(args.run_budget):
+            fetch_and_generate(args, songs, genius_client, journal)
+        journal.finish()
+    finally:
+        journal.close()
+
+
+def collect_cache_garbage(args):
+    """Compact the main caches down to the songs of the --gc song lists and report the savings."""
+    from app.cache_gc import collect_cache, format_gc_report
+    songs = []
+    try:
+        for csv_path in args.gc or [SONGS_CSV_PATH]:
+            songs.extend(load_songs(csv_path))
+    except Exception as e:
+        logging.error(f"Failed to load songs: {e}")
+        sys.exit(1)
+    max_negative_age = args.gc_negative_days * 86400 if args.gc_negative_days is not None else None
+    try:
+        results, blobs = collect_cache(MAIN_CACHE_DIR, songs, max_negative_age)
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+    print(format_gc_report(results, blobs))
+
+
+def search(args):
+    """
+    Print the songs matching --search/--search-chords; with --generate-from-cache, build a songbook
+    of them.
+    """
+    import time
+    from app.search_index import load_search_index, parse_chord_list, search_songs
+    lyrics_index = load_search_index(lyrics_cache_path(), 'lyrics') if args.search else None
+    chords_index = load_search_index(chords_cache_path(), 'chords') if args.search_chords else None
+    start = time.perf_counter()
+    matches = search_songs(lyrics_index, chords_index, phrase=args.search,
+                           chords=parse_chord_list(args.search_chords or ''))
+    elapsed = time.perf_counter() - start
+    for artist, title in matches:
+        print(f"{artist} - {title}")
+    print(f"{len(matches)} song(s) found in {elapsed * 1000:.2f} ms")
+    if args.generate_from_cache and matches:
+        lyrics_doc_path, chords_doc_path = output_paths(args.format)
+        generate_documents(
+            [{'Artist': artist, 'Title': title} for artist, title in matches],
+            lyrics_output=lyrics_doc_path if not args.chords_only else None,
+            chords_output=chords_doc_path if not args.lyrics_only else None,
+            chord_transform=chord_transform_from_args(args),
+        )
+
+
+def fetch_and_generate(args, songs, genius_client, journal):
+    lyrics_doc_path, chords_doc_path = output_paths(args.format)
+    if args.cache_only:
+        logging.info("Caching all lyrics and chords for the song list (no document generation)...")
+        cache_songs(songs, genius_client, journal, args.song_budget)
+        logging.info("Caching complete.")
         return
 
     if args.lyrics_only:
-        cache_lyrics(songs, genius_client)
-        from app.cache import jsonl_load_all
-        lyrics_cache = jsonl_load_all(LYRICS_CACHE_PATH, 'lyrics')
-        from app.document_creation import create_document_from_cache
-        create_document_from_cache(songs, lyrics_cache, {}, lyrics_output=LYRICS_DOC_PATH)
+        cache_lyrics(songs, genius_client, journal, args.song_budget)
+        generate_documents(songs, lyrics_output=lyrics_doc_path)
         return
 
     if args.chords_only:
-        cache_chords(songs)
-        from app.cache import jsonl_load_all
-        chords_cache = jsonl_load_all(CHORDS_CACHE_PATH, 'chords')
-        from app.document_creation import create_document_from_cache
-        create_document_from_cache(songs, {}, chords_cache, chords_output=CHORDS_DOC_PATH)
+        cache_chords(songs, journal, args.song_budget)
+        generate_documents(songs, chords_output=chords_doc_path,
+                           chord_transform=chord_transform_from_args(args))
         return
 
     # Default: cache both and generate both docs
-    cache_lyrics(songs, genius_client)
-    cache_chords(songs)
-    from app.cache import jsonl_load_all
-    lyrics_cache = jsonl_load_all(LYRICS_CACHE_PATH, 'lyrics')
-    chords_cache = jsonl_load_all(CHORDS_CACHE_PATH, 'chords')
-    from app.document_creation import create_document_from_cache
-    create_document_from_cache(songs, lyrics_cache, chords_cache, lyrics_output=LYRICS_DOC_PATH, chords_output=CHORDS_DOC_PATH)
+    cache_songs(songs, genius_client, journal, args.song_budget)
+    generate_documents(songs, lyrics_output=lyrics_doc_path, chords_output=chords_doc_path,
+                       chord_transform=chord_transform_from_args(args))
 
 if __name__ == "__main__":
     main()
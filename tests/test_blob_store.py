@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+import unittest
+from app.blob_store import collect_garbage, enable_dedup
+from app.cache import jsonl_load_all, jsonl_save_entry, load_refcounts, rewrite_cache_values
+
+LYRICS = "Wise men say only fools rush in\nBut I can't help falling in love with you\n"
+
+
+class TestBlobStore(unittest.TestCase):
+    def test_identical_bodies_stored_once_and_collected(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'lyrics_cache.jsonl')
+            jsonl_save_entry(filename, 'Elvis Presley', "Can't Help Falling in Love", LYRICS,
+                             'lyrics')
+            jsonl_save_entry(filename, 'UB40', "Can't Help Falling in Love", LYRICS, 'lyrics')
+            jsonl_save_entry(filename, 'Pixies', 'Debaser', 'Lyrics not found.', 'lyrics')
+
+            stats = enable_dedup(tmpdir)
+            self.assertEqual(stats[filename], (3, 1))
+            with open(filename, 'r', encoding='utf-8') as f:
+                digests = {json.loads(line).get('lyrics_ref') for line in f}
+            digests.discard(None)
+            self.assertEqual(len(digests), 1)
+            digest = digests.pop()
+            self.assertEqual(load_refcounts(os.path.join(tmpdir, 'blobs')), {digest: 2})
+            cached = jsonl_load_all(filename, 'lyrics')
+            self.assertEqual(cached["UB40 - Can't Help Falling in Love"], LYRICS)
+
+            jsonl_save_entry(filename, 'Elvis Presley', "Can't Help Falling in Love",
+                             'Lyrics not found.', 'lyrics')
+            jsonl_save_entry(filename, 'UB40', "Can't Help Falling in Love", 'Lyrics not found.',
+                             'lyrics')
+            self.assertEqual(load_refcounts(os.path.join(tmpdir, 'blobs')), {})
+            self.assertEqual(collect_garbage(tmpdir)[:2], (0, 1))
+
+    def test_rewrite_moves_references_to_the_new_body(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'lyrics_cache.jsonl')
+            jsonl_save_entry(filename, 'Elvis Presley', "Can't Help Falling in Love", LYRICS,
+                             'lyrics')
+            jsonl_save_entry(filename, 'UB40', "Can't Help Falling in Love", LYRICS, 'lyrics')
+            enable_dedup(tmpdir)
+
+            fixed = LYRICS.replace("can't", "can’t")
+            self.assertEqual(rewrite_cache_values(filename, 'lyrics',
+                                                  lambda value: value.replace("'", "’")), 2)
+            with open(filename, 'r', encoding='utf-8') as f:
+                digests = {json.loads(line)['lyrics_ref'] for line in f}
+            self.assertEqual(load_refcounts(os.path.join(tmpdir, 'blobs')), {digests.pop(): 2})
+            cached = jsonl_load_all(filename, 'lyrics')
+            self.assertEqual(cached["UB40 - Can't Help Falling in Love"], fixed)
+            self.assertEqual(collect_garbage(tmpdir)[:2], (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest import mock
+import train_cache_dictionary
+from app.cache import (
+    jsonl_load_all, jsonl_load_entry, jsonl_load_view, jsonl_save_entry, rewrite_cache_values,
+    INDEX_SUFFIX, JOURNAL_SUFFIX, ZDICT_SUFFIX,
+)
+
+
+def _save_songs(filename, worker, count):
+    for i in range(count):
+        jsonl_save_entry(filename, f'Artist {worker}', f'Song {i}', f'Lyrics {worker}/{i}',
+                         'lyrics')
+
+
+class TestCacheView(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, 'lyrics_cache.jsonl')
+        with open(self.filename, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'artist': 'Pixies', 'title': 'Debaser',
+                                'lyrics': 'Got me a movie'}) + '\n')
+            f.write('not json\n')
+            f.write(json.dumps({'artist': 'Oasis', 'title': 'Wonderwall',
+                                'lyrics': 'Today is gonna be… the day'}, ensure_ascii=False) + '\n')
+            f.write(json.dumps({'artist': 'Pixies', 'title': 'Debaser',
+                                'lyrics': 'I want you to know'}) + '\n')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_view_matches_load_all(self):
+        with jsonl_load_view(self.filename, 'lyrics') as view:
+            self.assertEqual(dict(view), jsonl_load_all(self.filename, 'lyrics'))
+            self.assertIn('Oasis - Wonderwall', view)
+            self.assertNotIn('Oasis - Supersonic', view)
+        self.assertTrue(os.path.exists(self.filename + INDEX_SUFFIX))
+
+    def test_index_rebuilt_when_cache_changes(self):
+        with jsonl_load_view(self.filename, 'lyrics') as view:
+            self.assertEqual(len(view), 2)
+        with open(self.filename, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'artist': 'Blur', 'title': 'Tender',
+                                'lyrics': 'Tender is the night'}) + '\n')
+        with jsonl_load_view(self.filename, 'lyrics') as view:
+            self.assertEqual(view['Blur - Tender'], 'Tender is the night')
+
+    def test_missing_file_is_empty(self):
+        with jsonl_load_view(os.path.join(self.tmpdir.name, 'missing.jsonl'), 'lyrics') as view:
+            self.assertEqual(len(view), 0)
+
+
+class TestConcurrentWrites(unittest.TestCase):
+    def test_processes_do_not_clobber_each_other(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'lyrics_cache.jsonl')
+            workers = [multiprocessing.Process(target=_save_songs, args=(filename, w, 10))
+                       for w in range(4)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            cache = jsonl_load_all(filename, 'lyrics')
+            self.assertEqual(len(cache), 40)
+            self.assertEqual(cache['Artist 3 - Song 9'], 'Lyrics 3/9')
+            self.assertFalse(os.path.exists(filename + JOURNAL_SUFFIX))
+
+    def test_interrupted_write_is_replayed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'lyrics_cache.jsonl')
+            jsonl_save_entry(filename, 'Pixies', 'Debaser', 'Lyrics not found.', 'lyrics')
+            with open(filename + JOURNAL_SUFFIX, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'artist': 'Pixies', 'title': 'Debaser', 'field': 'lyrics',
+                                    'lyrics': 'Got me a movie'}) + '\n')
+                f.write('{"artist": "Blur", "tit')
+            self.assertEqual(jsonl_load_entry(filename, 'Pixies', 'Debaser', 'lyrics'),
+                             'Got me a movie')
+            self.assertFalse(os.path.exists(filename + JOURNAL_SUFFIX))
+            self.assertEqual(len(jsonl_load_all(filename, 'lyrics')), 1)
+
+
+class TestCompressedCache(unittest.TestCase):
+    def test_values_round_trip_through_dictionary(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'chords_cache.jsonl')
+            with open(filename + ZDICT_SUFFIX, 'wb') as f:
+                f.write(b'{t:\n{st:\n[G] [C] [D] [Em]\n')
+            chords = ('{t:Wonderwall}\n{st:Oasis}\n'
+                      + '[Em7]Today is [G]gonna be the [Dsus4]day\n' * 4)
+            jsonl_save_entry(filename, 'Oasis', 'Wonderwall', chords, 'chords')
+            jsonl_save_entry(filename, 'Pixies', 'Debaser', 'Chords not found.', 'chords')
+            with open(filename, 'r', encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f]
+            self.assertIn('chords_z', entries[0])
+            self.assertNotIn('chords', entries[0])
+            self.assertEqual(entries[1]['chords'], 'Chords not found.')
+            self.assertEqual(jsonl_load_entry(filename, 'Oasis', 'Wonderwall', 'chords'), chords)
+            with jsonl_load_view(filename, 'chords') as view:
+                self.assertEqual(view['Oasis - Wonderwall'], chords)
+
+    def test_retraining_keeps_old_records_readable(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'chords_cache.jsonl')
+            with open(filename + ZDICT_SUFFIX, 'wb') as f:
+                f.write(b'{t:\n{st:\n[G] [C] [D] [Em]\n')
+            chords = ('{t:Wonderwall}\n{st:Oasis}\n'
+                      + '[Em7]Today is [G]gonna be the [Dsus4]day\n' * 4)
+            jsonl_save_entry(filename, 'Oasis', 'Wonderwall', chords, 'chords')
+            with open(filename, 'r', encoding='utf-8') as f:
+                old_line = f.read()
+
+            # A crash before the cache is swapped leaves it readable with its old dictionary
+            with mock.patch.object(train_cache_dictionary, 'atomic_write_lines',
+                                   side_effect=OSError("crash")):
+                with self.assertRaises(OSError):
+                    train_cache_dictionary.apply_dictionary(filename, 'chords',
+                                                            b'[Em7]Today is [G]gonna be\n')
+            self.assertEqual(jsonl_load_entry(filename, 'Oasis', 'Wonderwall', 'chords'), chords)
+
+            train_cache_dictionary.apply_dictionary(filename, 'chords',
+                                                    b'[Em7]Today is [G]gonna be\n')
+            self.assertEqual(jsonl_load_entry(filename, 'Oasis', 'Wonderwall', 'chords'), chords)
+            # A record still stamped with the old dictionary (a reader's stale copy) decodes too
+            with open(filename, 'w', encoding='utf-8') as f:
+                f.write(old_line)
+            self.assertEqual(jsonl_load_all(filename, 'chords')['Oasis - Wonderwall'], chords)
+
+    def test_rewrite_keeps_values_compressed_with_their_dictionary(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'chords_cache.jsonl')
+            with open(filename + ZDICT_SUFFIX, 'wb') as f:
+                f.write(b'{t:\n{st:\n[G] [C] [D] [Em]\n')
+            chords = '[ch]Em7[/ch] Today is [ch]G[/ch] gonna be the day\n' * 4
+            jsonl_save_entry(filename, 'Oasis', 'Wonderwall', chords, 'chords')
+            with open(filename, 'r', encoding='utf-8') as f:
+                dict_id = json.loads(f.readline())['zdict']
+
+            self.assertEqual(rewrite_cache_values(filename, 'chords',
+                                                  lambda value: value.replace('[ch]', '')), 1)
+            with open(filename, 'r', encoding='utf-8') as f:
+                entry = json.loads(f.readline())
+            self.assertEqual((entry['zdict'], 'chords' in entry), (dict_id, False))
+            self.assertEqual(jsonl_load_entry(filename, 'Oasis', 'Wonderwall', 'chords'),
+                             chords.replace('[ch]', ''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from app.blob_store import enable_dedup
+from app.cache import jsonl_load_all, jsonl_save_entry, load_refcounts
+from app.cache_gc import DUPLICATE, EXPIRED, ORPHAN, UNREADABLE, collect_cache
+
+LYRICS = "Wise men say only fools rush in\nBut I can't help falling in love with you\n"
+DEBASER = "Got me a movie, I want you to know\nSlicing up eyeballs, I want you to know\n"
+
+
+class TestCacheGc(unittest.TestCase):
+    def test_compacts_to_live_songs_and_archives_evictions(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'lyrics_cache.jsonl')
+            jsonl_save_entry(filename, 'Elvis Presley', "Can't Help Falling in Love", LYRICS,
+                             'lyrics')
+            jsonl_save_entry(filename, 'Pixies', 'Debaser', DEBASER, 'lyrics')
+            jsonl_save_entry(filename, 'Oasis', 'Wonderwall', 'Lyrics not found.', 'lyrics')
+            jsonl_save_entry(filename, 'Blur', 'Song 2', 'Lyrics not found.', 'lyrics')
+            enable_dedup(tmpdir)
+            with open(filename, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'artist': 'Blur', 'title': 'Song 2', 'lyrics': 'Woo-hoo',
+                                    'updated': 0}) + '\n')
+                f.write('{"artist": "torn\n')
+            with open(filename, 'r', encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f if line.startswith('{"artist": "O')]
+            now = entries[0]['updated'] + 2 * 86400
+
+            songs = [{'Artist': 'Elvis Presley', 'Title': "Can't Help Falling in Love"},
+                     {'Artist': 'Oasis', 'Title': 'Wonderwall'},
+                     {'Artist': 'Blur', 'Title': 'Song 2'}]
+            results, blobs = collect_cache(tmpdir, songs, max_negative_age=86400, now=now)
+
+            stats = results[filename]
+            self.assertEqual(stats['evicted'], {DUPLICATE: 1, ORPHAN: 1, EXPIRED: 1, UNREADABLE: 1})
+            self.assertLess(stats['bytes_after'], stats['bytes_before'])
+            self.assertEqual(jsonl_load_all(filename, 'lyrics'), {
+                "Elvis Presley - Can't Help Falling in Love": LYRICS, 'Blur - Song 2': 'Woo-hoo'})
+            self.assertEqual(blobs[1], 1)
+            self.assertEqual(len(load_refcounts(os.path.join(tmpdir, 'blobs'))), 1)
+
+            with open(stats['archive'], 'r', encoding='utf-8') as f:
+                archived = [json.loads(line) for line in f]
+            self.assertEqual(len(archived), 4)
+            orphan = next(record for record in archived if record['evicted'] == ORPHAN)
+            self.assertEqual(orphan['lyrics'], DEBASER)
+
+    def test_without_retention_keeps_negative_entries(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'chords_cache.jsonl')
+            jsonl_save_entry(filename, 'Oasis', 'Wonderwall', 'Chords not found.', 'chords')
+            results, _ = collect_cache(tmpdir, [{'Artist': 'Oasis', 'Title': 'Wonderwall'}],
+                                       now=int(time.time()) + 365 * 86400)
+            self.assertEqual(results[filename]['kept'], 1)
+            self.assertIsNone(results[filename]['archive'])
+
+    def test_refuses_empty_song_list(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with self.assertRaises(ValueError):
+                collect_cache(tmpdir, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
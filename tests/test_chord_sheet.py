@@ -0,0 +1,53 @@
+import unittest
+from app.chord_sheet import ChordSheet, ChordTable, ChordTransform, transform_sheets
+
+SHEET = ("Intro: G Em\nG       Em\nWhen the night has come\n[C]And the land is [D7]dark\n"
+         "Dsus4 D/F# G")
+
+
+class TestChordSheet(unittest.TestCase):
+    def test_parse_and_render_round_trip(self):
+        table = ChordTable()
+        sheet = ChordSheet.parse(SHEET, table)
+        self.assertEqual('\n'.join(sheet.render(table=table)), SHEET)
+        self.assertEqual([table.symbols[i] for i in sheet.chord_ids],
+                         ['G', 'Em', 'G', 'Em', 'C', 'D7', 'Dsus4', 'D/F#', 'G'])
+
+    def test_transpose_capo_and_simplify(self):
+        table = ChordTable()
+        sheets = [ChordSheet.parse(SHEET, table), ChordSheet.parse("[Bb]Hey [F#m7]Jude", table)]
+        up, down = transform_sheets(sheets, ChordTransform(2), table)
+        self.assertEqual(up[0], 'Intro: A F#m')
+        self.assertEqual(up[1], 'A       F#m')
+        self.assertEqual(up[3], '[D]And the land is [E7]dark')
+        self.assertEqual(up[4], 'Esus4 E/G# A')
+        self.assertEqual(down, ['[C]Hey [Abm7]Jude'])
+
+        capo, _ = transform_sheets(sheets, ChordTransform(-2, simplify=True), table)
+        self.assertEqual(capo[0], 'Intro: F Dm')
+        self.assertEqual(capo[3], '[Bb]And the land is [C]dark')
+        self.assertEqual(capo[4], 'C     C    F')
+
+    def test_labelled_and_marked_chord_lines(self):
+        table = ChordTable()
+        text = "Intro: G Em\nChorus: [C] G\nEm7* D/G C\nFMaj7  G (x2)\nLet it be (x2)"
+        sheet = ChordSheet.parse(text, table)
+        self.assertEqual('\n'.join(sheet.render(table=table)), text)
+        self.assertEqual(transform_sheets([sheet], ChordTransform(2), table)[0], [
+            'Intro: A F#m', 'Chorus: [D] A', 'F#m7* E/A D', 'GMaj7  A (x2)', 'Let it be (x2)'])
+
+    def test_spelling_follows_target_key(self):
+        table = ChordTable()
+        sheets = [ChordSheet.parse("G Em C/E", table)]
+        self.assertEqual(transform_sheets(sheets, ChordTransform(1), table)[0], ['Ab Fm Db/F'])
+        sheets = [ChordSheet.parse("C Am E/G#", table)]
+        self.assertEqual(transform_sheets(sheets, ChordTransform(2), table)[0], ['D Bm F#/A#'])
+
+    def test_longer_chord_names_keep_their_spacing(self):
+        table = ChordTable()
+        sheet = ChordSheet.parse("E F G", table)
+        self.assertEqual(sheet.render(table.mapping(ChordTransform(1)), table), ['F F# Ab'])
+
+
+if __name__ == '__main__':
+    unittest.main()
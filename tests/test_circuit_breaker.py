@@ -0,0 +1,73 @@
+import tempfile
+import unittest
+from unittest import mock
+from app.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from app.fetch_data import get_chords_from_chordie
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_consecutive_failures_and_recovers_after_probe(self):
+        breaker = CircuitBreaker('Ultimate Guitar', failure_threshold=3, cooldown=60)
+        with mock.patch('app.circuit_breaker.time.monotonic', return_value=1000.0) as clock:
+            for _ in range(3):
+                self.assertTrue(breaker.allow())
+                breaker.record_failure()
+            self.assertEqual(breaker.state, OPEN)
+            self.assertTrue(breaker.is_open())
+            self.assertFalse(breaker.allow())
+
+            clock.return_value = 1061.0
+            self.assertFalse(breaker.is_open())
+            self.assertTrue(breaker.allow())
+            self.assertEqual(breaker.state, HALF_OPEN)
+            self.assertFalse(breaker.allow())
+            breaker.record_success()
+            self.assertEqual(breaker.state, CLOSED)
+            self.assertTrue(breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker('Songsterr', failure_threshold=1, cooldown=60)
+        with mock.patch('app.circuit_breaker.time.monotonic', return_value=0.0) as clock:
+            breaker.record_failure()
+            clock.return_value = 61.0
+            self.assertTrue(breaker.allow())
+            breaker.record_failure()
+            self.assertEqual(breaker.state, OPEN)
+            self.assertTrue(breaker.is_open())
+            self.assertEqual(breaker.times_opened, 2)
+
+    def test_inconclusive_probe_reopens_with_fresh_cooldown(self):
+        breaker = CircuitBreaker('E-Chords', failure_threshold=1, cooldown=60)
+        with mock.patch('app.circuit_breaker.time.monotonic', return_value=0.0) as clock:
+            breaker.record_failure()
+            clock.return_value = 61.0
+            self.assertTrue(breaker.allow())
+            breaker.record_inconclusive()
+            self.assertEqual(breaker.state, OPEN)
+            self.assertEqual(breaker.times_opened, 1)
+            self.assertFalse(breaker.allow())
+            clock.return_value = 122.0
+            self.assertTrue(breaker.allow())
+            breaker.record_success()
+            self.assertEqual(breaker.state, CLOSED)
+
+    def test_opens_on_error_rate(self):
+        breaker = CircuitBreaker('Chordie', failure_threshold=100, error_rate=0.5, window=10,
+                                 min_calls=10)
+        for _ in range(5):
+            breaker.record_success()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_skipped_chordie_request_does_not_fall_back(self):
+        with tempfile.TemporaryDirectory() as tmpdir, mock.patch('app.cache.CACHE_DIR', tmpdir), \
+                mock.patch('app.fetch_data._http_get',
+                           side_effect=CircuitOpenError("Chordie is being skipped")), \
+                mock.patch('app.fetch_data.get_chords_from_ultimate_guitar') as fallback, \
+                self.assertNoLogs('app.fetch_data', level='ERROR'):
+            self.assertEqual(get_chords_from_chordie('Debaser', 'Pixies'), "Chords not found.")
+        fallback.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
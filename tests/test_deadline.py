@@ -0,0 +1,42 @@
+import time
+import unittest
+from unittest import mock
+from app.deadline import BudgetExceeded, budget_spent, capped_timeout, remaining_time, time_budget
+from app.fetch_data import get_lyrics_from_sources, skipped_sources
+
+
+class TestDeadline(unittest.TestCase):
+    def test_no_budget_leaves_timeouts_alone(self):
+        self.assertIsNone(remaining_time())
+        self.assertFalse(budget_spent())
+        self.assertEqual(capped_timeout(10), 10)
+
+    def test_nested_budgets_end_at_the_earliest_deadline(self):
+        with mock.patch('app.deadline.time.monotonic', return_value=100.0) as clock:
+            with time_budget(60):
+                with time_budget(5):
+                    self.assertEqual(capped_timeout(10), 5)
+                    clock.return_value = 106.0
+                    self.assertTrue(budget_spent())
+                    with self.assertRaises(BudgetExceeded):
+                        capped_timeout(10)
+                self.assertFalse(budget_spent())
+                self.assertEqual(capped_timeout(10), 10)
+                self.assertEqual(capped_timeout(None), 54)
+            self.assertIsNone(remaining_time())
+
+    def test_budget_spent_in_the_last_attempt_is_not_a_final_miss(self):
+        def slow_source(title, artist):
+            time.sleep(0.05)
+            return "Lyrics not found."
+
+        with mock.patch('app.fetch_data.lyrics_sources', return_value=[('Slow', slow_source)]):
+            with time_budget(0.01):
+                lyrics, source, tried_log = get_lyrics_from_sources('Debaser', 'Pixies',
+                                                                    queries=[('Pixies', 'Debaser')])
+        self.assertEqual((lyrics, source), ("Lyrics not found.", None))
+        self.assertTrue(skipped_sources(tried_log))
+
+
+if __name__ == '__main__':
+    unittest.main()
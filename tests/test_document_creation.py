@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app.cache import content_digest
+from app.document_creation import create_document_from_cache, new_prepared_memo
+
+SONGS = [{'Artist': 'Pixies', 'Title': 'Debaser'}, {'Artist': 'Oasis', 'Title': 'Wonderwall'}]
+LYRICS = {'Pixies - Debaser': 'Got me a movie', 'Oasis - Wonderwall': 'Today is gonna be the day'}
+
+
+class BrokenCache(dict):
+    def get(self, key, default=None):
+        raise OSError("cache read failed")
+
+
+class TestCreateDocumentFromCache(unittest.TestCase):
+    def test_memo_is_opt_in(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'Lyrics_Document.html')
+            create_document_from_cache(SONGS, LYRICS, {}, lyrics_output=path)
+            with open(path, 'r', encoding='utf-8') as f:
+                self.assertEqual(f.read().count('<section>'), 2)
+
+            memo = new_prepared_memo()
+            create_document_from_cache(SONGS, LYRICS, {}, lyrics_output=path, memo=memo)
+            self.assertEqual(set(memo['lyrics']),
+                             {content_digest(lyrics) for lyrics in LYRICS.values()})
+
+    def test_shared_bodies_are_cleaned_once_per_build(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'Lyrics_Document.html')
+            covers = [{'Artist': 'Elvis Presley', 'Title': "Can't Help Falling in Love"},
+                      {'Artist': 'UB40', 'Title': "Can't Help Falling in Love"}]
+            lyrics = {f"{song['Artist']} - {song['Title']}": 'Wise men say' for song in covers}
+            with mock.patch('app.document_creation.clean_lyrics',
+                            side_effect=lambda text: text) as clean:
+                create_document_from_cache(covers, lyrics, {}, lyrics_output=path)
+            self.assertEqual(clean.call_count, 1)
+
+    def test_failed_build_keeps_the_previous_book(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'Chords_Document.html')
+            create_document_from_cache(SONGS, {}, {'Pixies - Debaser': 'D A'}, chords_output=path)
+            with open(path, 'r', encoding='utf-8') as f:
+                previous = f.read()
+            with self.assertRaises(OSError):
+                create_document_from_cache(SONGS, {}, BrokenCache(), chords_output=path)
+            with open(path, 'r', encoding='utf-8') as f:
+                self.assertEqual(f.read(), previous)
+            self.assertEqual(os.listdir(tmpdir), ['Chords_Document.html'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from app.cache import jsonl_load_all
+from app.deadline import remaining_time, time_budget
+from app.document_generation import cache_songs
+from app.run_journal import RunJournal
+
+SONGS = [{'Artist': 'Pixies', 'Title': 'Debaser'}, {'Artist': 'Oasis', 'Title': 'Wonderwall'}]
+
+
+class TestCacheSongs(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        patcher = mock.patch('app.cache.CACHE_DIR', self.tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def test_pipelines_run_side_by_side_under_the_run_budget(self):
+        threads = {}
+        budgets = []
+
+        def fake_fetch(kind, value, title, artist):
+            threads.setdefault(kind, set()).add(threading.current_thread().name)
+            budgets.append(remaining_time())
+            return value, 'Fake', [f"Fake ({artist} – {title})"]
+
+        journal = RunJournal(os.path.join(self.tmpdir.name, 'run_journal.jsonl'))
+
+        def fake_lyrics(title, artist, *args):
+            return fake_fetch('lyrics', 'La la la', title, artist)
+
+        def fake_chords(title, artist, *args):
+            return fake_fetch('chords', 'G C D', title, artist)
+
+        with mock.patch('app.document_generation.get_lyrics_from_sources', fake_lyrics), \
+                mock.patch('app.document_generation.get_chords_from_sources', fake_chords), \
+                time_budget(60):
+            cache_songs(SONGS, journal=journal)
+        journal.close()
+
+        self.assertEqual(threads, {'lyrics': {'cache-lyrics'}, 'chords': {'cache-chords'}})
+        self.assertTrue(all(budget is not None and budget > 0 for budget in budgets))
+        lyrics_path = os.path.join(self.tmpdir.name, 'lyrics_cache.jsonl')
+        chords_path = os.path.join(self.tmpdir.name, 'chords_cache.jsonl')
+        self.assertEqual(jsonl_load_all(lyrics_path, 'lyrics'),
+                         {'Pixies - Debaser': 'La la la', 'Oasis - Wonderwall': 'La la la'})
+        self.assertEqual(len(jsonl_load_all(chords_path, 'chords')), 2)
+        resumed = RunJournal(os.path.join(self.tmpdir.name, 'run_journal.jsonl'), resume=True)
+        self.assertIs(resumed.song_status('lyrics', 'Oasis', 'Wonderwall'), True)
+        self.assertIs(resumed.song_status('chords', 'Pixies', 'Debaser'), True)
+        resumed.close()
+
+    def test_pipeline_error_is_reraised(self):
+        def fail(*args):
+            raise RuntimeError("chords pipeline broke")
+
+        with mock.patch('app.document_generation.get_lyrics_from_sources',
+                        lambda *args: ('La', 'Fake', [])), \
+                mock.patch('app.document_generation.get_chords_from_sources', fail):
+            with self.assertRaisesRegex(RuntimeError, "chords pipeline broke"):
+                cache_songs(SONGS)
+        lyrics_path = os.path.join(self.tmpdir.name, 'lyrics_cache.jsonl')
+        self.assertEqual(len(jsonl_load_all(lyrics_path, 'lyrics')), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
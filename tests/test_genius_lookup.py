@@ -0,0 +1,145 @@
+import os
+import tempfile
+import threading
+import unittest
+from collections import Counter
+from unittest import mock
+from app.deadline import time_budget
+from app.genius_lookup import GeniusLookup
+
+
+def _result(song_id, title, artist, artist_id=1):
+    return {'id': song_id, 'url': f"https://genius.com/{song_id}", 'title': title,
+            'lyrics_state': 'complete', 'primary_artist': {'id': artist_id, 'name': artist}}
+
+
+class FakeGenius:
+    def __init__(self):
+        self.calls = Counter()
+        self.catalog = [_result(1, 'Wonderwall', 'Oasis'),
+                        _result(2, "Don't Look Back in Anger", 'Oasis'),
+                        _result(3, 'Champagne Supernova', 'Oasis')]
+
+    def search_songs(self, search_term):
+        self.calls['search'] += 1
+        return {'hits': [{'type': 'song', 'result': result} for result in self.catalog
+                         if result['title'].lower() in search_term.lower()]}
+
+    def artist_songs(self, artist_id, per_page=None, page=None, sort='title'):
+        self.calls['artist'] += 1
+        return {'songs': self.catalog, 'next_page': None}
+
+    def lyrics(self, song_url=None):
+        self.calls['lyrics'] += 1
+        return f"Lyrics of {song_url}"
+
+
+class TestGeniusLookup(unittest.TestCase):
+    def test_variants_share_one_search_and_fetch(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = FakeGenius()
+            lookup = GeniusLookup(client, os.path.join(tmpdir, 'genius_cache.jsonl'))
+            variants = [('The Oasis', 'Wonderwall!'), ('Oasis', 'Wonderwall'),
+                        ('Oasis', 'Wonderwall')]
+            for artist, title in variants:
+                self.assertEqual(lookup.lyrics(title, artist), "Lyrics of https://genius.com/1")
+            self.assertIsNone(lookup.lyrics('Imagine', 'John Lennon'))
+            self.assertIsNone(lookup.lyrics('Imagine!', 'John Lennon'))
+            self.assertEqual(client.calls, {'search': 2, 'lyrics': 1})
+
+    def test_known_ids_skip_search_in_later_runs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_path = os.path.join(tmpdir, 'genius_cache.jsonl')
+            GeniusLookup(FakeGenius(), cache_path).lyrics('Wonderwall', 'Oasis')
+            client = FakeGenius()
+            self.assertEqual(GeniusLookup(client, cache_path).lyrics('Wonderwall', 'Oasis'),
+                             "Lyrics of https://genius.com/1")
+            self.assertEqual(client.calls, {'lyrics': 1})
+
+    def test_artist_with_many_songs_resolved_from_catalog(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = FakeGenius()
+            lookup = GeniusLookup(client, os.path.join(tmpdir, 'genius_cache.jsonl'))
+            lookup.expect([{'Artist': 'Oasis', 'Title': result['title']}
+                           for result in client.catalog])
+            for result in client.catalog:
+                self.assertEqual(lookup.resolve(result['title'], 'Oasis')['id'], result['id'])
+            self.assertEqual(client.calls, {'search': 1, 'artist': 1})
+
+    def test_failed_catalog_lookup_keeps_the_hit_and_stops_batching(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = FakeGenius()
+
+            def artist_songs(*args, **kwargs):
+                client.calls['artist'] += 1
+                raise RuntimeError("429 Too Many Requests")
+
+            client.artist_songs = artist_songs
+            lookup = GeniusLookup(client, os.path.join(tmpdir, 'genius_cache.jsonl'))
+            lookup.expect([{'Artist': 'Oasis', 'Title': result['title']}
+                           for result in client.catalog])
+            for result in client.catalog:
+                self.assertEqual(lookup.lyrics(result['title'], 'Oasis'),
+                                 f"Lyrics of https://genius.com/{result['id']}")
+            self.assertEqual(client.calls, {'search': 3, 'artist': 1, 'lyrics': 3})
+
+    def test_credited_artist_fallback(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = FakeGenius()
+            client.catalog.append(_result(4, 'Under Pressure', 'Queen', artist_id=2))
+            lookup = GeniusLookup(client, os.path.join(tmpdir, 'genius_cache.jsonl'))
+            self.assertEqual(lookup.resolve('Under Pressure', 'Queen & David Bowie')['id'], 4)
+            self.assertIsNone(lookup.resolve('Under Pressure', 'Vanilla Ice'))
+
+    def test_expect_adds_to_batched_artists(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            lookup = GeniusLookup(FakeGenius(), os.path.join(tmpdir, 'genius_cache.jsonl'))
+            lookup.expect([{'Artist': 'Oasis', 'Title': title} for title in 'ABC'])
+            lookup.expect([{'Artist': 'Blur', 'Title': title} for title in 'ABC'])
+            self.assertEqual(lookup.batch_artists, {'oasis', 'blur'})
+
+    def test_client_requests_are_capped_by_the_time_budget(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = FakeGenius()
+            client.timeout = 5
+            timeouts = []
+            client._session = mock.Mock()
+            client._session.request = lambda method, url, **kw: timeouts.append(kw['timeout'])
+            client.search_songs = lambda term: client._session.request('GET', term, timeout=5) or {}
+            lookup = GeniusLookup(client, os.path.join(tmpdir, 'genius_cache.jsonl'))
+            lookup.resolve('Wonderwall', 'Oasis')
+            with time_budget(1):
+                lookup.resolve('Supersonic', 'Oasis')
+            self.assertEqual(timeouts[0], 5)
+            self.assertLessEqual(timeouts[1], 1)
+
+    def test_cached_songs_resolve_while_another_song_is_searched(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            client = FakeGenius()
+            lookup = GeniusLookup(client, os.path.join(tmpdir, 'genius_cache.jsonl'))
+            lookup.lyrics('Wonderwall', 'Oasis')
+            searching, release = threading.Event(), threading.Event()
+            search_songs = client.search_songs
+
+            def slow_search(search_term):
+                searching.set()
+                release.wait(5)
+                return search_songs(search_term)
+
+            client.search_songs = slow_search
+            thread = threading.Thread(target=lookup.resolve, args=('Champagne Supernova', 'Oasis'))
+            thread.start()
+            self.assertTrue(searching.wait(5))
+            resolved = []
+            reader = threading.Thread(
+                target=lambda: resolved.append(lookup.lyrics('Wonderwall', 'Oasis')))
+            reader.start()
+            reader.join(1)
+            release.set()
+            thread.join(5)
+            self.assertEqual(resolved, ["Lyrics of https://genius.com/1"])
+            self.assertEqual(lookup.resolve('Champagne Supernova', 'Oasis')['id'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
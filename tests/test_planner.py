@@ -0,0 +1,51 @@
+import tempfile
+import unittest
+from unittest import mock
+from app.cache import jsonl_save_entry, lyrics_cache_path
+from app.fetch_data import lyrics_queries
+from app.genius_lookup import genius_cache_path
+from app.planner import SOURCE_REQUESTS, plan_kind, plan_run
+
+SONGS = [{'Artist': 'Pixies', 'Title': 'Debaser'}, {'Artist': 'Blur', 'Title': 'Song 2'},
+         {'Artist': 'Oasis', 'Title': 'Wonderwall'}]
+LYRICS_SOURCES = ('Genius', 'Lyrics.ovh', 'AZLyrics', 'Manual')
+
+
+class TestPlanner(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        patcher = mock.patch('app.cache.CACHE_DIR', self.tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        jsonl_save_entry(lyrics_cache_path(), 'Pixies', 'Debaser', 'Got me a movie', 'lyrics')
+        jsonl_save_entry(lyrics_cache_path(), 'Blur', 'Song 2', 'Lyrics not found.', 'lyrics')
+
+    def _variant_requests(self, song):
+        variants = len(lyrics_queries(song['Artist'], song['Title']))
+        return sum(SOURCE_REQUESTS[name].get('Lyrics.ovh', 0) for name in LYRICS_SOURCES) * variants
+
+    def test_counts_and_worst_case_requests(self):
+        plan = plan_kind(SONGS, 'lyrics', {})
+        self.assertEqual(plan['counts'], {'cached': 1, 'negative': 1, 'missing': 1})
+        self.assertEqual(plan['to_fetch'], 2)
+        self.assertEqual(plan['hit_rate'], 0.5)
+        self.assertEqual(plan['worst_requests']['Genius'], 4)
+        self.assertEqual(plan['worst_requests']['Lyrics.ovh'],
+                         sum(self._variant_requests(song) for song in SONGS[1:]))
+
+    def test_known_genius_ids_skip_the_search(self):
+        jsonl_save_entry(genius_cache_path(), 'oasis', 'wonderwall',
+                         {'id': 1, 'url': 'https://genius.com/1', 'query_artist': 'Oasis',
+                          'query_title': 'Wonderwall'}, 'genius')
+        self.assertEqual(plan_kind(SONGS, 'lyrics', {})['worst_requests']['Genius'], 3)
+
+    def test_pipelines_overlap_and_budgets_cap(self):
+        plan = plan_run(SONGS, rates={'Lyrics.ovh': 0.0, 'AZLyrics': 0.0})
+        self.assertEqual(plan['worst_seconds'],
+                         max(kind['worst_seconds'] for kind in plan['plans']))
+        self.assertEqual(plan_run(SONGS, run_budget=1.0)['worst_seconds'], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
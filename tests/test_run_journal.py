@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app.run_journal import RunJournal
+
+
+class TestRunJournal(unittest.TestCase):
+    def test_resume_skips_completed_work(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'run_journal.jsonl')
+            journal = RunJournal(path)
+            journal.record_attempt('lyrics', 'Pixies', 'Debaser', 'Genius (Pixies – Debaser)')
+            journal.record_song('lyrics', 'Pixies', 'Debaser', False)
+            journal.record_attempt('chords', 'Pixies', 'Debaser', 'Chordie (Pixies – Debaser)')
+            # Simulate a crash: no finish(), a torn final line, and the dead run's lock released
+            journal._file.write('{"event": "attempt", "kind"')
+            journal._file.close()
+            journal._run_lock.close()
+
+            resumed = RunJournal(path, resume=True)
+            self.assertIs(resumed.song_status('lyrics', 'Pixies', 'Debaser'), False)
+            self.assertIsNone(resumed.song_status('chords', 'Pixies', 'Debaser'))
+            self.assertTrue(resumed.attempt_done('chords', 'Pixies', 'Debaser',
+                                                 'Chordie (Pixies – Debaser)'))
+            self.assertFalse(resumed.attempt_done('chords', 'Pixies', 'Debaser',
+                                                  'E-Chords (Pixies – Debaser)'))
+            resumed.close()
+
+            fresh = RunJournal(path)
+            self.assertIsNone(fresh.song_status('lyrics', 'Pixies', 'Debaser'))
+            fresh.close()
+
+    def test_resume_ignores_progress_outside_window(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'run_journal.jsonl')
+            journal = RunJournal(path)
+            journal.record_song('lyrics', 'Pixies', 'Debaser', True)
+            journal.close()
+            resumed = RunJournal(path, resume=True, window=-1)
+            self.assertIsNone(resumed.song_status('lyrics', 'Pixies', 'Debaser'))
+            resumed.close()
+
+    def test_concurrent_runs_keep_separate_journals(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'run_journal.jsonl')
+            with mock.patch('os.getpid', return_value=100):
+                interrupted = RunJournal(path)
+            interrupted.record_song('lyrics', 'Pixies', 'Debaser', True)
+            with mock.patch('os.getpid', return_value=200):
+                other = RunJournal(path)
+            other.record_song('lyrics', 'Oasis', 'Wonderwall', True)
+            other.finish()
+            other.close()
+            interrupted.close()
+
+            resumed = RunJournal(path, resume=True)
+            self.assertEqual(resumed.path, os.path.join(tmpdir, 'run_journal.100.jsonl'))
+            self.assertIs(resumed.song_status('lyrics', 'Pixies', 'Debaser'), True)
+            self.assertIsNone(resumed.song_status('lyrics', 'Oasis', 'Wonderwall'))
+            resumed.close()
+
+    def test_resume_skips_journals_of_live_runs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'run_journal.jsonl')
+            live = RunJournal(path)
+            live.record_song('lyrics', 'Pixies', 'Debaser', True)
+            resumed = RunJournal(path, resume=True)
+            self.assertNotEqual(resumed.path, live.path)
+            self.assertIsNone(resumed.song_status('lyrics', 'Pixies', 'Debaser'))
+            resumed.close()
+            live.close()
+
+    def test_reused_pid_does_not_truncate_a_journal(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'run_journal.jsonl')
+            with mock.patch('os.getpid', return_value=100):
+                first = RunJournal(path)
+                first.record_song('lyrics', 'Pixies', 'Debaser', True)
+                first.close()
+                second = RunJournal(path)
+            second.close()
+            self.assertEqual(second.path, os.path.join(tmpdir, 'run_journal.100.1.jsonl'))
+            with open(first.path, 'r', encoding='utf-8') as f:
+                self.assertIn('"Debaser"', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
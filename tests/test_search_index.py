@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from app.cache import SEARCH_DELTA_SUFFIX, atomic_write_lines, jsonl_save_entry
+from app.search_index import build_search_index, load_search_index, search_songs
+from app.text_cleaning import extract_chord_symbols
+
+
+class TestSearchIndex(unittest.TestCase):
+    def test_phrase_search_is_updated_on_cache_writes(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'lyrics_cache.jsonl')
+            jsonl_save_entry(filename, 'John Denver', 'Country Roads',
+                             "Country roads, take me home\nTo the place I belong", 'lyrics')
+            build_search_index(filename, 'lyrics')
+            jsonl_save_entry(filename, 'Oasis', 'Wonderwall',
+                             "Today is gonna be the day\nThat they're gonna throw it back to you",
+                             'lyrics')
+            self.assertTrue(os.path.exists(filename + SEARCH_DELTA_SUFFIX))
+
+            index = load_search_index(filename, 'lyrics')
+            self.assertEqual(search_songs(index, phrase='Take me HOME'),
+                             [('John Denver', 'Country Roads')])
+            self.assertEqual(search_songs(index, phrase="they're gonna throw"),
+                             [('Oasis', 'Wonderwall')])
+            self.assertEqual(search_songs(index, phrase='home take me'), [])
+
+            jsonl_save_entry(filename, 'Oasis', 'Wonderwall', 'Lyrics not found.', 'lyrics')
+            index = load_search_index(filename, 'lyrics')
+            self.assertEqual(search_songs(index, phrase='gonna'), [])
+
+    def test_index_rebuilt_after_outside_rewrite(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'lyrics_cache.jsonl')
+            jsonl_save_entry(filename, 'Pixies', 'Debaser', 'Got me a movie, I want you to know',
+                             'lyrics')
+            build_search_index(filename, 'lyrics')
+            atomic_write_lines(filename, ['{"artist": "Pixies", "title": "Debaser", '
+                                          '"lyrics": "Slicing up eyeballs"}\n'])
+            jsonl_save_entry(filename, 'Pixies', 'Hey', 'Hey, been trying to meet you', 'lyrics')
+
+            index = load_search_index(filename, 'lyrics')
+            self.assertEqual(search_songs(index, phrase='slicing up'), [('Pixies', 'Debaser')])
+            self.assertEqual(search_songs(index, phrase='movie'), [])
+            self.assertEqual(search_songs(index, phrase='meet you'), [('Pixies', 'Hey')])
+
+    def test_chord_subset_search(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'chords_cache.jsonl')
+            jsonl_save_entry(filename, 'Ben E. King', 'Stand By Me',
+                             "G Em\nWhen the night\nC D G\nhas come", 'chords')
+            jsonl_save_entry(filename, 'Oasis', 'Wonderwall',
+                             "Em7 G Dsus4 A7sus4\nToday is [Em7]gonna be", 'chords')
+            index = build_search_index(filename, 'chords')
+            self.assertEqual(search_songs(chords_index=index, chords=['G', 'C', 'D', 'Em']),
+                             [('Ben E. King', 'Stand By Me')])
+            self.assertEqual(search_songs(chords_index=index, chords=['G', 'C']), [])
+
+    def test_extract_chord_symbols(self):
+        sheet = " G(type2) Gadd9 Esus4\nWell, I [Csus4]think about it\nC Dm C/E F#m7\nAm I dreaming"
+        self.assertEqual(extract_chord_symbols(sheet),
+                         ['G', 'Gadd9', 'Esus4', 'Csus4', 'C', 'Dm', 'C/E', 'F#m7'])
+        self.assertEqual(extract_chord_symbols("Intro: F#m A\nEm7* D/G (x2)\nLet it be (x2)"),
+                         ['F#m', 'A', 'Em7', 'D/G'])
+
+    def test_labelled_chord_lines_are_indexed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'chords_cache.jsonl')
+            jsonl_save_entry(filename, 'Oasis', 'Half the World Away',
+                             "Intro: F#m A\nC D G\nSo here I go", 'chords')
+            index = build_search_index(filename, 'chords')
+            self.assertEqual(search_songs(chords_index=index, chords=['G', 'C', 'D', 'Em']), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+from unittest import mock
+from app.cache import jsonl_save_entry, lyrics_cache_path
+from app.service import SongbookService, make_handler
+
+SONGS = [{'Artist': 'Pixies', 'Title': 'Debaser'}, {'Artist': 'Oasis', 'Title': 'Wonderwall'}]
+
+
+class TestSongbookService(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.jobs_dir = os.path.join(self.tmpdir.name, 'jobs')
+        for target, value in [('app.cache.CACHE_DIR', self.tmpdir.name),
+                              ('app.service.JOBS_OUTPUT_DIR', self.jobs_dir)]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for song in SONGS:
+            jsonl_save_entry(lyrics_cache_path(), song['Artist'], song['Title'],
+                             f"Words of {song['Title']}", 'lyrics')
+
+    def _serve(self, service):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(service))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def _request(self, url, payload=None):
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, data=data)) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def test_submit_and_download(self):
+        service = SongbookService(None, workers=1)
+        url = self._serve(service)
+        payload = {'songs': SONGS, 'format': 'html', 'chords': False, 'fetch': False}
+        status, body = self._request(f"{url}/jobs", payload)
+        self.assertEqual(status, 202)
+        service.queue.join()
+        job = json.loads(body)
+        status, body = self._request(f"{url}/jobs/{job['id']}")
+        self.assertEqual(json.loads(body)['status'], 'done')
+        status, body = self._request(f"{url}/jobs/{job['id']}/lyrics")
+        self.assertEqual(status, 200)
+        self.assertIn(b'Words of Debaser', body)
+        status, body = self._request(f"{url}/jobs/{job['id']}/chords")
+        self.assertEqual(status, 409)
+
+        status, body = self._request(f"{url}/stats")
+        stats = json.loads(body)
+        self.assertEqual((stats['completed'], stats['failed'], stats['queue_depth']), (1, 0, 0))
+        self.assertIsNotNone(stats['latency_seconds'])
+
+    def test_full_queue_answers_503(self):
+        url = self._serve(SongbookService(None, workers=0, max_queued=1))
+        payload = {'songs': SONGS, 'format': 'html', 'fetch': False}
+        self.assertEqual(self._request(f"{url}/jobs", payload)[0], 202)
+        status, body = self._request(f"{url}/jobs", payload)
+        self.assertEqual(status, 503)
+        self.assertEqual(json.loads(body)['queue_depth'], 1)
+
+    def test_replaced_view_closes_after_its_last_job(self):
+        service = SongbookService(None, workers=0)
+        source = [(lyrics_cache_path(), 'lyrics')]
+        views = service._acquire_views(source)
+        time.sleep(0.01)
+        jsonl_save_entry(lyrics_cache_path(), 'Blur', 'Song 2', 'Woo-hoo', 'lyrics')
+        newer = service._acquire_views(source)
+        self.assertIsNot(newer[0][1], views[0][1])
+        with mock.patch.object(views[0][1], 'close') as close:
+            service._release_views(views)
+            close.assert_called_once()
+        with mock.patch.object(newer[0][1], 'close') as close:
+            service._release_views(newer)
+            close.assert_not_called()
+
+    def test_fetch_waits_for_readers_and_closes_views(self):
+        service = SongbookService(None, workers=0)
+        views = service._acquire_views([(lyrics_cache_path(), 'lyrics')])
+        fetched = threading.Event()
+
+        def fetch():
+            with service._fetching_into_caches():
+                self.assertEqual(service._views, {})
+                fetched.set()
+
+        thread = threading.Thread(target=fetch)
+        thread.start()
+        self.assertFalse(fetched.wait(0.1))
+        service._release_views(views)
+        thread.join(5)
+        self.assertTrue(fetched.is_set())
+
+    def test_finished_jobs_expire_with_their_outputs(self):
+        service = SongbookService(None, workers=1)
+        job = service.submit(SONGS, chords=False, output_format='html', fetch=False)
+        service.queue.join()
+        output_dir = os.path.join(self.jobs_dir, job.id)
+        self.assertTrue(os.path.isdir(output_dir))
+        service._expire_jobs(now=job.finished + 2 * 3600)
+        self.assertNotIn(job.id, service.jobs)
+        self.assertFalse(os.path.exists(output_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
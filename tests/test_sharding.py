@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import unittest
+from app.cache import jsonl_load_all, jsonl_save_entry
+from app.genius_lookup import load_genius_hits
+from app.sharding import merge_caches, merge_cache_files, parse_shard, seed_shard_cache, shard_songs
+
+
+def write_cache(filename, entries):
+    with open(filename, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + '\n')
+
+
+class TestSharding(unittest.TestCase):
+    def test_shards_partition_song_list(self):
+        songs = [{'Artist': f'Artist {i % 7}', 'Title': f'Song {i}'} for i in range(100)]
+        shards = [shard_songs(songs, i, 4) for i in range(4)]
+        self.assertEqual(sum(len(shard) for shard in shards), len(songs))
+        self.assertEqual(shard_songs(list(reversed(songs)), 2, 4), list(reversed(shards[2])))
+
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard('1/4'), (1, 4))
+        for spec in ('4/4', '1', 'a/b', '0/0'):
+            with self.assertRaises(ValueError):
+                parse_shard(spec)
+
+    def test_merge_prefers_found_then_newer(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            main = os.path.join(tmpdir, 'chords_cache.jsonl')
+            shard_a = os.path.join(tmpdir, 'a.jsonl')
+            shard_b = os.path.join(tmpdir, 'b.jsonl')
+            write_cache(main, [
+                {'artist': 'Oasis', 'title': 'Wonderwall', 'chords': '[Em7] old', 'updated': 100},
+                {'artist': 'Pixies', 'title': 'Debaser', 'chords': 'Chords not found.',
+                 'updated': 100},
+                {'artist': 'Blur', 'title': 'Tender', 'chords': '[C] tender'},
+            ])
+            write_cache(shard_a, [
+                {'artist': 'Oasis', 'title': 'Wonderwall', 'chords': '[Em7] new', 'updated': 200},
+                {'artist': 'Blur', 'title': 'Tender', 'chords': 'Chords not found.',
+                 'updated': 300},
+            ])
+            write_cache(shard_b, [
+                {'artist': 'Pixies', 'title': 'Debaser', 'chords': '[D] debaser', 'updated': 50},
+                {'artist': 'Pulp', 'title': 'Disco 2000', 'chords': '[F] disco', 'updated': 50},
+            ])
+            self.assertEqual(merge_cache_files(main, [shard_a, shard_b], 'chords'), 3)
+            self.assertEqual(jsonl_load_all(main, 'chords'), {
+                'Oasis - Wonderwall': '[Em7] new',
+                'Pixies - Debaser': '[D] debaser',
+                'Blur - Tender': '[C] tender',
+                'Pulp - Disco 2000': '[F] disco',
+            })
+
+    def test_genius_hits_are_seeded_and_merged(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            main_dir, shard_dir = os.path.join(tmpdir, 'main'), os.path.join(tmpdir, 'shard')
+            os.makedirs(main_dir)
+            os.makedirs(shard_dir)
+            main = os.path.join(main_dir, 'genius_cache.jsonl')
+            shard = os.path.join(shard_dir, 'genius_cache.jsonl')
+            for artist, title, song_id in [('Oasis', 'Wonderwall', 1), ('Blur', 'Song 2', 2)]:
+                hit = {'id': song_id, 'query_artist': artist, 'query_title': title}
+                jsonl_save_entry(main, artist.lower(), title.lower(), hit, 'genius')
+            seed_shard_cache(main_dir, shard_dir, [{'Artist': 'The Oasis', 'Title': 'Wonderwall!'}])
+            self.assertEqual({hit['id'] for hit in load_genius_hits(shard).values()}, {1})
+
+            jsonl_save_entry(shard, 'pulp', 'disco 2000', {'id': 3, 'query_artist': 'Pulp',
+                                                           'query_title': 'Disco 2000'}, 'genius')
+            merge_caches(main_dir, [shard_dir])
+            self.assertEqual({hit['id'] for hit in load_genius_hits(main).values()}, {1, 2, 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from app.songbook_writers import ChordProSongbookWriter, HtmlSongbookWriter
+
+
+class TestSongbookWriters(unittest.TestCase):
+    def test_html_songbook(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'Chords_Document.html')
+            writer = HtmlSongbookWriter(path, 'chords')
+            writer.add_song('Rock & Roll', 'Led Zeppelin', ['[A]It\'s been a long time',
+                                                            '<since I rock and rolled>'])
+            writer.add_song('Debaser', 'Pixies', ['[D]Got me a movie'])
+            writer.close()
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            self.assertIn('<h1>Rock &amp; Roll by Led Zeppelin</h1>', content)
+            self.assertIn('&lt;since I rock and rolled&gt;', content)
+            self.assertEqual(content.count('<section>'), 2)
+            self.assertTrue(content.rstrip().endswith('</html>'))
+
+    def test_chordpro_bundle(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'Chords_Document.chopro')
+            writer = ChordProSongbookWriter(path)
+            writer.add_song('Debaser', 'Pixies', ['{t:Debaser}', '[D]Got me a movie'])
+            writer.add_song('Wonderwall', 'Oasis', ['[Em7]Today is gonna be the day'])
+            writer.close()
+            with open(path, 'r', encoding='utf-8') as f:
+                songs = f.read().split('{new_song}')
+            self.assertEqual(len(songs), 2)
+            self.assertEqual(songs[0], '{title: Debaser}\n{artist: Pixies}\n[D]Got me a movie\n\n')
+            self.assertIn('{title: Wonderwall}', songs[1])
+
+    def test_chordpro_inlines_chords_over_lyrics(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            chords = ChordProSongbookWriter(os.path.join(tmpdir, 'Chords_Document.chopro'))
+            lyrics = ChordProSongbookWriter(os.path.join(tmpdir, 'Lyrics_Document.chopro'),
+                                            'lyrics')
+            lines = ['Intro: G  D  (x2)', 'G        D', 'Today is gonna be', '[Em7]Back beat',
+                     'Am   Em']
+            self.assertEqual(chords.render('Wonderwall', 'Oasis', lines).split('\n')[2:-1], [
+                'Intro: [G]  [D]  (x2)', '[G]Today is [D]gonna be', '[Em7]Back beat',
+                '[Am]   [Em]'])
+            self.assertIn('\nA\nToday\n', lyrics.render('Song', 'Artist', ['A', 'Today']))
+            chords.abort()
+            lyrics.abort()
+
+
+if __name__ == '__main__':
+    unittest.main()
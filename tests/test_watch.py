@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app.cache import content_digest, jsonl_load_all, jsonl_save_entry, lyrics_cache_path
+from app.watch import SongbookWatcher
+
+
+def _write_songs(path, songs):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('Artist,Title,Skip\n')
+        for artist, title in songs:
+            f.write(f"{artist},{title},keep\n")
+
+
+class TestSongbookWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.manual_path = os.path.join(self.tmpdir.name, 'manual_lyrics.json')
+        for target, value in [('app.cache.CACHE_DIR', self.tmpdir.name),
+                              ('app.watch.MANUAL_LYRICS_PATH', self.manual_path),
+                              ('app.fetch_data.MANUAL_LYRICS_PATH', self.manual_path)]:
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.csv_path = os.path.join(self.tmpdir.name, 'songs.csv')
+        self.output = os.path.join(self.tmpdir.name, 'Lyrics_Document.html')
+
+    def _watcher(self, fetched):
+        def cache_lyrics(songs, genius_client):
+            fetched.extend(song['Title'] for song in songs)
+            for song in songs:
+                lyrics = ('Lyrics not found.' if song['Title'] == 'Song 2'
+                          else f"Words of {song['Title']}")
+                jsonl_save_entry(lyrics_cache_path(), song['Artist'], song['Title'], lyrics,
+                                 'lyrics')
+
+        patcher = mock.patch('app.watch.cache_lyrics', cache_lyrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return SongbookWatcher(self.csv_path, None, lyrics_output=self.output)
+
+    def test_manual_lyrics_fill_missing_songs_without_refetching(self):
+        fetched = []
+        _write_songs(self.csv_path, [('Pixies', 'Debaser'), ('Blur', 'Song 2')])
+        watcher = self._watcher(fetched)
+        watcher.build({'songs'})
+        with open(self.manual_path, 'w', encoding='utf-8') as f:
+            json.dump({'Blur - Song 2': 'Woo-hoo'}, f)
+
+        self.assertEqual(watcher.build({'manual'}), {'lyrics'})
+        self.assertEqual(fetched, ['Debaser', 'Song 2'])
+        self.assertEqual(jsonl_load_all(lyrics_cache_path(), 'lyrics')['Blur - Song 2'], 'Woo-hoo')
+        with open(self.output, 'r', encoding='utf-8') as f:
+            self.assertIn('Woo-hoo', f.read())
+
+    def test_removed_songs_leave_the_memo(self):
+        _write_songs(self.csv_path, [('Pixies', 'Debaser'), ('Oasis', 'Wonderwall')])
+        watcher = self._watcher([])
+        watcher.build({'songs'})
+        self.assertEqual(len(watcher.fragments['lyrics']), 2)
+
+        _write_songs(self.csv_path, [('Pixies', 'Debaser')])
+        watcher.build({'songs'})
+        self.assertEqual(set(watcher.memo['lyrics']['lyrics']),
+                         {content_digest('Words of Debaser')})
+        self.assertEqual(len(watcher.fragments['lyrics']), 1)
+
+    def test_views_are_closed_while_fetching(self):
+        _write_songs(self.csv_path, [('Pixies', 'Debaser')])
+        watcher = self._watcher([])
+        watcher.build({'songs'})
+        self.assertIsNotNone(watcher.lyrics_cache)
+        views_open = []
+
+        def cache_lyrics(songs, client):
+            views_open.append((watcher.lyrics_cache, watcher.chords_cache))
+
+        with mock.patch('app.watch.cache_lyrics', cache_lyrics):
+            _write_songs(self.csv_path, [('Pixies', 'Debaser'), ('Oasis', 'Wonderwall')])
+            watcher.build({'songs'})
+        self.assertEqual(views_open, [(None, None)])
+        self.assertIsNotNone(watcher.lyrics_cache)
+
+    def test_only_own_cache_writes_are_absorbed(self):
+        _write_songs(self.csv_path, [('Pixies', 'Debaser')])
+        watcher = self._watcher([])
+        watcher._mtimes = before = watcher._snapshot()
+        written = watcher.build({'songs'})
+        # The song list is edited while the build runs
+        _write_songs(self.csv_path, [('Pixies', 'Debaser'), ('Oasis', 'Wonderwall')])
+        os.utime(self.csv_path, ns=(before['songs'] + 10 ** 9, before['songs'] + 10 ** 9))
+        watcher._absorb_own_writes(written)
+
+        current = watcher._snapshot()
+        self.assertEqual(watcher._mtimes['lyrics'], current['lyrics'])
+        self.assertNotEqual(watcher._mtimes['songs'], current['songs'])
+
+
+if __name__ == '__main__':
+    unittest.main()
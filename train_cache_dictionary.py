@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import time
+import zlib
+from collections import Counter
+from app.cache import (
+    atomic_write_lines, blob_store_dir, cache_lock, decode_value, encode_value, compress_value,
+    decompress_value, load_cache_dictionary, save_cache_dictionary,
+)
+
+CACHES = [
+    ('data/cache/lyrics_cache.jsonl', 'lyrics'),
+    ('data/cache/chords_cache.jsonl', 'chords'),
+]
+# zlib only looks back 32 KiB, so a larger preset dictionary is never used
+MAX_DICT_SIZE = 32768
+
+
+def load_entries(filename, value_field):
+    entries = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except Exception:
+                continue
+    values = [decode_value(filename, entry, value_field) for entry in entries]
+    return entries, [value for value in values if isinstance(value, str)]
+
+
+def train_dictionary(values, size):
+    """
+    Build a preset dictionary from the lines and words that repeat across records.
+
+    Segments are scored by the bytes they would save; zlib prefers matches close to the data,
+    so the best segments are placed at the end of the dictionary.
+    """
+    counts = Counter()
+    for value in values:
+        seen = set(line.strip() for line in value.split('\n') if len(line.strip()) > 3)
+        seen.update(word for word in value.split() if len(word) > 3)
+        counts.update(seen)
+    scored = sorted(
+        ((count - 1) * len(segment.encode('utf-8')), segment)
+        for segment, count in counts.items() if count > 1
+    )
+    chosen = []
+    total = 0
+    for _, segment in reversed(scored):
+        data = segment.encode('utf-8') + b'\n'
+        if total + len(data) > size:
+            continue
+        chosen.append(data)
+        total += len(data)
+    return b''.join(reversed(chosen))
+
+
+def report(name, values, zdict):
+    raw = [value.encode('utf-8') for value in values]
+    raw_size = sum(len(data) for data in raw)
+    plain_size = sum(len(zlib.compress(data, 9)) for data in raw)
+    packed = [compress_value(value, zdict) for value in values]
+    packed_size = sum(len(data) for data in packed)
+    start = time.perf_counter()
+    for data in packed:
+        decompress_value(data, zdict)
+    elapsed = time.perf_counter() - start
+    print(f"{name}: {len(values)} records, {raw_size} bytes raw")
+    print(f"  zlib without dictionary: {plain_size} bytes ({raw_size / max(plain_size, 1):.2f}x)")
+    print(f"  zlib with {len(zdict)} byte dictionary: {packed_size} bytes "
+          f"({raw_size / max(packed_size, 1):.2f}x)")
+    print(f"  decode throughput: {raw_size / max(elapsed, 1e-9) / 1e6:.1f} MB/s")
+
+
+def apply_dictionary(filename, value_field, zdict):
+    """
+    Rewrite the cache with every value compressed against the new dictionary.
+
+    Both dictionaries are kept by id before the cache is swapped, and the new one only becomes
+    current afterwards, so readers (which take no lock) and a crash at any point never leave
+    records without the dictionary they were compressed with.
+    """
+    with cache_lock(filename):
+        entries, _ = load_entries(filename, value_field)
+        values = [decode_value(filename, entry, value_field) for entry in entries]
+        for entry, value in zip(entries, values):
+            if value is not None:
+                encode_value(entry, value_field, value, zdict, blob_store_dir(filename))
+        previous = load_cache_dictionary(filename)
+        if previous is not None:
+            save_cache_dictionary(filename, previous)
+        save_cache_dictionary(filename, zdict)
+        before = os.path.getsize(filename)
+        atomic_write_lines(filename,
+                           (json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries))
+        save_cache_dictionary(filename, zdict, current=True)
+    print(f"  rewrote {filename}: {before} -> {os.path.getsize(filename)} bytes on disk")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Train zlib preset dictionaries for the JSONL caches.")
+    parser.add_argument('--size', type=int, default=MAX_DICT_SIZE, help='Dictionary size in bytes')
+    parser.add_argument('--apply', action='store_true',
+                        help='Save the dictionaries and rewrite the caches in compressed form')
+    args = parser.parse_args()
+    for filename, value_field in CACHES:
+        if not os.path.exists(filename):
+            print(f"File not found: {filename}")
+            continue
+        _, values = load_entries(filename, value_field)
+        zdict = train_dictionary(values, min(args.size, MAX_DICT_SIZE))
+        report(filename, values, zdict)
+        if args.apply:
+            apply_dictionary(filename, value_field, zdict)